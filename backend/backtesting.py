@@ -5,9 +5,12 @@ Supports historical testing and future predictions with multiple configurations
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from typing import Dict, List, Tuple
+import time
+from typing import Dict, Iterator, List, Tuple
 import logging
 
+from metrics import BACKTEST_CONFIGS_PENDING, STAGE_DURATION
+
 logger = logging.getLogger(__name__)
 
 class BacktestingEngine:
@@ -90,6 +93,23 @@ class BacktestingEngine:
         Returns:
             Results including predictions and metrics
         """
+        result = None
+        for event in self.iter_backtest(df, config):
+            if event['event'] == 'config_complete':
+                result = event['result']
+        return result
+    
+    def iter_backtest(
+        self,
+        df: pd.DataFrame,
+        config: Dict
+    ) -> Iterator[Dict]:
+        """
+        Run a single backtest configuration, yielding progress events
+        
+        Yields a 'model_trained' event as each model finishes training and a
+        final 'config_complete' event carrying the full backtest result.
+        """
         test_period = config.get('test_period', 'current_month')
         train_lookback = config.get('train_lookback', '2months')
         train_test_split = config.get('train_test_split', '80_20')
@@ -104,7 +124,16 @@ class BacktestingEngine:
         
         # Train models
         logger.info(f"Training models with config: {config}")
-        training_results = self.ml_predictor.train_all_models(full_train_df)
+        training_results = {}
+        for model_name, training_result in self.ml_predictor.iter_train_models(full_train_df):
+            training_results[model_name] = training_result
+            yield {
+                'event': 'model_trained',
+                'model': model_name,
+                'success': training_result.get('success', False),
+                'metrics': training_result.get('metrics', {}),
+                'error': training_result.get('error')
+            }
         
         # Generate predictions for test period (day by day)
         predictions = {}
@@ -130,7 +159,7 @@ class BacktestingEngine:
             except Exception as e:
                 logger.error(f"Error predicting with {model_name}: {e}")
         
-        # Calculate ensemble prediction
+        # Calculate ensemble prediction (reuses the cached per-model forecasts above)
         try:
             ensemble_result = self.ml_predictor.predict_ensemble(full_train_df, len(test_df))
             if ensemble_result.get('success', False):
@@ -169,7 +198,7 @@ class BacktestingEngine:
                 'total_points': len(actual)
             }
         
-        return {
+        result = {
             'config': config,
             'training_results': training_results,
             'predictions': predictions,
@@ -184,6 +213,11 @@ class BacktestingEngine:
                 'test_samples': len(test_df)
             }
         }
+        
+        yield {
+            'event': 'config_complete',
+            'result': result
+        }
     
     def compare_configurations(
         self,
@@ -200,12 +234,43 @@ class BacktestingEngine:
         Returns:
             Comparison results with best configuration
         """
+        comparison = None
+        for event in self.iter_compare_configurations(df, configs):
+            if event['event'] == 'complete':
+                comparison = event['results']
+        return comparison
+    
+    def iter_compare_configurations(
+        self,
+        df: pd.DataFrame,
+        configs: List[Dict]
+    ) -> Iterator[Dict]:
+        """
+        Run multiple backtest configurations, yielding progress events
+        
+        Every event from iter_backtest is tagged with its config_index and
+        passed through, so clients can render each model and configuration
+        as soon as it finishes. A final 'complete' event carries the same
+        comparison that compare_configurations returns.
+        """
         results = []
         
-        for config in configs:
-            logger.info(f"Running backtest: {config}")
-            result = self.run_backtest(df, config)
-            results.append(result)
+        BACKTEST_CONFIGS_PENDING.inc(len(configs))
+        try:
+            for config_index, config in enumerate(configs):
+                logger.info(f"Running backtest: {config}")
+                started = time.perf_counter()
+                for event in self.iter_backtest(df, config):
+                    event['config_index'] = config_index
+                    event['total_configs'] = len(configs)
+                    if event['event'] == 'config_complete':
+                        results.append(event['result'])
+                        STAGE_DURATION.labels(stage='backtest').observe(time.perf_counter() - started)
+                        BACKTEST_CONFIGS_PENDING.dec()
+                    yield event
+        finally:
+            # Release configs that never ran (error or client disconnect)
+            BACKTEST_CONFIGS_PENDING.dec(len(configs) - len(results))
         
         # Find best configuration for each model
         best_configs = {}
@@ -234,10 +299,13 @@ class BacktestingEngine:
             full_train_df = pd.concat([train_df, val_df], ignore_index=True)
             self.ml_predictor.train_all_models(full_train_df)
         
-        return {
-            'all_results': results,
-            'best_configs': best_configs,
-            'comparison_summary': self._create_comparison_summary(results)
+        yield {
+            'event': 'complete',
+            'results': {
+                'all_results': results,
+                'best_configs': best_configs,
+                'comparison_summary': self._create_comparison_summary(results)
+            }
         }
     
     def _create_comparison_summary(self, results: List[Dict]) -> List[Dict]:
@@ -322,7 +390,7 @@ class BacktestingEngine:
             except Exception as e:
                 logger.error(f"Error predicting future with {model_name}: {e}")
         
-        # Ensemble prediction
+        # Ensemble prediction (reuses the cached per-model forecasts above)
         try:
             ensemble_result = self.ml_predictor.predict_ensemble(train_df, days_ahead)
             if ensemble_result.get('success', False):
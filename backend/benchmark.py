@@ -0,0 +1,492 @@
+"""
+Performance benchmarks for the backend
+Run all sections with `python benchmark.py`, or pick some: `python benchmark.py imports`
+"""
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+# Forecast horizons served by the API (trading days)
+HORIZONS = [21, 42, 63, 126]
+
+def print_section(title):
+    """Print a section header"""
+    print("\n" + "=" * 60)
+    print(f"  {title}")
+    print("=" * 60)
+
+def make_sample_data(n_rows: int = 500, seed: int = 42) -> pd.DataFrame:
+    """Synthetic daily OHLCV frame shaped like DataFetcher output"""
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 1, n_rows))
+    return pd.DataFrame({
+        'date': pd.date_range(end=pd.Timestamp.today().normalize(), periods=n_rows, freq='B'),
+        'open': close + rng.normal(0, 0.3, n_rows),
+        'high': close + np.abs(rng.normal(0, 1, n_rows)),
+        'low': close - np.abs(rng.normal(0, 1, n_rows)),
+        'close': close,
+        'volume': rng.integers(1_000_000, 10_000_000, n_rows).astype(float),
+        'dividends': 0.0,
+        'stock splits': 0.0
+    })
+
+def _time_call(func, repeat: int = 3) -> float:
+    """Best-of-n wall time in seconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def _run_timed_import(statement: str) -> dict:
+    """Run an import in a fresh interpreter and report wall time, peak RSS and loaded frameworks"""
+    code = (
+        "import resource, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"{statement}\n"
+        "elapsed = time.perf_counter() - start\n"
+        "rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024\n"
+        "frameworks = [m for m in ('tensorflow', 'prophet', 'xgboost', 'pandas_ta') if m in sys.modules]\n"
+        "print(f'{elapsed}|{rss_mb}|{\",\".join(frameworks)}')\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True, text=True, check=True
+    ).stdout.strip().splitlines()[-1]
+    elapsed, rss_mb, frameworks = output.split('|')
+    return {
+        'seconds': float(elapsed),
+        'rss_mb': float(rss_mb),
+        'frameworks': frameworks or '-'
+    }
+
+def benchmark_imports():
+    """Import time and memory of the API and ML layers"""
+    print_section("Import time (fresh interpreter per row)")
+    
+    cases = {
+        'ml_models': "import ml_models",
+        'ml_predictor + MLPredictor()': "import ml_predictor; ml_predictor.MLPredictor()",
+        'main (full API)': "import main",
+        'main_simple': "import main_simple",
+        'first LSTM build': (
+            "from ml_models import create_model; "
+            "create_model('lstm').build_model((60, 20))"
+        ),
+        'first XGBoost use': (
+            "from ml_models.xgboost_model import _import_xgboost; _import_xgboost()"
+        ),
+    }
+    
+    print(f"{'Case':<32} {'Seconds':>8} {'RSS MB':>8}  Frameworks loaded")
+    print("-" * 72)
+    for name, statement in cases.items():
+        try:
+            result = _run_timed_import(statement)
+            print(f"{name:<32} {result['seconds']:>8.2f} {result['rss_mb']:>8.0f}  {result['frameworks']}")
+        except subprocess.CalledProcessError as e:
+            print(f"{name:<32} failed: {e.stderr.strip().splitlines()[-1]}")
+
+def benchmark_features():
+    """Recursive forecast feature updates: full prepare_features per step vs RollingFeatureState"""
+    from ml_models.base_model import BaseMLModel
+    from ml_models.feature_state import RollingFeatureState
+    
+    print_section("Recursive forecast features (per horizon)")
+    
+    class _FeatureModel(BaseMLModel):
+        def train(self, df):
+            pass
+        
+        def predict(self, df, horizon):
+            pass
+    
+    model = _FeatureModel("features")
+    df = make_sample_data()
+    model.prepare_features(df)
+    columns = model.feature_columns
+    passthrough = {col: df[col].iloc[-1] for col in ('dividends', 'stock splits')}
+    next_closes = df['close'].iloc[-1] + np.cumsum(np.random.default_rng(0).normal(0, 1, max(HORIZONS)))
+    
+    def full_recompute(horizon):
+        # The previous forecast loop: rebuild every feature on the extended frame each step
+        current_df = df.copy()
+        rows = []
+        for step in range(horizon):
+            rows.append(model.prepare_features(current_df)[columns].iloc[-1].values)
+            new_row = pd.DataFrame({
+                'date': [pd.Timestamp.now()],
+                'open': [next_closes[step]],
+                'high': [next_closes[step]],
+                'low': [next_closes[step]],
+                'close': [next_closes[step]],
+                'volume': [current_df['volume'].iloc[-1]],
+                **{col: [value] for col, value in passthrough.items()}
+            })
+            current_df = pd.concat([current_df, new_row], ignore_index=True).tail(200)
+        return np.array(rows)
+    
+    def incremental(horizon):
+        state = RollingFeatureState(df, columns, model.FEATURE_LAGS, model.FEATURE_WINDOWS)
+        rows = []
+        for step in range(horizon):
+            rows.append(state.current_features()[0])
+            state.append(next_closes[step])
+        return np.array(rows)
+    
+    max_error = np.max(np.abs(full_recompute(max(HORIZONS)) - incremental(max(HORIZONS))))
+    print(f"Max abs feature difference over {max(HORIZONS)} steps: {max_error:.2e}")
+    
+    print(f"\n{'Horizon':>8} {'Full (ms)':>12} {'Rolling (ms)':>14} {'Speedup':>10}")
+    print("-" * 48)
+    for horizon in HORIZONS:
+        full_time = _time_call(lambda: full_recompute(horizon), repeat=2)
+        rolling_time = _time_call(lambda: incremental(horizon))
+        print(f"{horizon:>8} {full_time * 1000:>12.1f} {rolling_time * 1000:>14.2f} {full_time / rolling_time:>9.0f}x")
+
+def benchmark_lstm_inference():
+    """LSTM forecast: per-step model.predict loop vs batched compiled inference"""
+    from ml_models.lstm_model import TENSORFLOW_AVAILABLE, LSTMModel
+    
+    print_section("LSTM autoregressive inference")
+    if not TENSORFLOW_AVAILABLE:
+        print("TensorFlow not installed, skipping")
+        return
+    
+    model = LSTMModel()
+    model.epochs = 1
+    df = make_sample_data()
+    model.train(df)
+    features = model.scaler.transform(model.prepare_features(df)[model.feature_columns])
+    
+    def per_step_predict(horizon):
+        # The previous forecast loop: one Keras predict call and one vstack per step
+        current_sequence = features[-model.lookback:].copy()
+        predictions = []
+        for _ in range(horizon):
+            predictions.append(model.model.predict(
+                current_sequence.reshape(1, model.lookback, -1), verbose=0
+            )[0, 0])
+            current_sequence = np.vstack([current_sequence[1:], current_sequence[-1].copy()])
+        return np.array(predictions)
+    
+    batched = model._forecast_paths([features], max(HORIZONS))[0]
+    max_error = np.max(np.abs(per_step_predict(max(HORIZONS)) - batched))
+    print(f"Max abs forecast difference over {max(HORIZONS)} steps: {max_error:.2e}")
+    
+    print(f"\n{'Horizon':>8} {'Per-step (ms)':>14} {'Batched (ms)':>14} {'Speedup':>10}")
+    print("-" * 50)
+    for horizon in HORIZONS:
+        loop_time = _time_call(lambda: per_step_predict(horizon), repeat=1)
+        batched_time = _time_call(lambda: model._forecast_paths([features], horizon))
+        print(f"{horizon:>8} {loop_time * 1000:>14.1f} {batched_time * 1000:>14.2f} {loop_time / batched_time:>9.0f}x")
+    
+    print(f"\n{'Symbols':>8} {'Batched 126-step (ms)':>22}")
+    print("-" * 32)
+    for n_symbols in (1, 10, 50):
+        feature_sets = [features] * n_symbols
+        batch_time = _time_call(lambda: model._forecast_paths(feature_sets, max(HORIZONS)))
+        print(f"{n_symbols:>8} {batch_time * 1000:>22.2f}")
+
+def benchmark_sequences():
+    """LSTM training windows: Python loop + np.array vs strided view"""
+    import tracemalloc
+    from ml_models.base_model import BaseMLModel
+    
+    print_section("LSTM training sequences (lookback 60, 20 features)")
+    
+    def loop_sequences(data, target, lookback):
+        # The previous implementation: append every window, then copy them into one array
+        X, y = [], []
+        for i in range(lookback, len(data)):
+            X.append(data[i-lookback:i])
+            y.append(target[i])
+        return np.array(X), np.array(y)
+    
+    def peak_mb(func):
+        tracemalloc.start()
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return peak / 1024 ** 2
+    
+    rng = np.random.default_rng(0)
+    print(f"{'Rows':>8} {'Loop (ms)':>11} {'View (ms)':>11} {'Loop peak MB':>14} {'View peak MB':>14}")
+    print("-" * 64)
+    for n_rows in (2520, 20000):  # ~10y of daily bars, intraday history
+        data = rng.random((n_rows, 20))
+        target = rng.random(n_rows)
+        loop_time = _time_call(lambda: loop_sequences(data, target, 60), repeat=1)
+        view_time = _time_call(lambda: BaseMLModel.create_sequences(None, data, target, 60))
+        loop_peak = peak_mb(lambda: loop_sequences(data, target, 60))
+        view_peak = peak_mb(lambda: BaseMLModel.create_sequences(None, data, target, 60))
+        print(f"{n_rows:>8} {loop_time * 1000:>11.1f} {view_time * 1000:>11.3f} {loop_peak:>14.1f} {view_peak:>14.3f}")
+
+def _run_lstm_training(n_rows: int, streaming: bool, epochs: int) -> dict:
+    """Train an LSTM in a fresh interpreter and report training time and the peak RSS it added"""
+    code = (
+        "import resource, time\n"
+        "from benchmark import make_sample_data\n"
+        "from ml_models.lstm_model import LSTMModel\n"
+        f"df = make_sample_data({n_rows})\n"
+        "model = LSTMModel()\n"
+        f"model.epochs = {epochs}\n"
+        f"model.streaming_threshold = {0 if streaming else 10 ** 9}\n"
+        # A short warm-up fit first, so TensorFlow's own start-up memory is not counted
+        "warmup = LSTMModel()\n"
+        "warmup.epochs, warmup.streaming_threshold = 1, model.streaming_threshold\n"
+        "warmup.train(make_sample_data(300))\n"
+        "model.prepare_features(df)\n"
+        "before_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024\n"
+        "start = time.perf_counter()\n"
+        "result = model.train(df)\n"
+        "elapsed = time.perf_counter() - start\n"
+        "after_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024\n"
+        "assert result['success'], result.get('error')\n"
+        "print(f\"{elapsed}|{after_mb - before_mb}\")\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True, text=True, check=True
+    ).stdout.strip().splitlines()[-1]
+    elapsed, added_mb = output.split('|')
+    return {'seconds': float(elapsed), 'added_mb': float(added_mb)}
+
+def benchmark_lstm_streaming():
+    """LSTM training end to end: in-memory window arrays vs the tf.data pipeline"""
+    from ml_models.lstm_model import TENSORFLOW_AVAILABLE
+    
+    print_section("LSTM training: window arrays vs tf.data (2 epochs)")
+    if not TENSORFLOW_AVAILABLE:
+        print("TensorFlow not installed, skipping")
+        return
+    
+    print(f"{'Rows':>8} {'Input':<8} {'Train (s)':>10} {'Peak RSS added MB':>18}")
+    print("-" * 48)
+    for n_rows in (2520, 20000):  # ~10y of daily bars, intraday history
+        for streaming in (False, True):
+            run = _run_lstm_training(n_rows, streaming, epochs=2)
+            label = 'tf.data' if streaming else 'arrays'
+            print(f"{n_rows:>8} {label:<8} {run['seconds']:>10.1f} {run['added_mb']:>18.1f}")
+
+def benchmark_feature_store():
+    """Feature matrix: recompute per call vs shared feature store (hit and appended bar)"""
+    from ml_models.feature_store import FeatureStore, compute_features
+    
+    print_section("Feature store (lags 1/5/10, windows 5/10/20)")
+    
+    lags, windows = (1, 5, 10), (5, 10, 20)
+    print(f"{'Rows':>8} {'Recompute (ms)':>15} {'Hit (ms)':>10} {'Append 1 bar (ms)':>18}")
+    print("-" * 56)
+    for n_rows in (500, 2520, 20000):
+        df = make_sample_data(n_rows)
+        store = FeatureStore(min_extend_rows=0)
+        store.get(df.iloc[:-1], lags, windows)
+        
+        recompute_time = _time_call(lambda: compute_features(df, lags, windows))
+        
+        def append_bar():
+            store.clear()
+            store.get(df.iloc[:-1], lags, windows)
+            start = time.perf_counter()
+            store.get(df, lags, windows)
+            return time.perf_counter() - start
+        append_time = min(append_bar() for _ in range(3))
+        hit_time = _time_call(lambda: store.get(df, lags, windows))
+        print(f"{n_rows:>8} {recompute_time * 1000:>15.2f} {hit_time * 1000:>10.2f} {append_time * 1000:>18.2f}")
+
+def benchmark_tree_inference():
+    """Random Forest / XGBoost inference: native library vs flattened node arrays"""
+    from ml_models import create_model
+    
+    print_section("Tree ensemble inference (native vs compiled)")
+    
+    df = make_sample_data()
+    rng = np.random.default_rng(0)
+    
+    for name in ('random_forest', 'xgboost'):
+        model = create_model(name)
+        result = model.train(df)
+        if not result.get('success', False):
+            print(f"{name}: training failed ({result.get('error')}), skipping")
+            continue
+        
+        features = model.feature_matrix(df)
+        single_row = features[-1:]
+        batch = features[rng.integers(0, len(features), 10000)]
+        
+        model.inference_backend = 'native'
+        native = model.predict_rows(batch)
+        compiled = model._flat_ensemble().predict(batch)
+        print(f"\n{name}: max abs difference {np.max(np.abs(native - compiled)):.2e} over {len(batch)} rows")
+        
+        print(f"(batches above {model.compiled_max_rows} rows use the native library)")
+        print(f"{'Case':<30} {'Native (ms)':>12} {'Compiled (ms)':>14} {'Speedup':>9}")
+        print("-" * 68)
+        cases = {
+            'single row': lambda: model.predict_rows(single_row),
+            '10k-row batch': lambda: model.predict_rows(batch),
+            '126-step recursive forecast': lambda: model.recursive_forecast(df, max(HORIZONS)),
+        }
+        if name == 'random_forest':
+            cases['per-tree outputs (1 row)'] = lambda: model.tree_outputs(single_row)
+        
+        for case, func in cases.items():
+            model.inference_backend = 'native'
+            native_time = _time_call(func)
+            model.inference_backend = 'compiled'
+            compiled_time = _time_call(func)
+            print(f"{case:<30} {native_time * 1000:>12.2f} {compiled_time * 1000:>14.2f} {native_time / compiled_time:>8.1f}x")
+
+def benchmark_lstm_presets():
+    """LSTM architecture presets: time to train and holdout accuracy"""
+    from ml_models.lstm_model import TENSORFLOW_AVAILABLE, LSTMModel
+    
+    print_section("LSTM architecture presets (early stopping on validation loss)")
+    if not TENSORFLOW_AVAILABLE:
+        print("TensorFlow not installed, skipping")
+        return
+    
+    import tensorflow as tf
+    df = make_sample_data(1000)
+    print(f"{'Preset':<10} {'Params':>8} {'Epochs run':>11} {'Fit (s)':>9} {'RMSE':>9} {'Dir. acc %':>11}")
+    print("-" * 64)
+    for architecture in LSTMModel.ARCHITECTURES:
+        tf.keras.utils.set_random_seed(0)
+        model = LSTMModel()
+        model.architecture = architecture
+        result = model.train(df)
+        if not result.get('success', False):
+            print(f"{architecture:<10} training failed ({result.get('error')})")
+            continue
+        metrics = result['metrics']
+        print(f"{architecture:<10} {model.model.count_params():>8} {result['epochs_trained']:>11} "
+              f"{result['fit_seconds']:>9.1f} {metrics['rmse']:>9.3f} {metrics['direction_accuracy']:>11.1f}")
+
+def benchmark_prophet():
+    """Prophet fit + forecast time per configuration"""
+    from ml_models.prophet_model import PROPHET_AVAILABLE, ProphetModel
+    
+    print_section("Prophet configurations (train on 2 years + 126-day forecast)")
+    if not PROPHET_AVAILABLE:
+        print("Prophet not installed, skipping")
+        return
+    
+    df = make_sample_data(504)
+    configurations = {
+        'full seasonality, 1000 samples': {'seasonality': 'full', 'uncertainty_samples': 1000},
+        'auto seasonality, 1000 samples': {'seasonality': 'auto', 'uncertainty_samples': 1000},
+        'auto seasonality, 100 samples': {'seasonality': 'auto', 'uncertainty_samples': 100},
+        'auto seasonality, analytic': {'seasonality': 'auto', 'uncertainty_samples': 0},
+    }
+    
+    # Load the shared Stan backend before timing
+    ProphetModel().train(df.iloc[:200])
+    
+    print(f"{'Configuration':<32} {'Fit (s)':>8} {'Refit (s)':>10} {'Predict (s)':>12} {'RMSE':>8}")
+    print("-" * 74)
+    for label, params in configurations.items():
+        model = ProphetModel()
+        model.set_params(params)
+        model.warm_start = False
+        start = time.perf_counter()
+        result = model.train(df.iloc[:-5])
+        fit_time = time.perf_counter() - start
+        if not result.get('success', False):
+            print(f"{label:<32} training failed ({result.get('error')})")
+            continue
+        
+        # Refit with five more bars, started from the previous parameters
+        model.warm_start = True
+        start = time.perf_counter()
+        model.train(df)
+        refit_time = time.perf_counter() - start
+        
+        predict_time = _time_call(lambda: model.predict(df, max(HORIZONS)), repeat=1)
+        print(f"{label:<32} {fit_time:>8.2f} {refit_time:>10.2f} {predict_time:>12.2f} {result['metrics']['rmse']:>8.3f}")
+
+def benchmark_precision():
+    """float64 vs float32: feature memory, fit time and accuracy parity per model"""
+    from ml_models import create_model
+    from ml_models.feature_store import FeatureStore
+    from ml_models.lstm_model import TENSORFLOW_AVAILABLE
+    
+    print_section("Float32 vs float64 precision")
+    
+    lags, windows = (1, 5, 10), (5, 10, 20)
+    print(f"{'Rows':>8} {'float64 matrix (KB)':>20} {'float32 matrix (KB)':>20}")
+    print("-" * 52)
+    for n_rows in (2520, 20000):
+        feature_set = FeatureStore().get(make_sample_data(n_rows), lags, windows)
+        print(f"{n_rows:>8} {feature_set.matrix_as(np.float64).nbytes / 1024:>20.0f} "
+              f"{feature_set.matrix_as(np.float32).nbytes / 1024:>20.0f}")
+    
+    df = make_sample_data(2520)
+    names = ['random_forest', 'xgboost']
+    if TENSORFLOW_AVAILABLE:
+        names.append('lstm')
+    
+    print(f"\n{'Model':<15} {'Fit64 (s)':>10} {'Fit32 (s)':>10} {'RMSE64':>9} {'RMSE32':>9} {'Max rel diff':>13}")
+    print("-" * 70)
+    for name in names:
+        fits = {}
+        for precision in ('float64', 'float32'):
+            model = create_model(name)
+            model.set_precision(precision)
+            if name == 'lstm':
+                import tensorflow as tf
+                tf.keras.utils.set_random_seed(0)
+                model.epochs = 5
+            start = time.perf_counter()
+            result = model.train(df)
+            fits[precision] = (model, result, time.perf_counter() - start)
+        
+        if not all(result.get('success', False) for _, result, _ in fits.values()):
+            print(f"{name:<15} training failed, skipping")
+            continue
+        
+        # Parity of the float64-trained model's forecast fed float64 vs float32 features
+        model = fits['float64'][0]
+        forecast64 = np.array(model.predict(df, max(HORIZONS))['predictions'])
+        model.set_precision('float32')
+        forecast32 = np.array(model.predict(df, max(HORIZONS))['predictions'])
+        max_diff = np.max(np.abs(forecast32 / forecast64 - 1))
+        
+        (_, result64, time64), (_, result32, time32) = fits['float64'], fits['float32']
+        print(f"{name:<15} {time64:>10.2f} {time32:>10.2f} {result64['metrics']['rmse']:>9.3f} "
+              f"{result32['metrics']['rmse']:>9.3f} {max_diff:>13.2e}")
+
+BENCHMARKS = {
+    'imports': benchmark_imports,
+    'features': benchmark_features,
+    'lstm_inference': benchmark_lstm_inference,
+    'sequences': benchmark_sequences,
+    'lstm_streaming': benchmark_lstm_streaming,
+    'feature_store': benchmark_feature_store,
+    'tree_inference': benchmark_tree_inference,
+    'precision': benchmark_precision,
+    'lstm_presets': benchmark_lstm_presets,
+    'prophet': benchmark_prophet,
+}
+
+def main():
+    """Run the selected benchmarks"""
+    selected = sys.argv[1:] or list(BENCHMARKS.keys())
+    unknown = [name for name in selected if name not in BENCHMARKS]
+    if unknown:
+        print(f"Unknown benchmark(s): {', '.join(unknown)}")
+        print(f"Available: {', '.join(BENCHMARKS.keys())}")
+        return 1
+    
+    start = time.perf_counter()
+    for name in selected:
+        BENCHMARKS[name]()
+    print(f"\nTotal benchmark time: {time.perf_counter() - start:.1f}s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
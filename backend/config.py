@@ -74,6 +74,56 @@ PREDICTION_HORIZONS = {
 DATA_LOOKBACK_DAYS = 730  # 2 years of historical data
 UPDATE_INTERVAL_MINUTES = 60  # Update data every hour
 
+# Model registry settings
+MODEL_REGISTRY_MAX_MEMORY_MB = 2048  # Trained model sets beyond this are evicted to disk (LRU)
+MODEL_STORE_DIR = "model_store"  # Where trained model sets are saved
+MODEL_PERSISTENCE_ENABLED = True  # Save models on training and reload them after a restart
+
+# Training settings
+PARALLEL_TRAINING = True  # Fit models concurrently in worker processes
+TRAINING_MAX_WORKERS = None  # Worker processes for parallel training (None = one per model)
+MODEL_PRECISION = "float64"  # "float32" halves feature memory for Random Forest, XGBoost and LSTM
+
+# LSTM settings
+LSTM_ARCHITECTURE = "stacked"  # "stacked" (128-64-32 LSTM), "compact" (one 32-unit LSTM) or "gru" (one 64-unit GRU)
+LSTM_EARLY_STOPPING_PATIENCE = 5  # Epochs without a lower validation loss before training stops (None = all epochs)
+TF_INTRA_OP_THREADS = None  # Threads within one TensorFlow op (None = thread budget or TensorFlow default)
+TF_INTER_OP_THREADS = None  # TensorFlow ops run concurrently (None = thread budget or TensorFlow default)
+
+# Prophet settings
+PROPHET_SEASONALITY = "auto"  # "auto" (seasonalities the bar spacing and history can resolve) or "full" (daily, weekly, yearly)
+PROPHET_UNCERTAINTY_SAMPLES = 1000  # Posterior samples for prediction intervals (0 = analytic intervals, no sampling)
+PROPHET_WARM_START = True  # Start every refit of a model from its previous parameters
+
+# Walk-forward cross-validation
+CV_N_FOLDS = 5  # Consecutive test windows
+CV_MODE = "expanding"  # "expanding" (train from the first row) or "sliding" (fixed-length train window)
+CV_MAX_WORKERS = None  # Worker processes fitting folds (None = one per core)
+CV_TIME_BUDGET_SECONDS = None  # Stop starting new folds after this long (None = no limit)
+
+# Hyperparameter search (successive halving over walk-forward folds)
+TUNING_CANDIDATES = 9  # Configurations sampled per model for the first rung
+TUNING_ETA = 3  # Each rung keeps 1/eta of the candidates and evaluates eta times the folds
+TUNING_TIME_BUDGET_SECONDS = 1800  # Wall-clock budget per model
+TUNED_PARAMS_FILE = "model_store/tuned_params.json"  # Best hyperparameters per symbol and model
+
+# Global multi-asset models (one model per type fitted on every symbol)
+GLOBAL_MODELS = ["random_forest", "xgboost", "lstm"]  # Model types trained globally
+GLOBAL_MODEL_DIR = "model_store/global"  # Where the global models are saved
+
+# Ensemble weighting (rolling out-of-sample error of served forecasts)
+ENSEMBLE_WEIGHTING = "inverse_error"  # "inverse_error", "stacking" (non-negative least squares) or "static"
+ENSEMBLE_ERROR_WINDOW = 250  # Scored forecast errors kept per model
+ENSEMBLE_SCORE_STEPS = 5  # Bars ahead of each served forecast that are scored against actuals
+ENSEMBLE_MIN_SAMPLES = 20  # Errors every model needs before the static weights are replaced
+ENSEMBLE_MIN_WEIGHT = 0.05  # Models weighted below this are not run for the ensemble
+ENSEMBLE_PROBE_EVERY = 10  # Every n-th prediction round still runs skipped models to keep their error current
+
+# Incremental retraining (staleness policy)
+REFRESH_MAX_AGE_DAYS = 30  # Full refit once the last full fit is older than this
+REFRESH_MAX_UPDATES = 10  # Full refit after this many warm-start updates in a row
+REFRESH_MAX_NEW_ROWS_FRACTION = 0.25  # Full refit when new bars exceed this share of the training window
+
 # API Settings
 API_HOST = "0.0.0.0"
 API_PORT = 8001
@@ -7,6 +7,8 @@ from datetime import datetime, timedelta
 from typing import Optional, Dict
 import logging
 
+from metrics import DATA_CACHE_REQUESTS, STAGE_DURATION
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -41,8 +43,10 @@ class DataFetcher:
         if cache_key in self.cache:
             if datetime.now() - self.cache_timestamp[cache_key] < self.cache_duration:
                 logger.info(f"Returning cached data for {symbol}")
+                DATA_CACHE_REQUESTS.labels(result='hit').inc()
                 return self.cache[cache_key]
         
+        DATA_CACHE_REQUESTS.labels(result='miss').inc()
         try:
             logger.info(f"Fetching data for {symbol}")
             
@@ -57,9 +61,10 @@ class DataFetcher:
             
             ticker = yf.Ticker(symbol)
             # Use explicit start and end dates instead of period
-            df = ticker.history(start=start_date.strftime('%Y-%m-%d'), 
-                              end=end_date.strftime('%Y-%m-%d'), 
-                              interval=interval)
+            with STAGE_DURATION.time(stage='upstream_fetch'):
+                df = ticker.history(start=start_date.strftime('%Y-%m-%d'), 
+                                  end=end_date.strftime('%Y-%m-%d'), 
+                                  interval=interval)
             
             if df.empty:
                 logger.warning(f"No data found for {symbol}")
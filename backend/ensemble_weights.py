@@ -0,0 +1,327 @@
+"""
+Online ensemble weights from the rolling out-of-sample error of served forecasts
+
+The ensemble used fixed per-model weights. EnsembleWeighting records each
+model's forecast path whenever predictions are served and scores it once
+the actual bars arrive: every (forecast, step ahead) error enters a
+per-model rolling window exactly once, with running sums, so new actuals
+cost O(new errors) and nothing is recomputed over the history.
+
+Weights are either inverse mean squared relative error or non-negative
+stacking weights fitted on the same window (its Gram matrix is kept up to
+date the same way). Models weighted below min_weight are not run at all;
+every probe_every-th round still runs them so their error stays current.
+The served ensemble forecast is scored too, which gives the ensemble's
+own error metrics.
+"""
+import logging
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import nnls
+
+from config import (
+    ENSEMBLE_ERROR_WINDOW, ENSEMBLE_MIN_SAMPLES, ENSEMBLE_MIN_WEIGHT,
+    ENSEMBLE_PROBE_EVERY, ENSEMBLE_SCORE_STEPS, ENSEMBLE_WEIGHTING
+)
+
+logger = logging.getLogger(__name__)
+
+def _naive(dates):
+    """Timestamps without timezone (yfinance dates carry the exchange's)"""
+    return dates.tz_localize(None) if dates.tz is not None else dates
+
+class ErrorWindow:
+    """The last size squared errors of one model, with their running sum"""
+    
+    def __init__(self, size: int):
+        self.size = size
+        self.values = deque()
+        self.total = 0.0
+    
+    def add(self, value: float):
+        self.values.append(value)
+        self.total += value
+        if len(self.values) > self.size:
+            self.total -= self.values.popleft()
+    
+    @property
+    def count(self) -> int:
+        return len(self.values)
+    
+    @property
+    def mean(self) -> float:
+        # Running sums can drift slightly below zero after many evictions
+        return max(self.total, 0.0) / len(self.values) if self.values else float('nan')
+
+class EnsembleWeighting:
+    """Per-model rolling forecast error of one symbol's predictor and the weights derived from it"""
+    
+    METHODS = ('inverse_error', 'stacking', 'static')
+    
+    def __init__(
+        self,
+        prior: Dict[str, float],
+        method: str = ENSEMBLE_WEIGHTING,
+        window: int = ENSEMBLE_ERROR_WINDOW,
+        score_steps: int = ENSEMBLE_SCORE_STEPS,
+        min_samples: int = ENSEMBLE_MIN_SAMPLES,
+        min_weight: float = ENSEMBLE_MIN_WEIGHT,
+        probe_every: Optional[int] = ENSEMBLE_PROBE_EVERY
+    ):
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown ensemble weighting: {method}")
+        # Static weights, used until every model has min_samples errors
+        self.prior = dict(prior)
+        self.method = method
+        self.window = window
+        self.score_steps = score_steps
+        self.min_samples = min_samples
+        self.min_weight = min_weight
+        self.probe_every = probe_every
+        
+        self.errors = {name: ErrorWindow(window) for name in self.prior}
+        # origin timestamp -> model -> predicted closes for the next score_steps bars
+        self.pending: "OrderedDict[pd.Timestamp, Dict[str, np.ndarray]]" = OrderedDict()
+        # origin timestamp -> steps already scored
+        self.scored_steps: Dict[pd.Timestamp, int] = {}
+        
+        # Stacking samples (each model's prediction / actual, NaN for models that
+        # did not forecast) with their Gram matrix and per-pair sample counts
+        n_models = len(self.prior)
+        self.stack_rows = deque()
+        self.gram = np.zeros((n_models, n_models))
+        self.moment = np.zeros(n_models)
+        self.pair_counts = np.zeros((n_models, n_models))
+        # (predicted, actual, previous actual) closes of the served ensemble forecasts
+        self.ensemble_samples = deque(maxlen=window)
+        
+        self.rounds = 0
+        # Set when the state changed since it was last saved
+        self.dirty = False
+    
+    def record(self, origin, forecasts: Dict[str, List[float]], ensemble: Optional[List[float]] = None):
+        """Remember the forecast paths every model (and the ensemble) served from the bar dated origin"""
+        origin = _naive(pd.Timestamp(origin))
+        paths = self.pending.setdefault(origin, {})
+        self.scored_steps.setdefault(origin, 0)
+        if ensemble is not None:
+            forecasts = dict(forecasts, ensemble=ensemble)
+        for name, predictions in forecasts.items():
+            # The first forecast served from a bar is the one scored
+            if (name in self.errors or name == 'ensemble') and name not in paths:
+                paths[name] = np.asarray(predictions[:self.score_steps], dtype=float)
+                self.dirty = True
+        
+        # Origins whose bars never arrive (e.g. a halted symbol) are dropped eventually
+        while len(self.pending) > 4 * self.score_steps:
+            dropped, _ = self.pending.popitem(last=False)
+            self.scored_steps.pop(dropped, None)
+    
+    def observe(self, df: pd.DataFrame) -> int:
+        """
+        Score pending forecasts against the bars of df that are now known
+        
+        Returns:
+            Number of errors added
+        """
+        if not self.pending or 'date' not in df.columns:
+            return 0
+        
+        dates = _naive(pd.DatetimeIndex(pd.to_datetime(df['date'])))
+        closes = df['close'].to_numpy(dtype=float)
+        
+        n_added = 0
+        for origin in list(self.pending):
+            position = dates.get_indexer([origin])[0]
+            if position < 0:
+                continue
+            
+            first_step = self.scored_steps[origin]
+            last_step = min(self.score_steps, len(closes) - 1 - position)
+            for step in range(first_step, last_step):
+                actual = closes[position + 1 + step]
+                ratios = {
+                    name: path[step] / actual
+                    for name, path in self.pending[origin].items()
+                    if step < len(path)
+                }
+                ensemble_ratio = ratios.pop('ensemble', None)
+                if ensemble_ratio is not None:
+                    self.ensemble_samples.append((ensemble_ratio * actual, actual, closes[position + step]))
+                for name, ratio in ratios.items():
+                    self.errors[name].add((ratio - 1) ** 2)
+                    n_added += 1
+                if ratios:
+                    self._add_stack_row(np.array([ratios.get(name, np.nan) for name in self.errors]))
+            
+            self.scored_steps[origin] = max(first_step, last_step)
+            if self.scored_steps[origin] >= self.score_steps:
+                del self.pending[origin]
+                del self.scored_steps[origin]
+        
+        if n_added:
+            self.dirty = True
+        return n_added
+    
+    def _add_stack_row(self, row: np.ndarray):
+        """Add a stacking sample, evicting the oldest beyond the window"""
+        self.stack_rows.append(row)
+        self._accumulate(row, 1)
+        if len(self.stack_rows) > self.window:
+            self._accumulate(self.stack_rows.popleft(), -1)
+    
+    def _accumulate(self, row: np.ndarray, sign: int):
+        """Add (sign=1) or remove (sign=-1) a row's products; missing models contribute nothing"""
+        present = np.isfinite(row)
+        values = np.where(present, row, 0.0)
+        self.gram += sign * np.outer(values, values)
+        self.moment += sign * values
+        self.pair_counts += sign * np.outer(present, present)
+    
+    @staticmethod
+    def _normalized(weights: Dict[str, float]) -> Dict[str, float]:
+        total = sum(weights.values())
+        if total <= 0:
+            return {name: 1 / len(weights) for name in weights}
+        return {name: float(weight / total) for name, weight in weights.items()}
+    
+    def _inverse_error_weights(self, names: List[str]) -> Dict[str, float]:
+        return self._normalized({
+            name: 1 / max(self.errors[name].mean, 1e-12)
+            for name in names
+        })
+    
+    def _stacking_weights(self, names: List[str]) -> Dict[str, float]:
+        """
+        Non-negative weights of names minimizing the squared relative error of their combination
+        
+        min_w E[(x . w - 1)^2] with w >= 0 is solved from the second moments
+        S = E[x x^T] and m = E[x]: with S = L L^T it equals
+        ||L^T w - L^-1 m||^2 plus a constant. Each entry is averaged over
+        the rows where its models both forecast, since skipped models
+        only forecast on probe rounds.
+        """
+        index = [list(self.errors).index(name) for name in names]
+        counts = self.pair_counts[np.ix_(index, index)]
+        if counts.min() < self.min_samples:
+            return self._inverse_error_weights(names)
+        
+        second = self.gram[np.ix_(index, index)] / counts
+        first = self.moment[index] / np.diag(counts)
+        # A little ridge keeps S positive definite when forecasts are collinear
+        second += np.eye(len(index)) * 1e-9 * max(np.trace(second), 1.0)
+        try:
+            lower = np.linalg.cholesky(second)
+        except np.linalg.LinAlgError:
+            # Pairwise averages over different rows need not form a valid S
+            return self._inverse_error_weights(names)
+        solution, _ = nnls(lower.T, np.linalg.solve(lower, first))
+        return self._normalized(dict(zip(names, solution)))
+    
+    def weights(self) -> Dict[str, float]:
+        """
+        Current ensemble weight of every model (summing to 1)
+        
+        Models with min_samples scored errors share their combined prior
+        weight by error; the others (untrained, failing or new models)
+        keep their prior weight until they have been scored enough.
+        """
+        prior = self._normalized(self.prior)
+        scored = [name for name, window in self.errors.items() if window.count >= self.min_samples]
+        if self.method == 'static' or not scored:
+            return prior
+        
+        if self.method == 'stacking':
+            learned = self._stacking_weights(scored)
+        else:
+            learned = self._inverse_error_weights(scored)
+        scored_share = sum(prior[name] for name in scored)
+        return {
+            name: learned[name] * scored_share if name in learned else prior[name]
+            for name in self.errors
+        }
+    
+    def ensemble_metrics(self) -> Optional[Dict[str, float]]:
+        """
+        Error metrics of the served ensemble forecasts (None until min_samples are scored)
+        
+        Direction accuracy compares each forecast's move from the previous
+        actual close with the actual move.
+        """
+        if len(self.ensemble_samples) < self.min_samples:
+            return None
+        
+        predicted, actual, previous = np.array(self.ensemble_samples).T
+        return {
+            'rmse': float(np.sqrt(np.mean((actual - predicted) ** 2))),
+            'mae': float(np.mean(np.abs(actual - predicted))),
+            'mape': float(np.mean(np.abs((actual - predicted) / actual)) * 100),
+            'direction_accuracy': float(np.mean(np.sign(predicted - previous) == np.sign(actual - previous)) * 100),
+            'samples': len(self.ensemble_samples)
+        }
+    
+    def models_to_run(self) -> List[str]:
+        """Models worth running this round: weight at least min_weight, or all on probe rounds"""
+        self.rounds += 1
+        weights = self.weights()
+        if self.probe_every and self.rounds % self.probe_every == 0:
+            return list(weights)
+        
+        selected = [name for name, weight in weights.items() if weight >= self.min_weight]
+        if len(selected) < len(weights):
+            logger.debug(f"Ensemble skips {', '.join(set(weights) - set(selected))} (weight below {self.min_weight})")
+        return selected or [max(weights, key=weights.get)]
+    
+    def summary(self) -> Dict:
+        """Weights and rolling errors for the API"""
+        weights = self.weights()
+        return {
+            'method': self.method,
+            'score_steps': self.score_steps,
+            'models': {
+                name: {
+                    'weight': weights[name],
+                    'rmse_pct': float(np.sqrt(window.mean) * 100) if window.count else None,
+                    'samples': window.count,
+                    'skipped': weights[name] < self.min_weight
+                }
+                for name, window in self.errors.items()
+            }
+        }
+    
+    def state(self) -> Dict:
+        """Everything needed to resume weighting after a restart"""
+        return {
+            'method': self.method,
+            'models': list(self.errors),
+            'errors': {name: list(window.values) for name, window in self.errors.items()},
+            'pending': {origin: dict(paths) for origin, paths in self.pending.items()},
+            'scored_steps': dict(self.scored_steps),
+            'stack_rows': list(self.stack_rows),
+            'ensemble_samples': list(self.ensemble_samples),
+            'rounds': self.rounds
+        }
+    
+    def load_state(self, state: Dict):
+        """Resume from state(); models missing from it start empty"""
+        for name, values in state['errors'].items():
+            if name in self.errors:
+                for value in values:
+                    self.errors[name].add(value)
+        
+        self.pending = OrderedDict(
+            (origin, {name: path for name, path in paths.items() if name in self.errors or name == 'ensemble'})
+            for origin, paths in state['pending'].items()
+        )
+        self.scored_steps = {origin: state['scored_steps'][origin] for origin in self.pending}
+        
+        # Stacking rows only apply to the same models in the same order
+        if state['models'] == list(self.errors):
+            for row in state['stack_rows']:
+                self._add_stack_row(np.asarray(row))
+        self.ensemble_samples.extend(state.get('ensemble_samples', []))
+        self.rounds = state.get('rounds', 0)
+        self.dirty = False
@@ -0,0 +1,68 @@
+"""
+Forecast cache shared by single-model, multi-horizon and ensemble predictions
+"""
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Tuple
+
+from metrics import counter
+# Re-exported: the fingerprint also keys the feature store
+from ml_models.feature_store import data_fingerprint
+
+FORECAST_CACHE_REQUESTS = counter(
+    'financial_forecast_cache_requests_total',
+    'Per-model forecast lookups by cache result (hit, slice or miss)',
+    ['result']
+)
+
+class ForecastCache:
+    """
+    LRU cache of per-model forecasts
+    
+    Entries are keyed by (model key, data fingerprint, horizon). The model
+    key must change whenever the model is refit (MLPredictor uses the model
+    name, instance id and model_version). For prefix-consistent models a
+    request can also be served by slicing a cached longer horizon.
+    """
+    
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[Hashable, str, int], Dict]" = OrderedDict()
+    
+    def get(self, model_key: Hashable, fingerprint: str, horizon: int) -> Optional[Dict]:
+        """Exact-horizon lookup"""
+        key = (model_key, fingerprint, horizon)
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+        return result
+    
+    def get_longer(self, model_key: Hashable, fingerprint: str, horizon: int) -> Optional[Dict]:
+        """Shortest cached forecast longer than horizon for the same model and data"""
+        with self._lock:
+            candidates = [
+                cached_horizon for (cached_model, cached_fp, cached_horizon) in self._entries
+                if cached_model == model_key and cached_fp == fingerprint and cached_horizon > horizon
+            ]
+            if not candidates:
+                return None
+            key = (model_key, fingerprint, min(candidates))
+            self._entries.move_to_end(key)
+            return self._entries[key]
+    
+    def put(self, model_key: Hashable, fingerprint: str, horizon: int, result: Dict):
+        key = (model_key, fingerprint, horizon)
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
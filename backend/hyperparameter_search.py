@@ -0,0 +1,151 @@
+"""
+Hyperparameter search with successive halving over walk-forward folds
+
+Every model ships hardcoded hyperparameters. The search samples
+configurations from each model's search_space and scores them with
+walk-forward cross-validation, spending the fold budget where it matters:
+all candidates are scored on the most recent fold, the best 1/eta of them
+on eta times as many folds, and so on until one candidate is left or
+every fold is used. The (candidate, fold) fits of a rung run in the
+walk_forward process pool, and the whole search stops starting new fits
+once its wall-clock budget is spent.
+"""
+import itertools
+import logging
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from config import (
+    CV_MAX_WORKERS, CV_MODE, CV_N_FOLDS,
+    TUNING_CANDIDATES, TUNING_ETA, TUNING_TIME_BUDGET_SECONDS
+)
+from ml_models import get_model_class
+from tuned_params import TUNED_PARAMS
+from walk_forward import WalkForwardValidator, walk_forward_splits
+
+logger = logging.getLogger(__name__)
+
+class SuccessiveHalvingSearch:
+    """Successive halving of sampled hyperparameter configurations (fewer-is-better metrics)"""
+    
+    def __init__(
+        self,
+        n_candidates: int = TUNING_CANDIDATES,
+        eta: int = TUNING_ETA,
+        n_folds: int = CV_N_FOLDS,
+        mode: str = CV_MODE,
+        time_budget: Optional[float] = TUNING_TIME_BUDGET_SECONDS,
+        max_workers: Optional[int] = CV_MAX_WORKERS,
+        metric: str = 'rmse',
+        seed: int = 42
+    ):
+        self.n_candidates = n_candidates
+        self.eta = eta
+        self.n_folds = n_folds
+        self.mode = mode
+        self.time_budget = time_budget
+        self.max_workers = max_workers
+        self.metric = metric
+        self.seed = seed
+    
+    def sample_candidates(self, model_name: str) -> List[Dict]:
+        """Up to n_candidates distinct configurations from the model's search space"""
+        space = get_model_class(model_name).search_space
+        if not space:
+            return [{}]
+        
+        names = list(space)
+        grid = [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+        if len(grid) <= self.n_candidates:
+            return grid
+        rng = np.random.default_rng(self.seed)
+        return [grid[i] for i in sorted(rng.choice(len(grid), self.n_candidates, replace=False))]
+    
+    def search(self, model_name: str, df: pd.DataFrame) -> Dict:
+        """
+        Tune one model on df
+        
+        Returns:
+            The best params and score, every candidate's fold scores and the rungs run
+        """
+        start = time.perf_counter()
+        folds = walk_forward_splits(len(df), self.n_folds, self.mode)
+        # Rungs add folds from the most recent backwards
+        fold_order = list(reversed(range(len(folds))))
+        
+        candidates = {
+            f"{model_name}#{i}": (model_name, params)
+            for i, params in enumerate(self.sample_candidates(model_name))
+        }
+        scores = {key: [] for key in candidates}
+        alive = list(candidates)
+        n_scored = 0
+        n_rung_folds = 1
+        rungs = []
+        
+        while True:
+            remaining = None if self.time_budget is None else self.time_budget - (time.perf_counter() - start)
+            if remaining is not None and remaining <= 0:
+                break
+            
+            validator = WalkForwardValidator(
+                n_folds=self.n_folds,
+                mode=self.mode,
+                max_workers=self.max_workers,
+                time_budget=remaining
+            )
+            new_folds = [folds[idx] for idx in fold_order[n_scored:n_rung_folds]]
+            report = validator.evaluate_candidates({key: candidates[key] for key in alive}, df, folds=new_folds)
+            
+            for key in alive:
+                for fold in report[key]['folds']:
+                    # A failed fit ranks last rather than aborting the search
+                    scores[key].append(fold['metrics'][self.metric] if fold.get('success', False) else float('inf'))
+            
+            rungs.append({'candidates': len(alive), 'folds': n_rung_folds})
+            logger.info(f"Tuning {model_name}: scored {len(alive)} candidates on {n_rung_folds} folds")
+            n_scored = n_rung_folds
+            
+            if report[alive[0]]['budget_exhausted'] or len(alive) == 1 or n_rung_folds == len(folds):
+                break
+            alive = sorted(alive, key=lambda key: np.mean(scores[key]))[:max(1, len(alive) // self.eta)]
+            n_rung_folds = min(len(folds), n_rung_folds * self.eta)
+        
+        scored = [key for key in candidates if scores[key]]
+        if not scored:
+            return {'success': False, 'model': model_name, 'error': 'Time budget exhausted before any fit finished'}
+        
+        # Candidates that survived to more folds rank ahead of the ones cut earlier
+        best = min(scored, key=lambda key: (-len(scores[key]), np.mean(scores[key])))
+        best_score = float(np.mean(scores[best]))
+        return {
+            'success': bool(np.isfinite(best_score)),
+            'model': model_name,
+            'params': candidates[best][1],
+            'score': best_score,
+            'metric': self.metric,
+            'rungs': rungs,
+            'candidates': [
+                {'params': candidates[key][1], 'fold_scores': scores[key]}
+                for key in candidates
+            ],
+            'seconds': time.perf_counter() - start
+        }
+    
+    def tune(self, symbol: str, model_names: List[str], df: pd.DataFrame) -> Dict[str, Dict]:
+        """Tune several models for a symbol and persist each model's best params"""
+        results = {}
+        for model_name in model_names:
+            try:
+                result = self.search(model_name, df)
+            except Exception as e:
+                logger.error(f"Error tuning {model_name}: {str(e)}")
+                result = {'success': False, 'model': model_name, 'error': str(e)}
+            
+            if result['success']:
+                TUNED_PARAMS.set(symbol, model_name, result['params'], result['score'], self.metric)
+            results[model_name] = result
+        return results
@@ -7,6 +7,8 @@ from typing import Dict, Tuple, List
 import pandas_ta as ta
 import logging
 
+from metrics import STAGE_DURATION, timed
+
 logger = logging.getLogger(__name__)
 
 class TechnicalIndicators:
@@ -15,6 +17,7 @@ class TechnicalIndicators:
     def __init__(self):
         pass
     
+    @timed(STAGE_DURATION, stage='indicators')
     def calculate_all_indicators(self, df: pd.DataFrame) -> pd.DataFrame:
         """Calculate all technical indicators"""
         df = df.copy()
@@ -97,6 +100,7 @@ class TechnicalIndicators:
         df['obv'] = ta.obv(df['close'], df['volume'])
         return df
     
+    @timed(STAGE_DURATION, stage='signals')
     def generate_signals(self, df: pd.DataFrame) -> Dict[str, Dict]:
         """
         Generate buy/sell signals based on technical indicators
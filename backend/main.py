@@ -1,18 +1,33 @@
 """
 FastAPI Backend for Financial Analytics Dashboard
 """
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Dict, List, Optional
+import json
 import logging
+import math
+import time
+import numpy as np
 import pandas as pd
 
-from config import ASSETS, CORS_ORIGINS, PREDICTION_HORIZONS, API_HOST, API_PORT
+from config import (
+    ASSETS, CORS_ORIGINS, PREDICTION_HORIZONS, API_HOST, API_PORT,
+    GLOBAL_MODELS, GLOBAL_MODEL_DIR, CV_N_FOLDS, CV_MODE, CV_TIME_BUDGET_SECONDS, TUNING_CANDIDATES, TUNING_TIME_BUDGET_SECONDS
+)
 from data_fetcher import DataFetcher
 from indicators import TechnicalIndicators
-from ml_predictor import MLPredictor
+from ml_predictor import DEFAULT_MODELS, MLPredictor, build_model
+from model_registry import ModelRegistry
 from backtesting import BacktestingEngine
+from ml_models.feature_store import FEATURE_STORE
+from metrics import (
+    FEATURE_STORE_REQUESTS, HTTP_REQUEST_DURATION, HTTP_REQUESTS_IN_FLIGHT, MODEL_REGISTRY_MEMORY_BYTES,
+    MODEL_SETS, REGISTRY as METRICS_REGISTRY, STAGE_DURATION
+)
 
 # Configure logging
 logging.basicConfig(
@@ -40,11 +55,42 @@ app.add_middleware(
 # Initialize components
 data_fetcher = DataFetcher()
 technical_indicators = TechnicalIndicators()
-ml_predictor = MLPredictor()
-backtesting_engine = BacktestingEngine(ml_predictor)
 
-# Store trained models per symbol
-trained_models: Dict[str, bool] = {}
+# Trained model sets per symbol and training configuration
+model_registry = ModelRegistry()
+
+# Global models shared by every symbol (loaded lazily from GLOBAL_MODEL_DIR)
+global_models = None
+
+# Report feature store lookups and feature computation time
+FEATURE_STORE.on_lookup = lambda result: FEATURE_STORE_REQUESTS.labels(result=result).inc()
+FEATURE_STORE.on_compute = STAGE_DURATION.labels(stage='feature_preparation').observe
+
+def _collect_registry_metrics():
+    stats = model_registry.get_stats()
+    MODEL_SETS.labels(location='memory').set(stats['in_memory'])
+    MODEL_SETS.labels(location='disk').set(stats['on_disk'])
+    MODEL_REGISTRY_MEMORY_BYTES.set(model_registry.memory_usage())
+
+METRICS_REGISTRY.add_collector(_collect_registry_metrics)
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Record latency per route template (not raw path, to keep label cardinality bounded)"""
+    start = time.perf_counter()
+    status = 500
+    with HTTP_REQUESTS_IN_FLIGHT.track_inprogress():
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            route = request.scope.get('route')
+            HTTP_REQUEST_DURATION.labels(
+                method=request.method,
+                route=route.path if route is not None else 'unmatched',
+                status=status
+            ).observe(time.perf_counter() - start)
 
 # Pydantic models for request/response
 class TrainRequest(BaseModel):
@@ -54,6 +100,27 @@ class TrainRequest(BaseModel):
     train_end_date: Optional[str] = None    # Format: YYYY-MM-DD
     test_start_date: Optional[str] = None   # Format: YYYY-MM-DD
     test_end_date: Optional[str] = None     # Format: YYYY-MM-DD
+    incremental: bool = False  # Warm-start the registered models instead of retraining them
+
+class CrossValidateRequest(BaseModel):
+    symbol: str
+    period: str = "2y"
+    models: Optional[List[str]] = None  # Default: every ensemble model
+    n_folds: int = CV_N_FOLDS
+    mode: str = CV_MODE  # 'expanding' or 'sliding'
+    time_budget_seconds: Optional[float] = CV_TIME_BUDGET_SECONDS
+
+class TuneRequest(BaseModel):
+    symbol: str
+    period: str = "2y"
+    models: Optional[List[str]] = None  # Default: every ensemble model
+    n_candidates: int = TUNING_CANDIDATES
+    time_budget_seconds: Optional[float] = TUNING_TIME_BUDGET_SECONDS  # Per model
+
+class GlobalTrainRequest(BaseModel):
+    period: str = "2y"
+    symbols: Optional[List[str]] = None  # Default: every configured asset
+    models: Optional[List[str]] = None  # Default: GLOBAL_MODELS
 
 class PredictRequest(BaseModel):
     symbol: str
@@ -76,6 +143,32 @@ class FuturePredictRequest(BaseModel):
     best_config: Dict
     prediction_horizon: str  # '1month' or '3months'
 
+def _json_safe(value):
+    """
+    Copy of value that strict JSON can encode
+    
+    numpy scalars and arrays become Python values and non-finite floats
+    become None: JSON.parse rejects NaN and Infinity.
+    """
+    if isinstance(value, dict):
+        return {str(key): _json_safe(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_json_safe(item) for item in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    return jsonable_encoder(value)
+
+def _sse_event(event: Dict) -> str:
+    """Server-Sent Event carrying event as its data"""
+    return f"event: {event['event']}\ndata: {json.dumps(_json_safe(event), allow_nan=False)}\n\n"
+
+def _backtest_registry_config(request: BacktestRequest, results: Dict) -> Dict:
+    """Registry key for models left trained by a backtest run"""
+    best_ensemble = results.get('best_configs', {}).get('ensemble', {})
+    return {'mode': 'backtest', 'period': request.period, 'best_config': best_ensemble.get('config')}
+
 @app.get("/")
 async def root():
     """Root endpoint"""
@@ -89,10 +182,24 @@ async def root():
             "signals": "/api/signals/{symbol}",
             "train": "/api/train",
             "predictions": "/api/predictions/{symbol}",
-            "model_performance": "/api/models/performance/{symbol}"
+            "backtest_stream": "/api/backtest/stream",
+            "model_performance": "/api/models/performance/{symbol}",
+            "cross_validate": "/api/models/cross-validate",
+            "tune": "/api/models/tune",
+            "train_global": "/api/train/global",
+            "global_predictions": "/api/predictions/global/{symbol}",
+            "metrics": "/metrics"
         }
     }
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus metrics in text exposition format"""
+    return PlainTextResponse(
+        METRICS_REGISTRY.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
 @app.get("/api/assets")
 async def get_assets():
     """Get list of all tracked assets"""
@@ -120,7 +227,8 @@ async def get_data(symbol: str, period: str = "1y"):
         raise HTTPException(status_code=500, detail=f"Failed to fetch data for {symbol}")
     
     # Convert to dict for JSON response
-    data = df.to_dict(orient='records')
+    with STAGE_DURATION.time(stage='serialization'):
+        data = df.to_dict(orient='records')
     
     return {
         "symbol": symbol,
@@ -148,6 +256,7 @@ async def get_indicators(symbol: str, period: str = "1y"):
         latest = df_indicators.iloc[-1]
         
         # Prepare time series data for chart
+        serialization_start = time.perf_counter()
         chart_data = []
         for _, row in df_indicators.iterrows():
             chart_data.append({
@@ -160,6 +269,7 @@ async def get_indicators(symbol: str, period: str = "1y"):
                 'bb_middle': float(row['bb_middle']) if pd.notna(row['bb_middle']) else None,
                 'bb_lower': float(row['bb_lower']) if pd.notna(row['bb_lower']) else None,
             })
+        STAGE_DURATION.labels(stage='serialization').observe(time.perf_counter() - serialization_start)
         
         indicators_data = {
             "symbol": symbol,
@@ -250,8 +360,19 @@ async def train_models(request: TrainRequest):
         logger.info(f"Using custom date range: {len(df)} samples")
     
     try:
-        results = ml_predictor.train_all_models(df)
-        trained_models[request.symbol] = True
+        # The incremental flag is not part of the model set's identity
+        config = request.dict(exclude={'symbol', 'incremental'})
+        predictor = model_registry.get(request.symbol, config) if request.incremental else None
+        if predictor is not None:
+            results = predictor.refresh_models(df)
+        else:
+            predictor = MLPredictor(symbol=request.symbol)
+            results = predictor.train_all_models(df)
+        model_registry.register(
+            request.symbol,
+            config,
+            predictor
+        )
         
         # Add date range info to results
         date_range_info = {
@@ -277,7 +398,8 @@ async def get_predictions(symbol: str, model: str = "ensemble"):
         raise HTTPException(status_code=404, detail=f"Symbol {symbol} not found")
     
     # Check if models are trained
-    if symbol not in trained_models or not trained_models[symbol]:
+    predictor = model_registry.get(symbol)
+    if predictor is None:
         raise HTTPException(
             status_code=400, 
             detail=f"Models not trained for {symbol}. Please train models first using /api/train endpoint."
@@ -289,7 +411,8 @@ async def get_predictions(symbol: str, model: str = "ensemble"):
         raise HTTPException(status_code=500, detail=f"Failed to fetch data for {symbol}")
     
     try:
-        predictions = ml_predictor.get_all_predictions(df, PREDICTION_HORIZONS)
+        predictions = predictor.get_all_predictions(df, PREDICTION_HORIZONS)
+        model_registry.save_ensemble_state(symbol)
         
         return {
             "symbol": symbol,
@@ -312,7 +435,11 @@ async def get_model_performance(symbol: str):
         raise HTTPException(status_code=500, detail=f"Failed to fetch data for {symbol}")
     
     try:
-        performance = ml_predictor.calculate_model_performance(df)
+        predictor = model_registry.get(symbol)
+        if predictor is None:
+            performance = {'error': 'No models trained yet'}
+        else:
+            performance = predictor.calculate_model_performance(df)
         
         return {
             "symbol": symbol,
@@ -323,6 +450,149 @@ async def get_model_performance(symbol: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error calculating performance: {str(e)}")
 
+@app.post("/api/models/cross-validate")
+async def cross_validate_models(request: CrossValidateRequest):
+    """Walk-forward cross-validation of models for a symbol"""
+    from walk_forward import WalkForwardValidator
+    
+    if request.symbol not in ASSETS:
+        raise HTTPException(status_code=404, detail=f"Symbol {request.symbol} not found")
+    
+    df = data_fetcher.get_historical_data(request.symbol, period=request.period)
+    
+    if df is None:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch data for {request.symbol}")
+    
+    validator = WalkForwardValidator(
+        n_folds=request.n_folds,
+        mode=request.mode,
+        time_budget=request.time_budget_seconds
+    )
+    
+    try:
+        results = validator.evaluate_models(request.models or DEFAULT_MODELS, df)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error cross-validating models: {str(e)}")
+    
+    return {
+        "symbol": request.symbol,
+        "name": ASSETS[request.symbol].name,
+        "cross_validation": results
+    }
+
+@app.post("/api/models/tune")
+async def tune_models(request: TuneRequest):
+    """Search hyperparameters for a symbol; later training uses the best ones found"""
+    from hyperparameter_search import SuccessiveHalvingSearch
+    
+    if request.symbol not in ASSETS:
+        raise HTTPException(status_code=404, detail=f"Symbol {request.symbol} not found")
+    
+    df = data_fetcher.get_historical_data(request.symbol, period=request.period)
+    
+    if df is None:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch data for {request.symbol}")
+    
+    search = SuccessiveHalvingSearch(
+        n_candidates=request.n_candidates,
+        time_budget=request.time_budget_seconds
+    )
+    
+    try:
+        results = search.tune(request.symbol, request.models or DEFAULT_MODELS, df)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error tuning models: {str(e)}")
+    
+    return {
+        "symbol": request.symbol,
+        "name": ASSETS[request.symbol].name,
+        "tuning": results
+    }
+
+def _get_global_models():
+    """Trained global models, loaded from disk on first use (None if never trained)"""
+    global global_models
+    if global_models is None:
+        from ml_models.global_model import GlobalModelSet
+        global_models = GlobalModelSet.load(GLOBAL_MODEL_DIR)
+    return global_models
+
+@app.post("/api/train/global")
+async def train_global_models(request: GlobalTrainRequest):
+    """Train one model per type on every symbol at once"""
+    from ml_models.global_model import GlobalModelSet
+    global global_models
+    
+    symbols = request.symbols or list(ASSETS)
+    unknown = [symbol for symbol in symbols if symbol not in ASSETS]
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Symbols not found: {', '.join(unknown)}")
+    
+    frames = {}
+    for symbol in symbols:
+        df = data_fetcher.get_historical_data(symbol, period=request.period)
+        if df is None:
+            logger.warning(f"Skipping {symbol} in global training: no data")
+            continue
+        frames[symbol] = df
+    
+    if not frames:
+        raise HTTPException(status_code=500, detail="Failed to fetch data for every symbol")
+    
+    categories = {symbol: ASSETS[symbol].category for symbol in frames}
+    
+    try:
+        model_set = GlobalModelSet(model_names=request.models or GLOBAL_MODELS, model_factory=build_model)
+        with STAGE_DURATION.time(stage='global_training'):
+            results = model_set.train(frames, categories)
+        model_set.save(GLOBAL_MODEL_DIR)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error training global models: {str(e)}")
+    
+    global_models = model_set
+    
+    return {
+        "symbols": list(frames),
+        "results": results
+    }
+
+@app.get("/api/predictions/global/{symbol}")
+async def get_global_predictions(symbol: str):
+    """Predictions of the global models for all time horizons"""
+    if symbol not in ASSETS:
+        raise HTTPException(status_code=404, detail=f"Symbol {symbol} not found")
+    
+    model_set = _get_global_models()
+    if model_set is None or not model_set.is_trained:
+        raise HTTPException(
+            status_code=400,
+            detail="Global models not trained. Please train them first using /api/train/global endpoint."
+        )
+    
+    df = data_fetcher.get_historical_data(symbol, period="2y")
+    
+    if df is None:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch data for {symbol}")
+    
+    try:
+        predictions = {
+            horizon_name: model_set.predict(df, ASSETS[symbol].category, horizon)
+            for horizon_name, horizon in PREDICTION_HORIZONS.items()
+        }
+        
+        return {
+            "symbol": symbol,
+            "name": ASSETS[symbol].name,
+            "predictions": predictions
+        }
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting predictions: {str(e)}")
+
 @app.get("/api/latest/{symbol}")
 async def get_latest_price(symbol: str):
     """Get latest price for a symbol"""
@@ -356,10 +626,12 @@ async def run_backtest(request: BacktestRequest):
         configs = [config.dict() for config in request.configs]
         
         # Run comparison
+        predictor = MLPredictor(symbol=request.symbol)
+        backtesting_engine = BacktestingEngine(predictor)
         results = backtesting_engine.compare_configurations(df, configs)
         
-        # Mark models as trained for this symbol
-        trained_models[request.symbol] = True
+        # Keep the models retrained with the best ensemble config for this symbol
+        model_registry.register(request.symbol, _backtest_registry_config(request, results), predictor)
         
         return {
             "symbol": request.symbol,
@@ -371,6 +643,49 @@ async def run_backtest(request: BacktestRequest):
         logger.error(f"Error in backtest: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error running backtest: {str(e)}")
 
+@app.post("/api/backtest/stream")
+async def stream_backtest(request: BacktestRequest):
+    """Run historical backtest, streaming progress as Server-Sent Events"""
+    if request.symbol not in ASSETS:
+        raise HTTPException(status_code=404, detail=f"Symbol {request.symbol} not found")
+    
+    df = data_fetcher.get_historical_data(request.symbol, period=request.period)
+    
+    if df is None:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch data for {request.symbol}")
+    
+    configs = [config.dict() for config in request.configs]
+    predictor = MLPredictor(symbol=request.symbol)
+    backtesting_engine = BacktestingEngine(predictor)
+    
+    def event_stream():
+        # Sync generator: Starlette iterates it in a worker thread, so model
+        # training never blocks the event loop
+        try:
+            for event in backtesting_engine.iter_compare_configurations(df, configs):
+                if event['event'] == 'complete':
+                    model_registry.register(
+                        request.symbol,
+                        _backtest_registry_config(request, event['results']),
+                        predictor
+                    )
+                    event = {
+                        'event': 'complete',
+                        'symbol': request.symbol,
+                        'name': ASSETS[request.symbol].name,
+                        'results': event['results']
+                    }
+                yield _sse_event(event)
+        except Exception as e:
+            logger.error(f"Error in streaming backtest: {str(e)}")
+            yield _sse_event({'event': 'error', 'detail': f"Error running backtest: {str(e)}"})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/api/predict-future")
 async def predict_future(request: FuturePredictRequest):
     """Predict future prices using best configuration from backtesting"""
@@ -384,12 +699,20 @@ async def predict_future(request: FuturePredictRequest):
     
     try:
         # Predict future
+        predictor = MLPredictor(symbol=request.symbol)
+        backtesting_engine = BacktestingEngine(predictor)
         future_predictions = backtesting_engine.predict_future(
             df,
             request.best_config,
             request.prediction_horizon
         )
         
+        model_registry.register(
+            request.symbol,
+            {'mode': 'predict_future', 'period': request.period, 'best_config': request.best_config},
+            predictor
+        )
+        
         # Add historical data for continuity in charts
         historical_tail = df.tail(30).to_dict('records')
         for record in historical_tail:
@@ -0,0 +1,289 @@
+"""
+Lightweight Prometheus-style metrics (counters, gauges, histograms)
+
+Instruments are cheap enough to leave on in production: an observation is
+a bisect plus a couple of additions under a lock. render() produces the
+Prometheus text exposition format served by the /metrics endpoint.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# Default latency buckets (seconds), from sub-millisecond to slow model fits
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Model fits run from under a second (Random Forest) to minutes (LSTM)
+FIT_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(label_names: Sequence[str], label_values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value))
+
+class _Metric:
+    """Base class: a named metric with optional labels"""
+    
+    metric_type = "untyped"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], object] = {}
+    
+    def labels(self, **labels):
+        """Get the child for a label set, creating it on first use"""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+    
+    def _default(self):
+        if self.labelnames:
+            raise ValueError(f"Metric {self.name} requires labels: {self.labelnames}")
+        return self.labels()
+    
+    def _new_child(self):
+        raise NotImplementedError
+    
+    def _render_samples(self) -> List[str]:
+        raise NotImplementedError
+    
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.metric_type}"
+        ]
+        lines.extend(self._render_samples())
+        return "\n".join(lines)
+
+class _ValueChild:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+    
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+    
+    def dec(self, amount: float = 1.0):
+        with self._lock:
+            self.value -= amount
+    
+    def set(self, value: float):
+        with self._lock:
+            self.value = float(value)
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+    
+    metric_type = "counter"
+    
+    def _new_child(self):
+        return _ValueChild()
+    
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+    
+    def _render_samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"
+            for key, child in list(self._children.items())
+        ]
+
+class Gauge(Counter):
+    """Value that can go up and down"""
+    
+    metric_type = "gauge"
+    
+    def dec(self, amount: float = 1.0):
+        self._default().dec(amount)
+    
+    def set(self, value: float):
+        self._default().set(value)
+    
+    @contextmanager
+    def track_inprogress(self, **labels):
+        """Increment while the block runs (e.g. queue depth, requests in flight)"""
+        child = self.labels(**labels) if labels else self._default()
+        child.inc()
+        try:
+            yield
+        finally:
+            child.dec()
+
+class _HistogramChild:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+    
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+    
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+class Histogram(_Metric):
+    """Distribution of observations in cumulative buckets"""
+    
+    metric_type = "histogram"
+    
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+    
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+    
+    def observe(self, value: float):
+        self._default().observe(value)
+    
+    def time(self, **labels):
+        """Context manager recording the duration of the block"""
+        child = self.labels(**labels) if labels else self._default()
+        return child.time()
+    
+    def _render_samples(self) -> List[str]:
+        lines = []
+        for key, child in list(self._children.items()):
+            with child._lock:
+                counts, total, count = list(child.counts), child.sum, child.count
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+class MetricsRegistry:
+    """Collection of metrics rendered together"""
+    
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+    
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+    
+    def add_collector(self, collector: Callable[[], None]):
+        """Register a callback run before each render, e.g. to refresh gauges"""
+        self._collectors.append(collector)
+    
+    def render(self) -> str:
+        for collector in self._collectors:
+            collector()
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+REGISTRY = MetricsRegistry()
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+def gauge(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+def histogram(
+    name: str,
+    documentation: str,
+    labelnames: Sequence[str] = (),
+    buckets: Sequence[float] = DEFAULT_BUCKETS
+) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+# Shared instruments
+STAGE_DURATION = histogram(
+    'financial_stage_duration_seconds',
+    'Time spent in each processing stage',
+    ['stage']
+)
+FEATURE_STORE_REQUESTS = counter(
+    'financial_feature_store_requests_total',
+    'Feature matrix lookups by result (hit, extend or miss)',
+    ['result']
+)
+MODEL_FIT_DURATION = histogram(
+    'financial_model_fit_duration_seconds',
+    'Time spent training each model',
+    ['model'],
+    buckets=FIT_BUCKETS
+)
+MODEL_PREDICT_DURATION = histogram(
+    'financial_model_predict_duration_seconds',
+    'Time spent producing a forecast with each model',
+    ['model']
+)
+DATA_CACHE_REQUESTS = counter(
+    'financial_data_cache_requests_total',
+    'Historical data lookups by cache result (hit or miss)',
+    ['result']
+)
+HTTP_REQUEST_DURATION = histogram(
+    'financial_http_request_duration_seconds',
+    'HTTP request latency by route',
+    ['method', 'route', 'status']
+)
+HTTP_REQUESTS_IN_FLIGHT = gauge(
+    'financial_http_requests_in_flight',
+    'HTTP requests currently being handled'
+)
+BACKTEST_CONFIGS_PENDING = gauge(
+    'financial_backtest_configs_pending',
+    'Backtest configurations queued but not yet finished'
+)
+MODEL_SETS = gauge(
+    'financial_model_sets',
+    'Trained model sets held by the model registry',
+    ['location']
+)
+MODEL_REGISTRY_MEMORY_BYTES = gauge(
+    'financial_model_registry_memory_bytes',
+    'Estimated memory used by in-memory model sets'
+)
+
+def timed(histogram_metric: Histogram, **labels):
+    """Decorator recording a function's duration in a histogram"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with histogram_metric.time(**labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
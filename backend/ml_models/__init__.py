@@ -1,14 +1,73 @@
 """
 ML Models package
+
+Model classes are resolved through MODEL_REGISTRY and imported on first
+access, and each model module imports its framework (TensorFlow, Prophet,
+XGBoost, statsmodels) only when a model is trained or loaded. Importing
+this package, or the API that depends on it, therefore stays cheap until
+an ML endpoint is actually used.
 """
-from .lstm_model import LSTMModel
-from .random_forest_model import RandomForestModel
-from .xgboost_model import XGBoostModel
-from .prophet_model import ProphetModel
+import importlib
+from typing import Dict, List, Optional, Tuple
+
+# Model key -> (module, class name)
+MODEL_REGISTRY: Dict[str, Tuple[str, str]] = {
+    'lstm': ('.lstm_model', 'LSTMModel'),
+    'random_forest': ('.random_forest_model', 'RandomForestModel'),
+    'xgboost': ('.xgboost_model', 'XGBoostModel'),
+    'prophet': ('.prophet_model', 'ProphetModel'),
+    'arima': ('.arima_model', 'ARIMAModel'),
+}
+
+_CLASS_TO_KEY = {class_name: key for key, (_, class_name) in MODEL_REGISTRY.items()}
+
+def available_models() -> List[str]:
+    """Keys of all registered model backends"""
+    return list(MODEL_REGISTRY.keys())
+
+def get_model_class(name: str):
+    """Import and return the model class registered under name"""
+    if name not in MODEL_REGISTRY:
+        raise KeyError(f"Unknown model: {name}")
+    module_name, class_name = MODEL_REGISTRY[name]
+    module = importlib.import_module(module_name, __name__)
+    return getattr(module, class_name)
+
+def create_model(
+    name: str,
+    params: Optional[Dict] = None,
+    precision: Optional[str] = None,
+    options: Optional[Dict] = None
+):
+    """
+    Instantiate the model registered under name
+    
+    params (hyperparameters, e.g. tuned ones) and options (runtime
+    settings) are applied on top of the class defaults, and the model runs
+    in precision where it supports it. The caller supplies them; this
+    package reads no application config.
+    """
+    model = get_model_class(name)()
+    if precision is not None:
+        model.set_precision(precision)
+    model.set_params(params or {})
+    model.set_options(options or {})
+    return model
+
+def __getattr__(attr: str):
+    # Keep `from ml_models import LSTMModel` working without eager imports
+    if attr in _CLASS_TO_KEY:
+        return get_model_class(_CLASS_TO_KEY[attr])
+    raise AttributeError(f"module {__name__!r} has no attribute {attr!r}")
 
 __all__ = [
     'LSTMModel',
     'RandomForestModel',
     'XGBoostModel',
-    'ProphetModel'
+    'ProphetModel',
+    'ARIMAModel',
+    'MODEL_REGISTRY',
+    'available_models',
+    'get_model_class',
+    'create_model'
 ]
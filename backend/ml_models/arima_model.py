@@ -0,0 +1,267 @@
+"""
+ARIMA (AutoRegressive Integrated Moving Average) Model
+"""
+import os
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Tuple
+import joblib
+import logging
+
+from .base_model import BaseMLModel
+
+logger = logging.getLogger(__name__)
+
+Order = Tuple[int, int, int]
+
+@lru_cache(maxsize=None)
+def _arima_class():
+    """
+    statsmodels' state-space ARIMA, imported on first use
+    
+    Also ignores statsmodels' fit-time warnings (starting parameters,
+    convergence, KPSS p-value table) for the rest of the process. The
+    filters are installed once because warnings.catch_warnings swaps the
+    process-wide filter list and is not safe around the fits the order
+    search runs on worker threads.
+    """
+    from statsmodels.tools.sm_exceptions import InterpolationWarning
+    from statsmodels.tsa.arima.model import ARIMA
+    warnings.filterwarnings('ignore', module=r'statsmodels\.')
+    warnings.filterwarnings('ignore', category=InterpolationWarning)
+    return ARIMA
+
+class ARIMAModel(BaseMLModel):
+    """ARIMA model with stepwise order selection and analytic prediction intervals"""
+    
+    persisted_attributes = ('max_p', 'max_q', 'max_d')
+    search_space = {
+        'max_p': [2, 5],
+        'max_q': [2, 5],
+        'max_d': [1, 2]
+    }
+    prefix_consistent = True
+    supports_incremental = True
+    
+    def __init__(self):
+        super().__init__("ARIMA")
+        self.model = None
+        self.max_p = 5
+        self.max_q = 5
+        self.max_d = 2
+    
+    @staticmethod
+    def _trend(d: int) -> str:
+        """Constant for stationary series, drift for once-differenced ones"""
+        return {0: 'c', 1: 't'}.get(d, 'n')
+    
+    def select_differencing(self, y: np.ndarray) -> int:
+        """Smallest d for which the KPSS test no longer rejects stationarity"""
+        from statsmodels.tsa.stattools import kpss
+        
+        # Installs the warning filters before the KPSS tests run
+        _arima_class()
+        d = 0
+        while d < self.max_d and kpss(y, regression='c', nlags='auto')[1] < 0.05:
+            y = np.diff(y)
+            d += 1
+        return d
+    
+    def _fit_order(self, y: np.ndarray, order: Order):
+        """Fit one candidate order; None if it fails to converge"""
+        try:
+            return _arima_class()(y, order=order, trend=self._trend(order[1])).fit()
+        except Exception:
+            return None
+    
+    def select_order(self, y: np.ndarray, n_jobs: Optional[int] = None) -> Tuple[Order, object]:
+        """
+        Stepwise (Hyndman-Khandakar) search over (p, q) minimizing AIC
+        
+        Starts from four small models and then only visits the neighbours
+        (p +/- 1, q +/- 1) of the best model so far, instead of the full
+        (max_p + 1) x (max_q + 1) grid. Each round's candidates are fitted
+        concurrently.
+        
+        Returns:
+            The selected order and its fitted results
+        """
+        d = self.select_differencing(y)
+        fitted = {}
+        
+        def evaluate(orders: List[Order]):
+            pending = [
+                order for order in dict.fromkeys(orders)
+                if order not in fitted
+                and 0 <= order[0] <= self.max_p and 0 <= order[2] <= self.max_q
+            ]
+            with ThreadPoolExecutor(max_workers=n_jobs or os.cpu_count()) as pool:
+                for order, result in zip(pending, pool.map(lambda o: self._fit_order(y, o), pending)):
+                    fitted[order] = result
+        
+        def best() -> Optional[Order]:
+            scored = [(result.aic, order) for order, result in fitted.items() if result is not None]
+            return min(scored)[1] if scored else None
+        
+        evaluate([(2, d, 2), (0, d, 0), (1, d, 0), (0, d, 1)])
+        current = best()
+        if current is None:
+            raise ValueError("No ARIMA candidate could be fitted")
+        
+        while True:
+            p, _, q = current
+            evaluate([
+                (p + dp, d, q + dq)
+                for dp in (-1, 0, 1) for dq in (-1, 0, 1)
+                if (dp, dq) != (0, 0)
+            ])
+            candidate = best()
+            if candidate == current:
+                break
+            current = candidate
+        
+        return current, fitted[current]
+    
+    def train(self, df: pd.DataFrame) -> Dict:
+        """Train ARIMA model"""
+        return self._fit(df)
+    
+    def update(self, df: pd.DataFrame) -> Dict:
+        """Refit the selected order on df, starting from the current parameters"""
+        return self._fit(df, incremental=True)
+    
+    def _fit(self, df: pd.DataFrame, incremental: bool = False) -> Dict:
+        """Fit ARIMA on df: stepwise order search, or the current order warm-started"""
+        try:
+            logger.info(f"{'Updating' if incremental else 'Training'} {self.name} model...")
+            # ARIMA is univariate: model the close price series
+            y = df['close'].to_numpy(dtype=float)
+            split_idx = self.split_index(len(y))
+            y_train, y_test = y[:split_idx], y[split_idx:]
+            
+            if incremental:
+                order = tuple(self.model['order'])
+                result = _arima_class()(y_train, order=order, trend=self.model['trend']).fit(
+                    start_params=self.model['params']
+                )
+            else:
+                order, result = self.select_order(y_train, self.n_threads)
+            
+            # One-step-ahead predictions over the test period with the fitted parameters
+            extended = result.append(y_test)
+            y_pred = extended.predict(start=split_idx, end=len(y) - 1)
+            metrics = self.calculate_metrics(y_test, y_pred)
+            
+            self.model = {
+                'order': order,
+                'trend': self._trend(order[1]),
+                'params': np.asarray(result.params)
+            }
+            # Recorded only once the fit succeeded, so a failed refresh is retried
+            self.record_training_window(df, incremental=incremental)
+            self.is_trained = True
+            
+            return {
+                'success': True,
+                'model': self.name,
+                'metrics': metrics,
+                'order': list(order),
+                'aic': float(result.aic),
+                'model_specs': {
+                    'total_samples': len(y),
+                    'train_samples': len(y_train),
+                    'test_samples': len(y_test),
+                    'n_features': 1,  # close price only
+                    'train_test_split': '80/20',
+                    'hyperparameters': {
+                        'order': list(order),
+                        'trend': self.model['trend'],
+                        'max_p': self.max_p,
+                        'max_q': self.max_q,
+                        'max_d': self.max_d,
+                        'selection': 'previous order (warm start)' if incremental else 'stepwise AIC'
+                    },
+                    'feature_list': ['close']
+                }
+            }
+        
+        except Exception as e:
+            logger.error(f"Error training {self.name}: {str(e)}")
+            return {
+                'success': False,
+                'error': str(e)
+            }
+    
+    @classmethod
+    def train_many(
+        cls,
+        frames: Dict[str, pd.DataFrame],
+        max_workers: Optional[int] = None
+    ) -> Dict[str, Tuple['ARIMAModel', Dict]]:
+        """
+        Fit one ARIMA per symbol in a single call
+        
+        Symbols are fitted concurrently; within each symbol the stepwise
+        search runs serially so the pool is not oversubscribed.
+        
+        Returns:
+            symbol -> (fitted model, training result)
+        """
+        def fit(frame: pd.DataFrame) -> Tuple['ARIMAModel', Dict]:
+            model = cls()
+            model.set_thread_budget(1)
+            return model, model.train(frame)
+        
+        with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as pool:
+            return dict(zip(frames.keys(), pool.map(fit, frames.values())))
+    
+    def _save_model(self, path: str):
+        joblib.dump(self.model, os.path.join(path, 'model.joblib'))
+    
+    def _load_model(self, path: str):
+        self.model = joblib.load(os.path.join(path, 'model.joblib'))
+    
+    def estimate_memory_bytes(self) -> int:
+        """Only the order and a handful of fitted coefficients are kept"""
+        if self.model is None:
+            return 0
+        return int(self.model['params'].nbytes)
+    
+    def predict(self, df: pd.DataFrame, horizon: int) -> Dict:
+        """Make predictions for future periods"""
+        self.ensure_loaded()
+        if not self.is_trained or self.model is None:
+            return {
+                'success': False,
+                'error': 'Model not trained'
+            }
+        
+        try:
+            # Run the Kalman filter over the latest data with the fitted
+            # parameters (no refit), then forecast in closed form
+            y = df['close'].to_numpy(dtype=float)
+            arima = _arima_class()(y, order=self.model['order'], trend=self.model['trend'])
+            result = arima.filter(self.model['params'])
+            
+            forecast = result.get_forecast(horizon)
+            predictions = np.asarray(forecast.predicted_mean)
+            interval = np.asarray(forecast.conf_int(alpha=0.05))
+            
+            return {
+                'success': True,
+                'model': self.name,
+                'predictions': [float(p) for p in predictions],
+                'lower_bound': [float(l) for l in interval[:, 0]],
+                'upper_bound': [float(u) for u in interval[:, 1]],
+                'horizon': horizon
+            }
+        
+        except Exception as e:
+            logger.error(f"Error predicting with {self.name}: {str(e)}")
+            return {
+                'success': False,
+                'error': str(e)
+            }
@@ -2,50 +2,403 @@
 Base model class for ML predictions
 """
 from abc import ABC, abstractmethod
+from datetime import datetime
+import os
 import pandas as pd
 import numpy as np
-from typing import Dict, Tuple, Optional
+from numpy.lib.stride_tricks import sliding_window_view
+from typing import Dict, List, Tuple, Optional
 from sklearn.preprocessing import MinMaxScaler
+import joblib
 import logging
 
+from .feature_state import BatchFeatureState, RollingFeatureState
+from .feature_store import FEATURE_STORE
+
 logger = logging.getLogger(__name__)
 
+class StalenessPolicy:
+    """
+    Decide whether a trained model can be refreshed incrementally
+    
+    A warm-start update is cheap but drifts from a clean fit, so a full
+    refit is forced once the last full fit is too old, too many updates
+    have been stacked on it, or the new bars are a large share of the
+    window it was fitted on.
+    """
+    
+    def __init__(
+        self,
+        max_age_days: float = 30,
+        max_updates: int = 10,
+        max_new_rows_fraction: float = 0.25
+    ):
+        self.max_age_days = max_age_days
+        self.max_updates = max_updates
+        self.max_new_rows_fraction = max_new_rows_fraction
+    
+    def decide(self, model: 'BaseMLModel', df: pd.DataFrame) -> Tuple[str, str]:
+        """Return ('skip' | 'incremental' | 'full', reason)"""
+        if not model.is_trained:
+            return 'full', 'model not trained'
+        if not model.supports_incremental:
+            return 'full', 'model has no incremental update'
+        
+        metadata = model.training_metadata
+        n_updates = metadata.get('n_updates', 0)
+        if n_updates >= self.max_updates:
+            return 'full', f'{n_updates} incremental updates since the last full fit'
+        
+        full_fit_at = metadata.get('full_fit_at') or metadata.get('trained_at')
+        if full_fit_at is None:
+            return 'full', 'time of last full fit unknown'
+        age_days = (datetime.now() - datetime.fromisoformat(full_fit_at)).total_seconds() / 86400
+        if age_days > self.max_age_days:
+            return 'full', f'last full fit is {age_days:.0f} days old'
+        
+        try:
+            train_end = pd.to_datetime(metadata['train_end'])
+            n_new = int((pd.to_datetime(df['date']) > train_end).sum())
+        except (KeyError, TypeError, ValueError):
+            return 'full', 'cannot tell which bars are new'
+        
+        if n_new == 0:
+            return 'skip', 'no new bars since the last fit'
+        if n_new > self.max_new_rows_fraction * metadata.get('n_rows', 0):
+            return 'full', f'{n_new} new bars exceed {self.max_new_rows_fraction:.0%} of the training window'
+        return 'incremental', f'{n_new} new bars'
+
 class BaseMLModel(ABC):
     """Abstract base class for ML models"""
     
+    # Hyperparameters saved alongside the fitted model
+    persisted_attributes: Tuple[str, ...] = ()
+    
+    # Runtime settings callers may set (see set_options); not saved
+    option_attributes: Tuple[str, ...] = ()
+    
+    # Candidate values per hyperparameter for hyperparameter_search (a
+    # subset of persisted_attributes, so tuned values are saved and reach
+    # parallel training workers)
+    search_space: Dict[str, List] = {}
+    
+    # True when the forecast for a shorter horizon is an exact prefix of a longer
+    # one, so MLPredictor can run the longest horizon once and slice it
+    prefix_consistent: bool = False
+    
+    # Lags and rolling windows used by prepare_features (shared with RollingFeatureState)
+    FEATURE_LAGS: Tuple[int, ...] = (1, 5, 10)
+    FEATURE_WINDOWS: Tuple[int, ...] = (5, 10, 20)
+    
+    # Steps ahead predicted by direct (multi-output) forecasting; days in
+    # between are interpolated and later days hold the last bucket
+    DIRECT_HORIZONS: Tuple[int, ...] = (1, 2, 3, 5, 10, 21, 42, 63, 126)
+    
+    # 'recursive' feeds each prediction back; 'direct' predicts every horizon at once
+    forecast_strategy: str = 'recursive'
+    
+    # Conformal prediction bands: miscoverage (0.05 -> 95% bands), the longest
+    # horizon calibrated, the most recent holdout origins backtested and the
+    # fewest residuals a horizon needs for its own quantile
+    interval_alpha: float = 0.05
+    conformal_max_horizon: int = 126
+    conformal_max_origins: int = 500
+    conformal_min_residuals: int = 20
+    
+    # Most threads the framework can use while fitting (None = scales with cores)
+    max_threads: Optional[int] = None
+    
+    # True when update() warm-starts from the fitted model instead of retraining
+    supports_incremental: bool = False
+    
+    # Numeric precisions of the feature pipeline; models listing 'precision' in
+    # persisted_attributes can run features, scaling and fitting in float32
+    PRECISIONS: Tuple[str, ...] = ('float64', 'float32')
+    
     def __init__(self, name: str):
         self.name = name
         self.scaler = MinMaxScaler()
         self.is_trained = False
         self.feature_columns = []
+        self.training_metadata = {}
+        self._pending_load_path = None
+        # Incremented on every fit/load so cached forecasts of older fits are never reused
+        self.model_version = 0
+        # Thread budget for fitting; None lets the framework use every core
+        self.n_threads = None
+        # Relative error quantile per forecast step, set by calibrate_intervals
+        self.conformal_quantiles: Optional[np.ndarray] = None
+        # Hold out exactly this many final rows instead of 20% (walk-forward folds)
+        self.holdout_rows: Optional[int] = None
+        # 'float64' or 'float32' (see set_precision)
+        self.precision = 'float64'
+    
+    def set_params(self, params: Dict):
+        """Set hyperparameters (persisted attributes) by name"""
+        for attr, value in params.items():
+            if attr not in self.persisted_attributes:
+                raise ValueError(f"{self.name} has no hyperparameter {attr}")
+            setattr(self, attr, value)
+    
+    def set_options(self, options: Dict):
+        """Set runtime settings (option_attributes) by name"""
+        for attr, value in options.items():
+            if attr not in self.option_attributes:
+                raise ValueError(f"{self.name} has no option {attr}")
+            setattr(self, attr, value)
+    
+    def set_precision(self, precision: str):
+        """
+        Run the feature matrix, scaling and model inputs in float32 or float64
+        
+        Models without a float32 path (precision not persisted) stay in float64.
+        """
+        if precision not in self.PRECISIONS:
+            raise ValueError(f"Unknown precision: {precision}")
+        if 'precision' in self.persisted_attributes:
+            self.precision = precision
+    
+    @property
+    def dtype(self) -> np.dtype:
+        return np.dtype(self.precision)
+    
+    def set_thread_budget(self, n_threads: Optional[int]):
+        """Limit the threads used when fitting (e.g. when models train side by side)"""
+        if n_threads is not None and self.max_threads is not None:
+            n_threads = min(n_threads, self.max_threads)
+        self.n_threads = n_threads
+    
+    def record_training_window(self, df: pd.DataFrame, incremental: bool = False):
+        """Remember which data the model was trained on"""
+        self.model_version += 1
+        previous = self.training_metadata
+        trained_at = datetime.now().isoformat()
+        self.training_metadata = {
+            'train_start': str(df['date'].iloc[0]) if 'date' in df.columns and len(df) else None,
+            'train_end': str(df['date'].iloc[-1]) if 'date' in df.columns and len(df) else None,
+            'n_rows': len(df),
+            'trained_at': trained_at,
+            'full_fit_at': (previous.get('full_fit_at') or previous.get('trained_at')) if incremental else trained_at,
+            'n_updates': previous.get('n_updates', 0) + 1 if incremental else 0
+        }
+    
+    def update(self, df: pd.DataFrame) -> Dict:
+        """Incrementally update the fitted model on new data (full retrain unless overridden)"""
+        return self.train(df)
+    
+    def refresh(self, df: pd.DataFrame, policy: Optional[StalenessPolicy] = None) -> Dict:
+        """Bring the model up to date with df: skip, warm-start update or full refit"""
+        self.ensure_loaded()
+        action, reason = (policy or StalenessPolicy()).decide(self, df)
+        logger.info(f"Refreshing {self.name}: {action} ({reason})")
+        
+        if action == 'skip':
+            return {
+                'success': True,
+                'model': self.name,
+                'refresh': action,
+                'refresh_reason': reason
+            }
+        
+        result = self.update(df) if action == 'incremental' else self.train(df)
+        result['refresh'] = action
+        result['refresh_reason'] = reason
+        return result
     
     def prepare_features(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Prepare features for training/prediction"""
-        df = df.copy()
+        """
+        Prepare features for training/prediction
+        
+        Served from the shared feature store, so the frame is computed once
+        per input frame and shared by every model; do not modify it.
+        """
+        feature_set = FEATURE_STORE.get(df, self.FEATURE_LAGS, self.FEATURE_WINDOWS)
+        self.feature_columns = list(feature_set.columns)
+        return feature_set.frame
+    
+    def feature_matrix(self, df: pd.DataFrame) -> np.ndarray:
+        """Read-only feature_columns matrix of prepare_features(df), in the model's precision"""
+        feature_set = FEATURE_STORE.get(df, self.FEATURE_LAGS, self.FEATURE_WINDOWS)
+        self.feature_columns = list(feature_set.columns)
+        return feature_set.matrix_as(self.dtype)
+    
+    def predict_rows(self, X: np.ndarray) -> np.ndarray:
+        """Fitted model's predictions for feature rows (overridden by faster backends)"""
+        return self.model.predict(X)
+    
+    def recursive_forecast(self, df: pd.DataFrame, horizon: int) -> List[float]:
+        """
+        Forecast horizon steps by feeding each prediction back as the next close
         
-        # Create technical features
-        df['returns'] = df['close'].pct_change()
-        df['log_volume'] = np.log1p(df['volume'])
+        Features for each step come from a RollingFeatureState, so a step is
+        O(1) instead of re-running prepare_features on the extended frame.
+        Requires prepare_features to have set feature_columns.
+        """
+        state = RollingFeatureState(
+            df, self.feature_columns, self.FEATURE_LAGS, self.FEATURE_WINDOWS
+        )
+        predictions = []
+        for _ in range(horizon):
+            pred = float(self.predict_rows(state.current_features())[0])
+            predictions.append(pred)
+            state.append(pred)
+        return predictions
+    
+    def direct_targets(self, df_features: pd.DataFrame) -> np.ndarray:
+        """Relative close change DIRECT_HORIZONS steps ahead of each row (NaN past the end)"""
+        close = df_features['close'].to_numpy(dtype=float)
+        targets = np.full((len(close), len(self.DIRECT_HORIZONS)), np.nan)
+        for j, step in enumerate(self.DIRECT_HORIZONS):
+            if step < len(close):
+                targets[:-step, j] = close[step:] / close[:-step] - 1
+        return targets
+    
+    def direct_training_data(self, df_features: pd.DataFrame, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows of X whose every direct target lies inside df_features, with those targets"""
+        targets = self.direct_targets(df_features)
+        valid = ~np.isnan(targets).any(axis=1)
+        if not valid.any():
+            raise ValueError(
+                f"Direct forecasting needs more than {max(self.DIRECT_HORIZONS)} training rows"
+            )
+        return X[valid], targets[valid]
+    
+    def direct_metrics(self, test_df: pd.DataFrame, predicted_changes: np.ndarray) -> Dict:
+        """Metrics of the one-step-ahead column of direct predictions on the test set"""
+        close = test_df['close'].to_numpy(dtype=float)
+        y_pred = close[:-1] * (1 + predicted_changes[:-1, 0])
+        return self.calculate_metrics(close[1:], y_pred)
+    
+    def direct_forecast(self, predicted_changes: np.ndarray, last_close: float, horizon: int) -> np.ndarray:
+        """Daily price path from relative changes predicted at DIRECT_HORIZONS"""
+        steps = np.arange(1, horizon + 1)
+        return last_close * (1 + np.interp(steps, self.DIRECT_HORIZONS, predicted_changes))
+    
+    def slice_forecast(self, result: Dict, horizon: int) -> Dict:
+        """
+        Cut a longer forecast down to horizon steps
         
-        # Lag features
-        for lag in [1, 5, 10]:
-            df[f'close_lag_{lag}'] = df['close'].shift(lag)
-            df[f'volume_lag_{lag}'] = df['volume'].shift(lag)
+        Every per-step list (predictions, bounds, trend, ...) is truncated.
+        Models whose interval width depends on the horizon override this.
+        """
+        full_horizon = result.get('horizon', len(result.get('predictions', [])))
+        sliced = {
+            key: value[:horizon] if isinstance(value, list) and len(value) == full_horizon else value
+            for key, value in result.items()
+        }
+        sliced['horizon'] = horizon
+        return sliced
+    
+    def direct_paths(self, predicted_changes: np.ndarray, last_closes: np.ndarray, horizon: int) -> np.ndarray:
+        """direct_forecast for many rows at once, shape (n_rows, horizon)"""
+        # Linear interpolation is linear in the bucket values, so it is one matrix product
+        steps = np.arange(1, horizon + 1)
+        weights = np.array([
+            np.interp(steps, self.DIRECT_HORIZONS, unit)
+            for unit in np.eye(len(self.DIRECT_HORIZONS))
+        ])
+        return last_closes[:, None] * (1 + predicted_changes @ weights)
+    
+    def holdout_feature_state(
+        self,
+        df_features: pd.DataFrame,
+        X: np.ndarray,
+        origins: np.ndarray,
+        horizon: int
+    ) -> BatchFeatureState:
+        """BatchFeatureState advancing one recursive path from each origin row"""
+        close = df_features['close'].to_numpy(dtype=float)
+        volume = df_features['volume'].to_numpy(dtype=float)
+        history = max(max(self.FEATURE_LAGS) + 1, max(self.FEATURE_WINDOWS))
+        offsets = np.arange(-history + 1, 1)
+        rows = np.clip(origins[:, None] + offsets, 0, None)
+        return BatchFeatureState(close[rows], volume[rows], X[origins], self.feature_columns, horizon)
+    
+    def holdout_origins(self, n_rows: int, split_idx: int) -> Tuple[np.ndarray, int]:
+        """Holdout rows used as forecast origins for calibration, and the horizon they can be scored on"""
+        start = max(split_idx, n_rows - 1 - self.conformal_max_origins)
+        origins = np.arange(start, n_rows - 1)
+        horizon = min(self.conformal_max_horizon, len(origins) - self.conformal_min_residuals + 1)
+        return origins, horizon
+    
+    @staticmethod
+    def realized_closes(close: np.ndarray, origins: np.ndarray, horizon: int) -> np.ndarray:
+        """actual[i, h] is the close h + 1 bars after origins[i] (NaN past the end)"""
+        padded = np.concatenate([close, np.full(horizon, np.nan)])
+        return sliding_window_view(padded[origins[0] + 1:], horizon)[:len(origins)]
+    
+    def holdout_forecasts(
+        self,
+        df_features: pd.DataFrame,
+        X: np.ndarray,
+        origins: np.ndarray,
+        horizon: int
+    ) -> np.ndarray:
+        """
+        Forecast paths from many feature rows at once, shape (len(origins), horizon)
+        
+        Recursive forecasting advances every path together: a step is one
+        batched predict_rows call with features from a BatchFeatureState,
+        instead of len(origins) x horizon single-row calls.
+        """
+        if self.forecast_strategy == 'direct':
+            close = df_features['close'].to_numpy(dtype=float)
+            return self.direct_paths(self.predict_rows(X[origins]), close[origins], horizon)
         
-        # Rolling statistics
-        for window in [5, 10, 20]:
-            df[f'ma_{window}'] = df['close'].rolling(window=window).mean()
-            df[f'std_{window}'] = df['close'].rolling(window=window).std()
-            df[f'volume_ma_{window}'] = df['volume'].rolling(window=window).mean()
+        state = self.holdout_feature_state(df_features, X, origins, horizon)
+        
+        paths = np.empty((len(origins), horizon))
+        for step in range(horizon):
+            paths[:, step] = self.predict_rows(state.current_features())
+            state.append(paths[:, step])
+        return paths
+    
+    def calibrate_intervals(self, df_features: pd.DataFrame, X: np.ndarray, split_idx: int):
+        """
+        Fit per-step conformal quantiles from multi-step forecasts on the holdout split
         
-        # Drop NaN values
-        df = df.dropna()
+        Every holdout row is used as a forecast origin, and the relative
+        errors of all paths against the realized closes give, per step
+        ahead, the (1 - interval_alpha) split-conformal quantile. predict
+        then only looks the widths up (see conformal_interval). Leaves
+        conformal_quantiles unset when the holdout is too short.
+        """
+        self.conformal_quantiles = None
+        close = df_features['close'].to_numpy(dtype=float)
+        origins, horizon = self.holdout_origins(len(close), split_idx)
+        if horizon < 1:
+            logger.warning(f"{self.name}: holdout too short to calibrate conformal intervals")
+            return
         
-        # Define feature columns (excluding target and date)
-        self.feature_columns = [col for col in df.columns 
-                                if col not in ['date', 'close', 'open', 'high', 'low']]
+        paths = self.holdout_forecasts(df_features, X, origins, horizon)
+        actual = self.realized_closes(close, origins, horizon)
+        quantiles = self.conformal_score_quantiles(np.abs(actual / paths - 1))
         
-        return df
+        # Uncertainty does not shrink further ahead; smooth out sampling noise
+        self.conformal_quantiles = np.maximum.accumulate(quantiles)
+    
+    def conformal_score_quantiles(self, scores: np.ndarray) -> np.ndarray:
+        """Per-column (1 - interval_alpha) split-conformal quantile of scores, ignoring NaNs"""
+        # Finite-sample conformal rank per step; NaNs sort after the residuals
+        n_residuals = np.count_nonzero(~np.isnan(scores), axis=0)
+        rank = np.minimum(np.ceil((n_residuals + 1) * (1 - self.interval_alpha)).astype(int), n_residuals)
+        return np.sort(scores, axis=0)[rank - 1, np.arange(scores.shape[1])]
+    
+    def conformal_interval(self, predictions) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Lower and upper bands around a forecast path from the calibrated quantiles
+        
+        Steps past the calibrated horizon widen with the square root of time.
+        Returns None when the model has no calibration.
+        """
+        if self.conformal_quantiles is None:
+            return None
+        predictions = np.asarray(predictions, dtype=float)
+        n_calibrated = len(self.conformal_quantiles)
+        steps = np.arange(1, len(predictions) + 1)
+        width = (self.conformal_quantiles[np.minimum(steps, n_calibrated) - 1]
+                 * np.sqrt(np.maximum(steps / n_calibrated, 1.0)))
+        return predictions * (1 - width), predictions * (1 + width)
     
     def create_sequences(
         self, 
@@ -53,12 +406,28 @@ class BaseMLModel(ABC):
         target: np.ndarray,
         lookback: int = 60
     ) -> Tuple[np.ndarray, np.ndarray]:
-        """Create sequences for time series prediction"""
-        X, y = [], []
-        for i in range(lookback, len(data)):
-            X.append(data[i-lookback:i])
-            y.append(target[i])
-        return np.array(X), np.array(y)
+        """
+        Create sequences for time series prediction
+        
+        X[i] is data[i:i + lookback] and y[i] is target[i + lookback]. X is a
+        read-only strided view of data (no window is copied); call
+        np.ascontiguousarray on it if a writable array is needed.
+        """
+        data = np.asarray(data)
+        target = np.asarray(target)
+        if len(data) <= lookback:
+            return np.empty((0, lookback) + data.shape[1:], dtype=data.dtype), target[:0]
+        
+        windows = sliding_window_view(data[:-1], lookback, axis=0)
+        # sliding_window_view puts the window axis last: (n, features, lookback)
+        X = np.moveaxis(windows, -1, 1)
+        return X, target[lookback:]
+    
+    def split_index(self, n_rows: int, test_size: float = 0.2) -> int:
+        """Number of leading rows used for training; the rest are held out"""
+        if self.holdout_rows is not None:
+            return max(0, n_rows - self.holdout_rows)
+        return int(n_rows * (1 - test_size))
     
     def train_test_split(
         self, 
@@ -66,7 +435,7 @@ class BaseMLModel(ABC):
         test_size: float = 0.2
     ) -> Tuple[pd.DataFrame, pd.DataFrame]:
         """Split data into train and test sets"""
-        split_idx = int(len(df) * (1 - test_size))
+        split_idx = self.split_index(len(df), test_size)
         train_df = df.iloc[:split_idx]
         test_df = df.iloc[split_idx:]
         return train_df, test_df
@@ -104,10 +473,79 @@ class BaseMLModel(ABC):
         """Make predictions"""
         pass
     
+    def save(self, path: str):
+        """Save the fitted model, scaler, feature columns and training metadata to a directory"""
+        if not self.is_trained:
+            raise ValueError(f"{self.name} model is not trained")
+        
+        self.ensure_loaded()
+        os.makedirs(path, exist_ok=True)
+        joblib.dump({
+            'scaler': self.scaler,
+            'feature_columns': self.feature_columns,
+            'training_metadata': self.training_metadata,
+            'conformal_quantiles': self.conformal_quantiles,
+            'params': {attr: getattr(self, attr) for attr in self.persisted_attributes}
+        }, os.path.join(path, 'state.joblib'))
+        self._save_model(path)
+    
+    def load(self, path: str, lazy: bool = True):
+        """
+        Load a model saved with save()
+        
+        With lazy=True only the small state file is read now; the fitted
+        model itself is deserialized on first use via ensure_loaded().
+        """
+        state = joblib.load(os.path.join(path, 'state.joblib'))
+        self.scaler = state['scaler']
+        self.feature_columns = state['feature_columns']
+        self.training_metadata = state['training_metadata']
+        self.conformal_quantiles = state.get('conformal_quantiles')
+        for attr, value in state['params'].items():
+            setattr(self, attr, value)
+        
+        self._pending_load_path = path
+        self.model_version += 1
+        if not lazy:
+            self.ensure_loaded()
+        self.is_trained = True
+    
+    def ensure_loaded(self):
+        """Deserialize a lazily loaded model"""
+        if self._pending_load_path is None:
+            return
+        path = self._pending_load_path
+        self._pending_load_path = None
+        logger.info(f"Loading {self.name} model from {path}")
+        self._load_model(path)
+    
+    def _save_model(self, path: str):
+        """Serialize the fitted model into the directory"""
+        raise NotImplementedError(f"{self.name} does not support saving")
+    
+    def _load_model(self, path: str):
+        """Deserialize the fitted model from the directory"""
+        raise NotImplementedError(f"{self.name} does not support loading")
+    
+    def estimate_memory_bytes(self) -> int:
+        """Approximate in-memory size of the fitted model (used by the model registry)"""
+        return 0
+    
+    def memory_bytes(self) -> int:
+        """estimate_memory_bytes, or the size of the saved files while a lazy load is pending"""
+        if self._pending_load_path is not None:
+            return sum(
+                os.path.getsize(os.path.join(root, name))
+                for root, _, names in os.walk(self._pending_load_path)
+                for name in names
+            )
+        return self.estimate_memory_bytes()
+    
     def get_model_info(self) -> Dict:
         """Get model information"""
         return {
             'name': self.name,
             'is_trained': self.is_trained,
-            'features': self.feature_columns
+            'features': self.feature_columns,
+            'training_metadata': self.training_metadata
         }
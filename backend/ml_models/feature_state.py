@@ -0,0 +1,187 @@
+"""
+Incremental feature state for recursive multi-step forecasting
+"""
+from collections import deque
+from math import log1p, sqrt
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+def parse_feature_column(column: str) -> Tuple[str, int]:
+    """Map a feature column to (kind, parameter), e.g. 'ma_20' -> ('ma', 20)"""
+    for kind in ('close_lag_', 'volume_lag_', 'volume_ma_', 'ma_', 'std_'):
+        if column.startswith(kind) and column[len(kind):].isdigit():
+            return kind.rstrip('_'), int(column[len(kind):])
+    if column in ('volume', 'returns', 'log_volume'):
+        return column, 0
+    return 'passthrough', 0
+
+class RollingFeatureState:
+    """
+    Latest feature row of BaseMLModel.prepare_features, updated in O(1) per bar
+    
+    Recursive forecasting appends one predicted bar per step. Instead of
+    re-running prepare_features on the whole frame each time, this keeps
+    ring buffers of the last closes/volumes plus running window sums, so a
+    step costs a fixed number of arithmetic operations regardless of how
+    much history was supplied.
+    
+    Appended bars reuse the last observed volume. Feature columns that
+    prepare_features does not derive (e.g. yfinance's dividends and stock
+    splits) are carried forward from the last observed bar.
+    """
+    
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        feature_columns: Sequence[str],
+        lags: Sequence[int] = (1, 5, 10),
+        windows: Sequence[int] = (5, 10, 20)
+    ):
+        self.feature_columns = list(feature_columns)
+        self.lags = tuple(lags)
+        self.windows = tuple(windows)
+        
+        self.min_history = max(max(self.lags) + 1, max(self.windows))
+        if len(df) < self.min_history:
+            raise ValueError(f"Need at least {self.min_history} rows, got {len(df)}")
+        
+        # One extra slot so the value leaving the largest window is still available
+        buffer_len = self.min_history + 1
+        closes = df['close'].to_numpy(dtype=float)[-buffer_len:]
+        volumes = df['volume'].to_numpy(dtype=float)[-buffer_len:]
+        self._closes = deque(closes, maxlen=buffer_len)
+        self._volumes = deque(volumes, maxlen=buffer_len)
+        
+        # Rolling sums are kept relative to an anchor price to limit
+        # cancellation error in the variance of nearly constant prices
+        self._anchor = float(closes[-1])
+        self._close_sum = {}
+        self._close_sumsq = {}
+        self._volume_sum = {}
+        for window in self.windows:
+            shifted = closes[-window:] - self._anchor
+            self._close_sum[window] = float(shifted.sum())
+            self._close_sumsq[window] = float((shifted ** 2).sum())
+            self._volume_sum[window] = float(volumes[-window:].sum())
+        
+        self._plan = [parse_feature_column(col) for col in self.feature_columns]
+        last_row = df.iloc[-1]
+        self._passthrough = {
+            col: float(last_row[col])
+            for col, (kind, _) in zip(self.feature_columns, self._plan)
+            if kind == 'passthrough'
+        }
+        
+        self._row = np.empty((1, len(self.feature_columns)))
+    
+    def append(self, close: float, volume: Optional[float] = None):
+        """Add the next bar (volume defaults to the last observed value)"""
+        volume = self._volumes[-1] if volume is None else float(volume)
+        shifted = float(close) - self._anchor
+        
+        for window in self.windows:
+            leaving_close = self._closes[-window] - self._anchor
+            self._close_sum[window] += shifted - leaving_close
+            self._close_sumsq[window] += shifted * shifted - leaving_close * leaving_close
+            self._volume_sum[window] += volume - self._volumes[-window]
+        
+        self._closes.append(float(close))
+        self._volumes.append(volume)
+    
+    def current_features(self) -> np.ndarray:
+        """Feature row (shape 1 x n_features) in feature_columns order"""
+        closes, volumes, row = self._closes, self._volumes, self._row[0]
+        
+        for i, (kind, param) in enumerate(self._plan):
+            if kind == 'close_lag':
+                row[i] = closes[-1 - param]
+            elif kind == 'volume_lag':
+                row[i] = volumes[-1 - param]
+            elif kind == 'ma':
+                row[i] = self._close_sum[param] / param + self._anchor
+            elif kind == 'std':
+                total = self._close_sum[param]
+                variance = (self._close_sumsq[param] - total * total / param) / (param - 1)
+                row[i] = sqrt(variance) if variance > 0 else 0.0
+            elif kind == 'volume_ma':
+                row[i] = self._volume_sum[param] / param
+            elif kind == 'volume':
+                row[i] = volumes[-1]
+            elif kind == 'returns':
+                row[i] = closes[-1] / closes[-2] - 1
+            elif kind == 'log_volume':
+                row[i] = log1p(volumes[-1])
+            else:
+                row[i] = self._passthrough[self.feature_columns[i]]
+        
+        return self._row.copy()
+
+class BatchFeatureState:
+    """
+    Feature rows of many forecast paths, advanced one step at a time together
+    
+    The vectorized counterpart of RollingFeatureState, used to backtest
+    forecasts from many origins at once: every path keeps its own close
+    and volume history (one row per path) and each step recomputes the
+    features of all paths with array operations.
+    """
+    
+    def __init__(
+        self,
+        closes: np.ndarray,
+        volumes: np.ndarray,
+        last_rows: np.ndarray,
+        feature_columns: Sequence[str],
+        max_steps: int
+    ):
+        """
+        Args:
+            closes: Close history of each path, shape (n_paths, history)
+            volumes: Volume history of each path, same shape
+            last_rows: Last observed feature row of each path (supplies
+                passthrough columns), shape (n_paths, n_features)
+            feature_columns: Column order of last_rows
+            max_steps: Most bars that will be appended
+        """
+        n_paths, history = closes.shape
+        self._closes = np.empty((n_paths, history + max_steps))
+        self._volumes = np.empty((n_paths, history + max_steps))
+        self._closes[:, :history] = closes
+        self._volumes[:, :history] = volumes
+        self._end = history
+        self._plan = [parse_feature_column(col) for col in feature_columns]
+        self._rows = np.array(last_rows, dtype=float)
+    
+    def append(self, closes: np.ndarray):
+        """Add the next bar of every path (volumes repeat the last observed value)"""
+        self._closes[:, self._end] = closes
+        self._volumes[:, self._end] = self._volumes[:, self._end - 1]
+        self._end += 1
+    
+    def current_features(self) -> np.ndarray:
+        """Feature rows (shape n_paths x n_features) in feature_columns order"""
+        closes = self._closes[:, :self._end]
+        volumes = self._volumes[:, :self._end]
+        rows = self._rows
+        
+        for i, (kind, param) in enumerate(self._plan):
+            if kind == 'close_lag':
+                rows[:, i] = closes[:, -1 - param]
+            elif kind == 'volume_lag':
+                rows[:, i] = volumes[:, -1 - param]
+            elif kind == 'ma':
+                rows[:, i] = closes[:, -param:].mean(axis=1)
+            elif kind == 'std':
+                rows[:, i] = closes[:, -param:].std(axis=1, ddof=1)
+            elif kind == 'volume_ma':
+                rows[:, i] = volumes[:, -param:].mean(axis=1)
+            elif kind == 'volume':
+                rows[:, i] = volumes[:, -1]
+            elif kind == 'returns':
+                rows[:, i] = closes[:, -1] / closes[:, -2] - 1
+            elif kind == 'log_volume':
+                rows[:, i] = np.log1p(volumes[:, -1])
+        
+        return rows.copy()
@@ -0,0 +1,243 @@
+"""
+Feature store shared by all models and calls
+
+prepare_features used to run inside every model's train and predict, each
+time copying the input frame and recomputing the same lags and rolling
+windows. The store computes the feature frame once per (data fingerprint,
+feature spec) and hands every model the same frame and read-only matrix.
+When a long frame only appends bars to one already cached, just the new
+rows (plus enough history for the largest window) are computed.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Price columns that are inputs or the target, never features
+NON_FEATURE_COLUMNS = ('date', 'close', 'open', 'high', 'low')
+
+def row_hashes(df: pd.DataFrame) -> np.ndarray:
+    """Per-row uint64 hashes of a frame's values (the index is ignored)"""
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+def data_fingerprint(df: pd.DataFrame, hashes: Optional[np.ndarray] = None) -> str:
+    """Content hash of a frame (values and column names, not the index)"""
+    if hashes is None:
+        hashes = row_hashes(df)
+    digest = hashlib.sha1()
+    digest.update(repr(list(df.columns)).encode('utf-8'))
+    digest.update(hashes.tobytes())
+    return digest.hexdigest()
+
+def compute_features(df: pd.DataFrame, lags: Sequence[int], windows: Sequence[int]) -> pd.DataFrame:
+    """Lag, return and rolling-window features, with incomplete rows dropped"""
+    df = df.copy()
+    
+    # Create technical features
+    df['returns'] = df['close'].pct_change()
+    df['log_volume'] = np.log1p(df['volume'])
+    
+    # Lag features
+    for lag in lags:
+        df[f'close_lag_{lag}'] = df['close'].shift(lag)
+        df[f'volume_lag_{lag}'] = df['volume'].shift(lag)
+    
+    # Rolling statistics
+    for window in windows:
+        df[f'ma_{window}'] = df['close'].rolling(window=window).mean()
+        df[f'std_{window}'] = df['close'].rolling(window=window).std()
+        df[f'volume_ma_{window}'] = df['volume'].rolling(window=window).mean()
+    
+    # Drop NaN values
+    return df.dropna()
+
+class FeatureSet:
+    """Cached features of one input frame for one feature spec"""
+    
+    def __init__(
+        self,
+        frame: pd.DataFrame,
+        input_columns: List[str],
+        hashes: np.ndarray,
+        matrix: Optional[np.ndarray] = None
+    ):
+        # Indexed by row position in the input frame
+        self.frame = frame
+        self.input_columns = input_columns
+        self.row_hashes = hashes
+        self.columns = [col for col in frame.columns if col not in NON_FEATURE_COLUMNS]
+        # Matrices are built per dtype on first request, so float32 models
+        # never pay for a float64 copy (and vice versa)
+        self.matrices: Dict[np.dtype, np.ndarray] = {}
+        if matrix is not None:
+            matrix.flags.writeable = False
+            self.matrices[matrix.dtype] = matrix
+    
+    @property
+    def matrix(self) -> np.ndarray:
+        return self.matrix_as(np.float64)
+    
+    def matrix_as(self, dtype) -> np.ndarray:
+        """Read-only feature matrix in the given dtype"""
+        dtype = np.dtype(dtype)
+        matrix = self.matrices.get(dtype)
+        if matrix is None:
+            matrix = self.frame[self.columns].to_numpy(dtype=dtype)
+            matrix.flags.writeable = False
+            self.matrices[dtype] = matrix
+        return matrix
+    
+    @property
+    def n_input_rows(self) -> int:
+        return len(self.row_hashes)
+    
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the feature matrices"""
+        return sum(matrix.nbytes for matrix in self.matrices.values())
+
+class FeatureStore:
+    """
+    LRU store of FeatureSets keyed by (data fingerprint, lags, windows)
+    
+    Returned frames and matrices are shared between callers and must not
+    be modified (the matrix is flagged read-only).
+    """
+    
+    def __init__(self, max_entries: int = 32, min_extend_rows: int = 5000):
+        self.max_entries = max_entries
+        # Below this many cached rows a full recompute beats pandas' fixed
+        # per-operation overhead on the small tail frame
+        self.min_extend_rows = min_extend_rows
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple, FeatureSet]" = OrderedDict()
+        # Instrumentation hooks set by the application: on_lookup gets 'hit',
+        # 'extend' or 'miss', on_compute the seconds spent computing features
+        self.on_lookup: Optional[Callable[[str], None]] = None
+        self.on_compute: Optional[Callable[[float], None]] = None
+    
+    def _record_lookup(self, result: str):
+        if self.on_lookup is not None:
+            self.on_lookup(result)
+    
+    def get(self, df: pd.DataFrame, lags: Sequence[int], windows: Sequence[int]) -> FeatureSet:
+        """Features for df, computed at most once per distinct frame"""
+        spec = (tuple(lags), tuple(windows))
+        hashes = row_hashes(df)
+        key = (data_fingerprint(df, hashes), spec)
+        
+        with self._lock:
+            feature_set = self._entries.get(key)
+            if feature_set is not None:
+                self._entries.move_to_end(key)
+                self._record_lookup('hit')
+                return feature_set
+            base = self._find_prefix(list(df.columns), hashes, spec)
+        
+        start = time.perf_counter()
+        if base is not None:
+            self._record_lookup('extend')
+            feature_set = self._extend(base, df, hashes, lags, windows)
+        else:
+            self._record_lookup('miss')
+            frame = compute_features(df.reset_index(drop=True), lags, windows)
+            feature_set = FeatureSet(frame, list(df.columns), hashes)
+        if self.on_compute is not None:
+            self.on_compute(time.perf_counter() - start)
+        
+        self._store(key, feature_set)
+        return feature_set
+    
+    def get_window(
+        self,
+        df: pd.DataFrame,
+        start: int,
+        end: int,
+        lags: Sequence[int],
+        windows: Sequence[int]
+    ) -> FeatureSet:
+        """
+        Features of df.iloc[start:end], cut from the features of the whole frame
+        
+        Lags and rolling windows only look back, so once a window has enough
+        history of its own its feature rows equal the whole frame's rows; the
+        leading rows compute_features would drop are dropped here too. The
+        matrix is a view of the whole frame's, so walk-forward folds share it.
+        Matrices already built for the whole frame are sliced the same way.
+        The window's features are stored, so get() on the window hits.
+        """
+        full = self.get(df, lags, windows)
+        # Rows compute_features drops at the start of any frame
+        warmup = full.frame.index[0]
+        lo, hi = np.searchsorted(full.frame.index, [start + warmup, end])
+        
+        window_df = df.iloc[start:end]
+        hashes = full.row_hashes[start:end]
+        frame = full.frame.iloc[lo:hi].set_axis(full.frame.index[lo:hi] - start)
+        feature_set = FeatureSet(frame, full.input_columns, hashes)
+        feature_set.matrices = {dtype: matrix[lo:hi] for dtype, matrix in full.matrices.items()}
+        self.put(window_df, lags, windows, feature_set)
+        return feature_set
+    
+    def put(self, df: pd.DataFrame, lags: Sequence[int], windows: Sequence[int], feature_set: FeatureSet):
+        """Store features computed elsewhere (e.g. in another process) for df"""
+        key = (data_fingerprint(df, feature_set.row_hashes), (tuple(lags), tuple(windows)))
+        self._store(key, feature_set)
+    
+    def _store(self, key: Tuple, feature_set: FeatureSet):
+        with self._lock:
+            self._entries[key] = feature_set
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def _find_prefix(self, columns: List[str], hashes: np.ndarray, spec: Tuple) -> Optional[FeatureSet]:
+        """Longest cached frame whose rows are a leading prefix of the new frame"""
+        best = None
+        for (_, entry_spec), entry in self._entries.items():
+            n_rows = entry.n_input_rows
+            if (entry_spec == spec and entry.input_columns == columns
+                    and self.min_extend_rows <= n_rows < len(hashes) and (best is None or n_rows > best.n_input_rows)
+                    and np.array_equal(entry.row_hashes, hashes[:n_rows])):
+                best = entry
+        return best
+    
+    def _extend(
+        self,
+        base: FeatureSet,
+        df: pd.DataFrame,
+        hashes: np.ndarray,
+        lags: Sequence[int],
+        windows: Sequence[int]
+    ) -> FeatureSet:
+        """Features for df computed only for the rows appended after base"""
+        n_old = base.n_input_rows
+        # Rows each new feature row looks back on (largest lag + 1 or largest window)
+        context = max(max(lags) + 1, max(windows))
+        start = max(0, n_old - context)
+        
+        tail = df.iloc[start:].set_axis(pd.RangeIndex(start, len(df)))
+        tail_features = compute_features(tail, lags, windows)
+        tail_features = tail_features[tail_features.index >= n_old]
+        
+        frame = pd.concat([base.frame, tail_features])
+        feature_set = FeatureSet(frame, list(df.columns), hashes)
+        for dtype, matrix in base.matrices.items():
+            tail_matrix = tail_features[base.columns].to_numpy(dtype=dtype)
+            feature_set.matrices[dtype] = np.concatenate([matrix, tail_matrix])
+            feature_set.matrices[dtype].flags.writeable = False
+        return feature_set
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+# Process-wide store used by BaseMLModel.prepare_features
+FEATURE_STORE = FeatureStore()
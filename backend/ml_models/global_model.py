@@ -0,0 +1,376 @@
+"""
+Global multi-asset models
+
+Per-symbol training fits every model type once per symbol, each on a few
+hundred rows. A global model is one model of a type fitted on the stacked
+rows of every symbol. Price features are expressed relative to the bar's
+close and volume features as log ratios to the longest volume average,
+so a currency pair near 7 and an index near 40,000 share one feature
+scale; the target is the next bar's relative change. A one-hot encoding
+of the asset category (AssetConfig.category) is appended to every row.
+Any symbol, including one the model was not trained on, is forecast by
+the same fitted model.
+"""
+import os
+import shutil
+from collections import deque
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import joblib
+import logging
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .base_model import BaseMLModel
+from .feature_state import RollingFeatureState, parse_feature_column
+from .feature_store import FEATURE_STORE
+
+logger = logging.getLogger(__name__)
+
+# Model types that can be trained globally
+GLOBAL_MODEL_TYPES = ('random_forest', 'xgboost', 'lstm')
+
+def normalize_features(X: np.ndarray, columns: Sequence[str], close: np.ndarray) -> np.ndarray:
+    """
+    Scale-free copy of feature rows
+    
+    Prices (lags, moving averages) become relative to the row's close,
+    standard deviations a fraction of it, and volumes log ratios to the
+    longest volume moving average (0 for symbols without volume).
+    """
+    columns = list(columns)
+    volume_windows = [param for kind, param in map(parse_feature_column, columns) if kind == 'volume_ma']
+    reference = f'volume_ma_{max(volume_windows)}' if volume_windows else 'volume'
+    log_reference = np.log1p(X[:, columns.index(reference)])
+    close = np.asarray(close, dtype=float)
+    
+    normalized = np.empty(X.shape)
+    for i, (kind, _) in enumerate(map(parse_feature_column, columns)):
+        if kind in ('close_lag', 'ma'):
+            normalized[:, i] = X[:, i] / close - 1
+        elif kind == 'std':
+            normalized[:, i] = X[:, i] / close
+        elif kind in ('volume', 'volume_lag', 'volume_ma'):
+            normalized[:, i] = np.log1p(X[:, i]) - log_reference
+        elif kind == 'log_volume':
+            normalized[:, i] = X[:, i] - log_reference
+        else:
+            normalized[:, i] = X[:, i]
+    return normalized
+
+class GlobalModel:
+    """One model of a type fitted on the normalized rows of every symbol"""
+    
+    def __init__(
+        self,
+        model_name: str,
+        categories: Sequence[str],
+        model_factory: Optional[Callable[[str], BaseMLModel]] = None
+    ):
+        if model_name not in GLOBAL_MODEL_TYPES:
+            raise ValueError(f"{model_name} cannot be trained as a global model")
+        
+        from . import create_model
+        
+        self.model_name = model_name
+        self.categories = sorted(set(categories))
+        # Hyperparameters and estimator construction of the per-symbol model
+        # class, configured by the caller's factory (class defaults without one)
+        self.template: BaseMLModel = (model_factory or create_model)(model_name)
+        self.estimator = None
+        self.feature_columns: List[str] = []
+        # Targets are divided by this so the network sees unit-scale values
+        self.target_scale = 1.0
+        # Std of one-step relative errors on the holdout, for the bands
+        self.residual_std = 0.0
+        self.training_metadata = {}
+        self.is_trained = False
+    
+    @property
+    def is_sequence_model(self) -> bool:
+        return self.model_name == 'lstm'
+    
+    @property
+    def sequence_length(self) -> int:
+        return self.template.lookback if self.is_sequence_model else 1
+    
+    def _one_hot(self, category: str) -> np.ndarray:
+        return np.array([float(category == c) for c in self.categories])
+    
+    def _features(self, df: pd.DataFrame) -> Tuple[pd.DataFrame, np.ndarray]:
+        """Feature frame of df and its feature_columns matrix"""
+        frame = FEATURE_STORE.get(df, BaseMLModel.FEATURE_LAGS, BaseMLModel.FEATURE_WINDOWS).frame
+        return frame, frame[self.feature_columns].to_numpy(dtype=float)
+    
+    def design_rows(self, df: pd.DataFrame, category: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Normalized feature rows plus category one-hot, and each row's close"""
+        frame, X = self._features(df)
+        close = frame['close'].to_numpy(dtype=float)
+        one_hot = np.broadcast_to(self._one_hot(category), (len(X), len(self.categories)))
+        rows = np.hstack([normalize_features(X, self.feature_columns, close), one_hot])
+        return rows.astype(self.template.dtype, copy=False), close
+    
+    def _samples(self, rows: np.ndarray, close: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Model inputs ending at each bar with a next bar, their targets and the bars' closes"""
+        changes = close[1:] / close[:-1] - 1
+        if not self.is_sequence_model:
+            return rows[:-1], changes, close[:-1]
+        
+        # Window ending at bar t (inclusive) predicts the change from t to t + 1
+        length = self.sequence_length
+        windows = np.moveaxis(sliding_window_view(rows[:-1], length, axis=0), -1, 1)
+        return windows, changes[length - 1:], close[length - 1:-1]
+    
+    def train(self, frames: Dict[str, pd.DataFrame], categories: Dict[str, str]) -> Dict:
+        """
+        Fit on every symbol's frame at once
+        
+        Args:
+            frames: symbol -> price frame
+            categories: symbol -> asset category
+        """
+        try:
+            logger.info(f"Training global {self.model_name} model on {len(frames)} symbols...")
+            
+            # Only feature columns every symbol has (e.g. not all have dividends)
+            column_sets = [
+                FEATURE_STORE.get(df, BaseMLModel.FEATURE_LAGS, BaseMLModel.FEATURE_WINDOWS).columns
+                for df in frames.values()
+            ]
+            self.feature_columns = [col for col in column_sets[0] if all(col in cols for cols in column_sets)]
+            
+            # Hold out the last 20% of every symbol's samples
+            parts = {'X_train': [], 'y_train': [], 'X_test': [], 'y_test': [], 'close_test': []}
+            test_symbols = []
+            for symbol, df in frames.items():
+                rows, close = self.design_rows(df, categories[symbol])
+                X, y, sample_close = self._samples(rows, close)
+                split_idx = self.template.split_index(len(y))
+                parts['X_train'].append(X[:split_idx])
+                parts['y_train'].append(y[:split_idx])
+                parts['X_test'].append(X[split_idx:])
+                parts['y_test'].append(y[split_idx:])
+                parts['close_test'].append(sample_close[split_idx:])
+                test_symbols.append(symbol)
+            
+            X_train = np.concatenate(parts['X_train'])
+            y_train = np.concatenate(parts['y_train'])
+            X_test = np.concatenate(parts['X_test'])
+            y_test = np.concatenate(parts['y_test'])
+            self.target_scale = float(y_train.std()) or 1.0
+            
+            if self.is_sequence_model:
+                self.estimator = self.template.build_model((X_train.shape[1], X_train.shape[2]))
+                self.estimator.fit(
+                    X_train, y_train / self.target_scale,
+                    epochs=self.template.epochs,
+                    batch_size=self.template.batch_size,
+                    validation_data=(X_test, y_test / self.target_scale),
+                    callbacks=self.template.fit_callbacks(),
+                    verbose=0
+                )
+            else:
+                self.estimator = self.template.build_regressor()
+                self.estimator.fit(X_train, y_train / self.target_scale)
+            self.is_trained = True
+            
+            predicted = self._predict_changes(X_test)
+            self.residual_std = float(np.std(y_test - predicted))
+            
+            # Price metrics per symbol (pooled price errors would mix price scales)
+            metrics_by_symbol = {}
+            offset = 0
+            for symbol, closes in zip(test_symbols, parts['close_test']):
+                window = slice(offset, offset + len(closes))
+                offset += len(closes)
+                metrics_by_symbol[symbol] = self.template.calculate_metrics(
+                    closes * (1 + y_test[window]), closes * (1 + predicted[window])
+                )
+            
+            self.training_metadata = {
+                'symbols': list(frames),
+                'n_rows': int(len(y_train) + len(y_test)),
+                'trained_at': datetime.now().isoformat()
+            }
+            
+            return {
+                'success': True,
+                'model': f'Global {self.template.name}',
+                'metrics': {
+                    'return_rmse': float(np.sqrt(np.mean((y_test - predicted) ** 2))),
+                    'return_mae': float(np.mean(np.abs(y_test - predicted))),
+                    'direction_accuracy': float(np.mean(np.sign(y_test) == np.sign(predicted)) * 100)
+                },
+                'metrics_by_symbol': metrics_by_symbol,
+                'model_specs': {
+                    'symbols': list(frames),
+                    'categories': self.categories,
+                    'train_samples': int(len(y_train)),
+                    'test_samples': int(len(y_test)),
+                    'n_features': len(self.feature_columns) + len(self.categories),
+                    'feature_list': self.feature_columns + [f'category_{c}' for c in self.categories],
+                    'hyperparameters': {
+                        attr: getattr(self.template, attr) for attr in self.template.persisted_attributes
+                    }
+                }
+            }
+        
+        except Exception as e:
+            logger.error(f"Error training global {self.model_name}: {str(e)}")
+            return {
+                'success': False,
+                'error': str(e)
+            }
+    
+    def _predict_changes(self, X: np.ndarray) -> np.ndarray:
+        if self.is_sequence_model:
+            outputs = self.estimator(X.astype(np.float32), training=False).numpy()[:, 0]
+        else:
+            outputs = self.estimator.predict(X)
+        return np.asarray(outputs, dtype=float) * self.target_scale
+    
+    def predict(self, df: pd.DataFrame, category: str, horizon: int) -> Dict:
+        """Recursive forecast for one symbol's frame"""
+        if not self.is_trained:
+            return {
+                'success': False,
+                'error': 'Model not trained'
+            }
+        
+        try:
+            rows, close = self.design_rows(df, category)
+            one_hot = self._one_hot(category)
+            state = RollingFeatureState(
+                df, self.feature_columns, BaseMLModel.FEATURE_LAGS, BaseMLModel.FEATURE_WINDOWS
+            )
+            window = deque(rows[-self.sequence_length:], maxlen=self.sequence_length)
+            last_close = float(close[-1])
+            
+            predictions = []
+            for step in range(horizon):
+                if step > 0:
+                    row = normalize_features(state.current_features(), self.feature_columns, [last_close])[0]
+                    window.append(np.concatenate([row, one_hot]))
+                X = np.array(window)[None] if self.is_sequence_model else window[-1][None]
+                last_close *= 1 + float(self._predict_changes(X)[0])
+                predictions.append(last_close)
+                state.append(last_close)
+            
+            # One-step errors compound like a random walk over the path
+            predictions = np.array(predictions)
+            width = 1.96 * self.residual_std * np.sqrt(np.arange(1, horizon + 1))
+            
+            return {
+                'success': True,
+                'model': f'Global {self.template.name}',
+                'predictions': [float(p) for p in predictions],
+                'lower_bound': [float(l) for l in predictions * (1 - width)],
+                'upper_bound': [float(u) for u in predictions * (1 + width)],
+                'horizon': horizon
+            }
+        
+        except Exception as e:
+            logger.error(f"Error predicting with global {self.model_name}: {str(e)}")
+            return {
+                'success': False,
+                'error': str(e)
+            }
+    
+    def save(self, path: str):
+        """Save the fitted model and its state to a directory"""
+        if not self.is_trained:
+            raise ValueError(f"Global {self.model_name} model is not trained")
+        
+        os.makedirs(path, exist_ok=True)
+        joblib.dump({
+            'model_name': self.model_name,
+            'categories': self.categories,
+            'feature_columns': self.feature_columns,
+            'target_scale': self.target_scale,
+            'residual_std': self.residual_std,
+            'training_metadata': self.training_metadata,
+            'params': {attr: getattr(self.template, attr) for attr in self.template.persisted_attributes}
+        }, os.path.join(path, 'state.joblib'))
+        
+        if self.is_sequence_model:
+            self.estimator.save(os.path.join(path, 'model.keras'))
+        else:
+            joblib.dump(self.estimator, os.path.join(path, 'model.joblib'))
+    
+    @classmethod
+    def load(cls, path: str) -> 'GlobalModel':
+        """Load a model saved with save()"""
+        state = joblib.load(os.path.join(path, 'state.joblib'))
+        model = cls(state['model_name'], state['categories'])
+        model.template.set_params(state['params'])
+        model.feature_columns = state['feature_columns']
+        model.target_scale = state['target_scale']
+        model.residual_std = state['residual_std']
+        model.training_metadata = state['training_metadata']
+        
+        if model.is_sequence_model:
+            from tensorflow import keras
+            model.estimator = keras.models.load_model(os.path.join(path, 'model.keras'))
+        else:
+            model.estimator = joblib.load(os.path.join(path, 'model.joblib'))
+        model.is_trained = True
+        return model
+
+class GlobalModelSet:
+    """Global models of several types, trained and queried together"""
+    
+    def __init__(
+        self,
+        model_names: Sequence[str] = GLOBAL_MODEL_TYPES,
+        categories: Sequence[str] = (),
+        model_factory: Optional[Callable[[str], BaseMLModel]] = None
+    ):
+        self.models = {name: GlobalModel(name, categories, model_factory) for name in model_names}
+    
+    def train(self, frames: Dict[str, pd.DataFrame], categories: Dict[str, str]) -> Dict[str, Dict]:
+        """Fit every model type once on all symbols"""
+        for model in self.models.values():
+            model.categories = sorted(set(categories.values()))
+        return {name: model.train(frames, categories) for name, model in self.models.items()}
+    
+    def predict(self, df: pd.DataFrame, category: str, horizon: int) -> Dict[str, Dict]:
+        """Forecast one symbol with every global model"""
+        return {name: model.predict(df, category, horizon) for name, model in self.models.items()}
+    
+    @property
+    def is_trained(self) -> bool:
+        return any(model.is_trained for model in self.models.values())
+    
+    def save(self, path: str):
+        """
+        Save every trained model type under path, replacing what was there
+        
+        The set is written to a sibling directory and then swapped in, so
+        types from an earlier save that are no longer trained are not picked
+        up by load(), and a failed save leaves the previous set intact.
+        """
+        tmp_path = f"{path}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        for name, model in self.models.items():
+            if model.is_trained:
+                model.save(os.path.join(tmp_path, name))
+        
+        old_path = f"{path}.old"
+        shutil.rmtree(old_path, ignore_errors=True)
+        if os.path.exists(path):
+            os.replace(path, old_path)
+        os.replace(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+    
+    @classmethod
+    def load(cls, path: str) -> Optional['GlobalModelSet']:
+        """Load every saved model type under path (None if nothing was saved)"""
+        names = [name for name in GLOBAL_MODEL_TYPES if os.path.exists(os.path.join(path, name, 'state.joblib'))]
+        if not names:
+            return None
+        model_set = cls(model_names=())
+        model_set.models = {name: GlobalModel.load(os.path.join(path, name)) for name in names}
+        return model_set
@@ -1,21 +1,30 @@
 """
 LSTM (Long Short-Term Memory) Neural Network Model
 """
+import importlib.util
+import os
+import time
 import numpy as np
 import pandas as pd
-from typing import Dict
+from numpy.lib.stride_tricks import sliding_window_view
+from typing import Dict, List
 import logging
 
-try:
-    from tensorflow import keras
-    from tensorflow.keras.models import Sequential
-    from tensorflow.keras.layers import LSTM, Dense, Dropout
-    from tensorflow.keras.optimizers import Adam
-    TENSORFLOW_AVAILABLE = True
-except ImportError:
-    TENSORFLOW_AVAILABLE = False
+# Only check for TensorFlow here; importing it takes seconds and hundreds of MB
+TENSORFLOW_AVAILABLE = importlib.util.find_spec('tensorflow') is not None
+if not TENSORFLOW_AVAILABLE:
     logging.warning("TensorFlow not available. LSTM model will not work.")
 
+keras = None
+
+def _import_keras():
+    """Import Keras on first use"""
+    global keras
+    if keras is None:
+        from tensorflow import keras as _keras
+        keras = _keras
+    return keras
+
 from .base_model import BaseMLModel
 
 logger = logging.getLogger(__name__)
@@ -23,39 +32,116 @@ logger = logging.getLogger(__name__)
 class LSTMModel(BaseMLModel):
     """LSTM model for time series prediction"""
     
+    persisted_attributes = ('lookback', 'epochs', 'batch_size', 'precision', 'architecture')
+    option_attributes = ('early_stopping_patience', 'intra_op_threads', 'inter_op_threads')
+    search_space = {
+        'lookback': [30, 60, 90],
+        'epochs': [20, 50],
+        'batch_size': [32, 64],
+        'architecture': ['stacked', 'compact', 'gru']
+    }
+    
+    # Architecture presets: recurrent cell, units per recurrent layer, dense
+    # units and dropout after each recurrent layer. 'compact' and 'gru' train
+    # several times faster on CPU than the original stacked network
+    ARCHITECTURES = {
+        'stacked': {'cell': 'LSTM', 'units': (128, 64, 32), 'dense': 16, 'dropout': 0.2},
+        'compact': {'cell': 'LSTM', 'units': (32,), 'dense': 16, 'dropout': 0.1},
+        'gru': {'cell': 'GRU', 'units': (64,), 'dense': 16, 'dropout': 0.1},
+    }
+    prefix_consistent = True
+    
+    # Above this many training windows, batches are gathered on the fly by a
+    # tf.data pipeline instead of handing Keras the full (n, lookback, features) array
+    streaming_threshold = 10000
+    supports_incremental = True
+    
     def __init__(self):
         super().__init__("LSTM")
         self.model = None
         self.lookback = 60
         self.epochs = 50
         self.batch_size = 32
+        # Key of ARCHITECTURES
+        self.architecture = 'stacked'
+        # Stop after this many epochs without a lower validation loss (None = run every epoch)
+        self.early_stopping_patience = 5
+        # TensorFlow op threads (None = the thread budget, or TensorFlow's default)
+        self.intra_op_threads = None
+        self.inter_op_threads = None
+        # Epochs an incremental update continues training for
+        self.refresh_epochs = 5
+        self._inference_fn = None
     
-    def build_model(self, input_shape: tuple) -> Sequential:
+    def build_model(self, input_shape: tuple) -> 'keras.Sequential':
         """Build LSTM model architecture"""
         if not TENSORFLOW_AVAILABLE:
             raise ImportError("TensorFlow is required for LSTM model")
         
-        model = Sequential([
-            LSTM(128, return_sequences=True, input_shape=input_shape),
-            Dropout(0.2),
-            LSTM(64, return_sequences=True),
-            Dropout(0.2),
-            LSTM(32, return_sequences=False),
-            Dropout(0.2),
-            Dense(16, activation='relu'),
-            Dense(1)
-        ])
+        if self.architecture not in self.ARCHITECTURES:
+            raise ValueError(f"Unknown LSTM architecture: {self.architecture}")
+        
+        keras = _import_keras()
+        layers = keras.layers
+        preset = self.ARCHITECTURES[self.architecture]
+        cell = getattr(layers, preset['cell'])
+        
+        model = keras.Sequential([keras.Input(shape=input_shape)])
+        for i, units in enumerate(preset['units']):
+            # Every recurrent layer but the last passes on its full sequence
+            model.add(cell(units, return_sequences=i < len(preset['units']) - 1))
+            model.add(layers.Dropout(preset['dropout']))
+        model.add(layers.Dense(preset['dense'], activation='relu'))
+        model.add(layers.Dense(1))
         
         model.compile(
-            optimizer=Adam(learning_rate=0.001),
+            optimizer=keras.optimizers.Adam(learning_rate=0.001),
             loss='mse',
             metrics=['mae']
         )
         
         return model
     
+    def _configure_threads(self):
+        """Apply the op thread settings to TensorFlow (only possible before its runtime starts)"""
+        intra_op_threads = self.intra_op_threads or self.n_threads
+        inter_op_threads = self.inter_op_threads or (min(2, self.n_threads) if self.n_threads else None)
+        if intra_op_threads is None and inter_op_threads is None:
+            return
+        
+        import tensorflow as tf
+        threading = tf.config.threading
+        if (threading.get_intra_op_parallelism_threads() == (intra_op_threads or 0)
+                and threading.get_inter_op_parallelism_threads() == (inter_op_threads or 0)):
+            return
+        try:
+            if intra_op_threads is not None:
+                threading.set_intra_op_parallelism_threads(intra_op_threads)
+            if inter_op_threads is not None:
+                threading.set_inter_op_parallelism_threads(inter_op_threads)
+        except RuntimeError:
+            logger.warning("TensorFlow already initialized; thread settings not applied")
+    
+    def fit_callbacks(self) -> list:
+        """Early stopping on the validation loss, keeping the best epoch's weights"""
+        if not self.early_stopping_patience:
+            return []
+        return [_import_keras().callbacks.EarlyStopping(
+            monitor='val_loss',
+            patience=self.early_stopping_patience,
+            restore_best_weights=True
+        )]
+    
     def train(self, df: pd.DataFrame) -> Dict:
         """Train LSTM model"""
+        return self._fit(df)
+    
+    def update(self, df: pd.DataFrame) -> Dict:
+        """Continue training the current weights on df for refresh_epochs epochs"""
+        return self._fit(df, incremental=True)
+    
+    def _fit(self, df: pd.DataFrame, incremental: bool = False) -> Dict:
+        """Fit the network on df, from fresh weights or continuing from the current ones"""
         if not TENSORFLOW_AVAILABLE:
             return {
                 'success': False,
@@ -63,21 +149,30 @@ class LSTMModel(BaseMLModel):
             }
         
         try:
-            logger.info(f"Training {self.name} model...")
+            logger.info(f"{'Updating' if incremental else 'Training'} {self.name} model...")
+            self._configure_threads()
             
-            # Prepare features
+            # Prepare features (shared read-only matrix from the feature store)
             df_features = self.prepare_features(df)
+            features = self.feature_matrix(df)
             
             # Split data
             train_df, test_df = self.train_test_split(df_features)
             
-            # Scale features
-            train_features = self.scaler.fit_transform(train_df[self.feature_columns])
-            test_features = self.scaler.transform(test_df[self.feature_columns])
+            # Scale features (an update keeps the scaling the weights were trained with)
+            if incremental:
+                train_features = self.scaler.transform(features[:len(train_df)])
+            else:
+                train_features = self.scaler.fit_transform(features[:len(train_df)])
+            # Test windows take their history from the end of the training split,
+            # so every held-out row is scored even when the holdout is shorter
+            # than lookback (e.g. walk-forward folds)
+            context_start = len(train_df) - self.lookback
+            test_features = self.scaler.transform(features[context_start:])
             
-            # Scale target
-            train_target = train_df['close'].values
-            test_target = test_df['close'].values
+            # Scale target (in the feature precision, so Keras gets float32 arrays without a cast)
+            train_target = train_df['close'].to_numpy(dtype=self.dtype)
+            test_target = df_features['close'].to_numpy(dtype=self.dtype)[context_start:]
             
             # Create sequences
             X_train, y_train = self.create_sequences(
@@ -92,22 +187,45 @@ class LSTMModel(BaseMLModel):
             )
             
             # Build model
-            self.model = self.build_model((X_train.shape[1], X_train.shape[2]))
+            if not incremental:
+                self.model = self.build_model((X_train.shape[1], X_train.shape[2]))
+            self._inference_fn = None
+            epochs = self.refresh_epochs if incremental else self.epochs
             
             # Train model
-            history = self.model.fit(
-                X_train, y_train,
-                epochs=self.epochs,
-                batch_size=self.batch_size,
-                validation_data=(X_test, y_test),
-                verbose=0
-            )
+            fit_start = time.perf_counter()
+            if len(X_train) > self.streaming_threshold:
+                val_dataset = self._sequence_dataset(test_features, y_test)
+                history = self.model.fit(
+                    self._sequence_dataset(train_features, y_train, shuffle=True),
+                    epochs=epochs,
+                    validation_data=val_dataset,
+                    callbacks=self.fit_callbacks(),
+                    verbose=0
+                )
+                y_pred = self.model.predict(val_dataset, verbose=0).flatten()
+            else:
+                history = self.model.fit(
+                    X_train, y_train,
+                    epochs=epochs,
+                    batch_size=self.batch_size,
+                    validation_data=(X_test, y_test),
+                    callbacks=self.fit_callbacks(),
+                    verbose=0
+                )
+                y_pred = self.model.predict(X_test, verbose=0).flatten()
+            fit_seconds = time.perf_counter() - fit_start
             
             # Calculate metrics
-            y_pred = self.model.predict(X_test, verbose=0).flatten()
-            metrics = self.calculate_metrics(y_test, y_pred)
+            metrics = self.calculate_metrics(y_test.astype(float), y_pred)
+            
+            # Prediction bands from multi-step forecasts over the holdout
+            self.calibrate_intervals(df_features, features, len(train_df))
             
+            # Recorded only once the fit succeeded, so a failed refresh is retried
+            self.record_training_window(df, incremental=incremental)
             self.is_trained = True
+            preset = self.ARCHITECTURES[self.architecture]
             
             return {
                 'success': True,
@@ -115,6 +233,8 @@ class LSTMModel(BaseMLModel):
                 'metrics': metrics,
                 'training_loss': float(history.history['loss'][-1]),
                 'validation_loss': float(history.history['val_loss'][-1]),
+                'epochs_trained': len(history.history['loss']),
+                'fit_seconds': fit_seconds,
                 'model_specs': {
                     'total_samples': len(df_features),
                     'train_samples': len(X_train),
@@ -123,18 +243,23 @@ class LSTMModel(BaseMLModel):
                     'train_test_split': '80/20',
                     'hyperparameters': {
                         'lookback': self.lookback,
-                        'epochs': self.epochs,
+                        'epochs': epochs,
+                        'early_stopping_patience': self.early_stopping_patience,
                         'batch_size': self.batch_size,
-                        'layers': [128, 64, 32],
-                        'dropout': 0.2,
-                        'optimizer': 'adam'
+                        'layers': list(preset['units']),
+                        'dropout': preset['dropout'],
+                        'optimizer': 'adam',
+                        'precision': self.precision
                     },
                     'feature_list': self.feature_columns,
-                    'architecture': '3-layer LSTM (128-64-32 units)',
+                    'architecture': (
+                        f"{self.architecture}: {len(preset['units'])}-layer {preset['cell']} "
+                        f"({'-'.join(str(units) for units in preset['units'])} units)"
+                    ),
                     'sequence_length': self.lookback
                 }
             }
-            
+        
         except Exception as e:
             logger.error(f"Error training {self.name}: {str(e)}")
             return {
@@ -142,58 +267,160 @@ class LSTMModel(BaseMLModel):
                 'error': str(e)
             }
     
+    def _sequence_dataset(self, features: np.ndarray, targets: np.ndarray, shuffle: bool = False):
+        """
+        tf.data pipeline of (window, target) batches gathered from the feature matrix
+        
+        targets are the create_sequences targets (one per window). Only the
+        feature matrix is held in memory; each batch of windows is gathered
+        from it when the batch is consumed, and shuffling reorders window
+        indices each epoch.
+        """
+        import tensorflow as tf
+        
+        features = tf.constant(features, dtype=tf.float32)
+        targets = tf.constant(targets, dtype=tf.float32)
+        offsets = tf.range(self.lookback, dtype=tf.int64)
+        n_windows = int(targets.shape[0])
+        
+        dataset = tf.data.Dataset.range(n_windows)
+        if shuffle:
+            dataset = dataset.shuffle(n_windows, reshuffle_each_iteration=True)
+        dataset = dataset.batch(self.batch_size)
+        dataset = dataset.map(
+            lambda idx: (tf.gather(features, idx[:, None] + offsets), tf.gather(targets, idx)),
+            num_parallel_calls=tf.data.AUTOTUNE
+        )
+        return dataset.prefetch(tf.data.AUTOTUNE)
+    
+    def _save_model(self, path: str):
+        self.model.save(os.path.join(path, 'model.keras'))
+    
+    def _load_model(self, path: str):
+        if not TENSORFLOW_AVAILABLE:
+            raise ImportError("TensorFlow is required for LSTM model")
+        self.model = _import_keras().models.load_model(os.path.join(path, 'model.keras'))
+        self._inference_fn = None
+    
+    def _prediction_interval(self, predictions) -> tuple:
+        """Conformal bands, or +/- 1.96 std of the path itself for uncalibrated models"""
+        bounds = self.conformal_interval(predictions)
+        if bounds is not None:
+            return bounds
+        std = np.std(predictions)
+        lower_bound = np.array(predictions) - 1.96 * std
+        upper_bound = np.array(predictions) + 1.96 * std
+        return lower_bound, upper_bound
+    
+    def slice_forecast(self, result: Dict, horizon: int) -> Dict:
+        """Slice predictions, then recompute the interval since its width depends on the path length"""
+        sliced = super().slice_forecast(result, horizon)
+        lower_bound, upper_bound = self._prediction_interval(sliced['predictions'])
+        sliced['lower_bound'] = [float(l) for l in lower_bound]
+        sliced['upper_bound'] = [float(u) for u in upper_bound]
+        return sliced
+    
+    def estimate_memory_bytes(self) -> int:
+        """Float32 weights plus the two Adam slot variables per weight"""
+        if self.model is None:
+            return 0
+        return int(self.model.count_params()) * 4 * 3
+    
+    def _infer(self, windows: np.ndarray) -> np.ndarray:
+        """One forward pass over a batch of windows through a compiled graph function"""
+        if self._inference_fn is None:
+            import tensorflow as tf
+            model = self.model
+            self._inference_fn = tf.function(
+                lambda x: model(x, training=False),
+                input_signature=[tf.TensorSpec([None, self.lookback, windows.shape[2]], tf.float32)]
+            )
+        return self._inference_fn(windows).numpy()[:, 0]
+    
+    def _forecast_windows(self, features: np.ndarray, horizon: int) -> np.ndarray:
+        """
+        All input windows of a forecast path, built from one preallocated buffer
+        
+        The forecast holds the last observed feature row constant, so the
+        window for step k is the last lookback - k observed rows followed by
+        k copies of the last row. Every window is known up front and, once k
+        reaches lookback, they are all identical, so at most lookback + 1
+        distinct windows are needed whatever the horizon.
+        """
+        n_windows = min(horizon, self.lookback + 1)
+        buffer = np.empty((self.lookback + n_windows - 1, features.shape[1]), dtype=np.float32)
+        buffer[:self.lookback] = features[-self.lookback:]
+        buffer[self.lookback:] = features[-1]
+        return sliding_window_view(buffer, self.lookback, axis=0).transpose(0, 2, 1)
+    
+    def holdout_forecasts(
+        self,
+        df_features: pd.DataFrame,
+        X: np.ndarray,
+        origins: np.ndarray,
+        horizon: int
+    ) -> np.ndarray:
+        """Forecast paths from many feature rows, batched through the compiled graph"""
+        scaled = self.scaler.transform(X)
+        # Windows for a chunk of origins are materialized together; bound their memory
+        chunk = 256
+        paths = []
+        for start in range(0, len(origins), chunk):
+            feature_sets = [scaled[:origin + 1] for origin in origins[start:start + chunk]]
+            paths.extend(self._forecast_paths(feature_sets, horizon))
+        return np.array(paths)
+    
+    def _forecast_paths(self, feature_sets: List[np.ndarray], horizon: int) -> List[np.ndarray]:
+        """Forecast several feature histories (symbols or scenarios) in a single batch"""
+        windows = [self._forecast_windows(features, horizon) for features in feature_sets]
+        outputs = self._infer(np.ascontiguousarray(np.concatenate(windows)))
+        
+        paths = []
+        offset = 0
+        for path_windows in windows:
+            step_predictions = outputs[offset:offset + len(path_windows)]
+            offset += len(path_windows)
+            path = np.full(horizon, step_predictions[-1], dtype=float)
+            path[:len(step_predictions)] = step_predictions
+            paths.append(path)
+        return paths
+    
+    def _forecast_result(self, predictions: np.ndarray, horizon: int) -> Dict:
+        lower_bound, upper_bound = self._prediction_interval(predictions)
+        
+        return {
+            'success': True,
+            'model': self.name,
+            'predictions': [float(p) for p in predictions],
+            'lower_bound': [float(l) for l in lower_bound],
+            'upper_bound': [float(u) for u in upper_bound],
+            'horizon': horizon
+        }
+    
     def predict(self, df: pd.DataFrame, horizon: int) -> Dict:
         """Make predictions for future periods"""
+        return self.predict_batch([df], horizon)[0]
+    
+    def predict_batch(self, dfs: List[pd.DataFrame], horizon: int) -> List[Dict]:
+        """Make predictions for several frames (symbols or scenarios) with one model call"""
+        self.ensure_loaded()
         if not self.is_trained or self.model is None:
-            return {
+            return [{
                 'success': False,
                 'error': 'Model not trained'
-            }
+            } for _ in dfs]
         
         try:
-            # Prepare features
-            df_features = self.prepare_features(df)
-            
-            # Scale features
-            features = self.scaler.transform(df_features[self.feature_columns])
-            
-            # Get last sequence
-            last_sequence = features[-self.lookback:]
-            
-            # Make predictions
-            predictions = []
-            current_sequence = last_sequence.copy()
-            
-            for _ in range(horizon):
-                # Predict next value
-                pred = self.model.predict(
-                    current_sequence.reshape(1, self.lookback, -1),
-                    verbose=0
-                )[0, 0]
-                predictions.append(pred)
-                
-                # Update sequence (simple approach - use predicted price)
-                # In practice, you'd update all features
-                new_row = current_sequence[-1].copy()
-                current_sequence = np.vstack([current_sequence[1:], new_row])
-            
-            # Calculate prediction intervals (simplified)
-            std = np.std(predictions)
-            lower_bound = np.array(predictions) - 1.96 * std
-            upper_bound = np.array(predictions) + 1.96 * std
-            
-            return {
-                'success': True,
-                'model': self.name,
-                'predictions': [float(p) for p in predictions],
-                'lower_bound': [float(l) for l in lower_bound],
-                'upper_bound': [float(u) for u in upper_bound],
-                'horizon': horizon
-            }
-            
+            feature_sets = [
+                self.scaler.transform(self.feature_matrix(df))
+                for df in dfs
+            ]
+            paths = self._forecast_paths(feature_sets, horizon)
+            return [self._forecast_result(path, horizon) for path in paths]
+        
         except Exception as e:
             logger.error(f"Error predicting with {self.name}: {str(e)}")
-            return {
+            return [{
                 'success': False,
                 'error': str(e)
-            }
+            } for _ in dfs]
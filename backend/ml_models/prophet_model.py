@@ -1,33 +1,150 @@
 """
 Prophet Time Series Forecasting Model
 """
+import importlib
+import importlib.util
+import os
+import threading
 import numpy as np
 import pandas as pd
-from typing import Dict
+from typing import Dict, Optional
 import logging
 
-try:
-    from prophet import Prophet
-    PROPHET_AVAILABLE = True
-except ImportError:
-    PROPHET_AVAILABLE = False
+# Only check for Prophet here; importing it also loads cmdstanpy
+PROPHET_AVAILABLE = importlib.util.find_spec('prophet') is not None
+if not PROPHET_AVAILABLE:
     logging.warning("Prophet not available")
 
+def _import_prophet():
+    """Import Prophet on first use"""
+    return importlib.import_module('prophet')
+
+def _import_prophet_serialize():
+    """Import Prophet's JSON (de)serializers on first use"""
+    return importlib.import_module('prophet.serialize')
+
 from .base_model import BaseMLModel
 
 logger = logging.getLogger(__name__)
 
+# Stan backend (the loaded CmdStan model) shared by every Prophet fit in the
+# process; Prophet would otherwise load and probe the executable per instance
+_STAN_BACKEND = None
+# A shared backend keeps the state of its last fit, so fits take turns
+_STAN_LOCK = threading.Lock()
+_PROPHET_CLASS = None
+
+def _pooled_prophet_class():
+    """Prophet subclass that loads the Stan backend once per process"""
+    global _PROPHET_CLASS
+    if _PROPHET_CLASS is None:
+        prophet = _import_prophet()
+        
+        class PooledProphet(prophet.Prophet):
+            def _load_stan_backend(self, stan_backend):
+                global _STAN_BACKEND
+                if _STAN_BACKEND is None:
+                    super()._load_stan_backend(stan_backend)
+                    _STAN_BACKEND = self.stan_backend
+                self.stan_backend = _STAN_BACKEND
+        
+        _PROPHET_CLASS = PooledProphet
+    return _PROPHET_CLASS
+
+def _warm_start_params(model) -> Dict:
+    """Fitted parameters of a Prophet model in the form Prophet.fit(init=...) takes"""
+    params = {name: model.params[name][0][0] for name in ('k', 'm', 'sigma_obs')}
+    params.update({name: model.params[name][0] for name in ('delta', 'beta')})
+    return params
+
 class ProphetModel(BaseMLModel):
     """Prophet model for time series prediction"""
     
+    persisted_attributes = (
+        'changepoint_prior_scale', 'seasonality_prior_scale', 'seasonality', 'uncertainty_samples'
+    )
+    option_attributes = ('warm_start',)
+    search_space = {
+        'changepoint_prior_scale': [0.01, 0.05, 0.1, 0.5],
+        'seasonality_prior_scale': [1.0, 10.0]
+    }
+    prefix_consistent = True
+    # Stan optimizes on a single thread
+    max_threads = 1
+    supports_incremental = True
+    
     def __init__(self):
         super().__init__("Prophet")
         self.model = None
         self.changepoint_prior_scale = 0.05
         self.seasonality_prior_scale = 10.0
+        # 'auto' lets Prophet enable only the seasonalities the bar spacing and
+        # history length can resolve (no daily seasonality on daily bars);
+        # 'full' always fits daily, weekly and yearly
+        self.seasonality = 'auto'
+        # Posterior samples behind predict's intervals; 0 skips sampling and
+        # derives the bands from the fitted noise scale instead
+        self.uncertainty_samples = 1000
+        # Start full refits from the previous fit's parameters when they fit the new model
+        self.warm_start = True
+        self.interval_width = 0.95
     
     def train(self, df: pd.DataFrame) -> Dict:
         """Train Prophet model"""
+        return self._fit(df)
+    
+    def update(self, df: pd.DataFrame) -> Dict:
+        """Refit on df with Stan's optimizer started from the current parameters"""
+        return self._fit(df, incremental=True)
+    
+    def _build_prophet(self):
+        """Unfitted Prophet with the model's configuration and the volume regressor"""
+        seasonality = 'auto' if self.seasonality == 'auto' else True
+        model = _pooled_prophet_class()(
+            changepoint_prior_scale=self.changepoint_prior_scale,
+            seasonality_prior_scale=self.seasonality_prior_scale,
+            daily_seasonality=seasonality,
+            weekly_seasonality=seasonality,
+            yearly_seasonality=seasonality,
+            interval_width=self.interval_width,
+            uncertainty_samples=self.uncertainty_samples
+        )
+        model.add_regressor('volume')
+        return model
+    
+    def _fit_prophet(self, train_df: pd.DataFrame, init: Optional[Dict]):
+        """
+        Fit a new Prophet on train_df, starting Stan from init when given
+        
+        Prophet replaces init values whose shape no longer matches (the
+        number of changepoints or seasonal terms changed) with its defaults;
+        if the warm-started fit fails anyway, it is repeated from scratch.
+        """
+        with _STAN_LOCK:
+            if init is not None:
+                try:
+                    model = self._build_prophet()
+                    # A warm start converges in a few Newton steps
+                    model.fit(train_df, algorithm='Newton', init=init)
+                    return model, True
+                except Exception as e:
+                    logger.info(f"{self.name}: warm start not applicable ({str(e)}), fitting from scratch")
+            
+            model = self._build_prophet()
+            model.fit(train_df, algorithm='Newton')
+            return model, False
+    
+    def _holdout_forecast(self, test_df: pd.DataFrame) -> pd.DataFrame:
+        """Point forecast for the test split (metrics need no interval samples)"""
+        samples = self.model.uncertainty_samples
+        self.model.uncertainty_samples = 0
+        try:
+            return self.model.predict(test_df)
+        finally:
+            self.model.uncertainty_samples = samples
+    
+    def _fit(self, df: pd.DataFrame, incremental: bool = False) -> Dict:
+        """Fit Prophet on df, from scratch or warm-started from the fitted model"""
         if not PROPHET_AVAILABLE:
             return {
                 'success': False,
@@ -35,8 +152,9 @@ class ProphetModel(BaseMLModel):
             }
         
         try:
-            logger.info(f"Training {self.name} model...")
-            
+            logger.info(f"{'Updating' if incremental else 'Training'} {self.name} model...")
+            reuse_params = self.model is not None and (incremental or self.warm_start)
+            init = _warm_start_params(self.model) if reuse_params else None
             # Prepare data for Prophet (requires 'ds' and 'y' columns)
             prophet_df = df[['date', 'close']].copy()
             prophet_df.columns = ['ds', 'y']
@@ -49,34 +167,23 @@ class ProphetModel(BaseMLModel):
             prophet_df['volume'] = df['volume'].values
             
             # Split data
-            split_idx = int(len(prophet_df) * 0.8)
+            split_idx = self.split_index(len(prophet_df))
             train_df = prophet_df.iloc[:split_idx]
             test_df = prophet_df.iloc[split_idx:]
             
-            # Initialize Prophet with custom parameters
-            self.model = Prophet(
-                changepoint_prior_scale=self.changepoint_prior_scale,
-                seasonality_prior_scale=self.seasonality_prior_scale,
-                daily_seasonality=True,
-                weekly_seasonality=True,
-                yearly_seasonality=True,
-                interval_width=0.95
-            )
-            
-            # Add volume as regressor
-            self.model.add_regressor('volume')
-            
-            # Train model
-            self.model.fit(train_df, algorithm='Newton')
+            # Train model (volume as regressor)
+            self.model, warm_started = self._fit_prophet(train_df, init)
             
             # Make predictions on test set
-            forecast = self.model.predict(test_df)
+            forecast = self._holdout_forecast(test_df)
             
             # Calculate metrics
             y_true = test_df['y'].values
             y_pred = forecast['yhat'].values
             metrics = self.calculate_metrics(y_true, y_pred)
             
+            # Recorded only once the fit succeeded, so a failed refresh is retried
+            self.record_training_window(df, incremental=incremental)
             self.is_trained = True
             
             return {
@@ -85,6 +192,7 @@ class ProphetModel(BaseMLModel):
                 'metrics': metrics,
                 'changepoints': len(self.model.changepoints),
                 'seasonality_components': list(self.model.seasonalities.keys()),
+                'warm_started': warm_started,
                 'model_specs': {
                     'total_samples': len(prophet_df),
                     'train_samples': len(train_df),
@@ -94,14 +202,14 @@ class ProphetModel(BaseMLModel):
                     'hyperparameters': {
                         'changepoint_prior_scale': self.changepoint_prior_scale,
                         'seasonality_prior_scale': self.seasonality_prior_scale,
-                        'interval_width': 0.95,
+                        'interval_width': self.interval_width,
+                        'uncertainty_samples': self.uncertainty_samples,
                         'algorithm': 'Newton'
                     },
                     'feature_list': ['date', 'volume'],
                     'seasonality': {
-                        'daily': True,
-                        'weekly': True,
-                        'yearly': True
+                        name: name in self.model.seasonalities
+                        for name in ('daily', 'weekly', 'yearly')
                     },
                     'regressors': ['volume'],
                     'changepoints_detected': len(self.model.changepoints)
@@ -115,8 +223,41 @@ class ProphetModel(BaseMLModel):
                 'error': str(e)
             }
     
+    def _save_model(self, path: str):
+        with open(os.path.join(path, 'model.json'), 'w') as f:
+            f.write(_import_prophet_serialize().model_to_json(self.model))
+    
+    def _load_model(self, path: str):
+        if not PROPHET_AVAILABLE:
+            raise ImportError("Prophet is required for Prophet model")
+        with open(os.path.join(path, 'model.json'), 'r') as f:
+            self.model = _import_prophet_serialize().model_from_json(f.read())
+    
+    def estimate_memory_bytes(self) -> int:
+        """Fitted parameter arrays plus the training history Prophet keeps"""
+        if self.model is None or self.model.history is None:
+            return 0
+        params_bytes = sum(np.asarray(v).nbytes for v in self.model.params.values())
+        return int(params_bytes + self.model.history.memory_usage(deep=True).sum())
+    
+    def _analytic_interval(self, predictions: np.ndarray) -> tuple:
+        """
+        Bands from the fitted observation noise, for models without interval samples
+        
+        Ignores trend uncertainty, so they are narrower than sampled
+        intervals; they widen with the square root of the steps ahead like
+        the other models' fallback bands.
+        """
+        from scipy.stats import norm
+        
+        sigma = float(self.model.params['sigma_obs'][0][0]) * self.model.y_scale
+        z = norm.ppf(0.5 + self.interval_width / 2)
+        width = z * sigma * np.sqrt(np.arange(1, len(predictions) + 1))
+        return predictions - width, predictions + width
+    
     def predict(self, df: pd.DataFrame, horizon: int) -> Dict:
         """Make predictions for future periods"""
+        self.ensure_loaded()
         if not self.is_trained or self.model is None:
             return {
                 'success': False,
@@ -152,8 +293,11 @@ class ProphetModel(BaseMLModel):
             forecast = self.model.predict(future_df)
             
             predictions = forecast['yhat'].values
-            lower_bound = forecast['yhat_lower'].values
-            upper_bound = forecast['yhat_upper'].values
+            if 'yhat_lower' in forecast:
+                lower_bound = forecast['yhat_lower'].values
+                upper_bound = forecast['yhat_upper'].values
+            else:
+                lower_bound, upper_bound = self._analytic_interval(predictions)
             
             return {
                 'success': True,
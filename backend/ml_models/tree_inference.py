@@ -0,0 +1,179 @@
+"""
+Compiled (flattened) inference for tree ensembles
+
+scikit-learn forests predict a single row by dispatching to every tree
+(through a joblib thread pool when n_jobs is set), and per-tree outputs
+need one Python-level predict call per estimator. XGBoost's wrapper pays
+a similar fixed cost per call. For the one-row-at-a-time calls of
+recursive forecasting that overhead dominates.
+
+FlatTreeEnsemble copies every tree's nodes into a handful of contiguous
+arrays and walks all trees for all rows at once: one vectorized gather
+per tree level. Leaves point to themselves, so the walk is a fixed
+number of steps with no branching on leaf status.
+"""
+import json
+import re
+from typing import Optional, Tuple
+
+import numpy as np
+
+class FlatTreeEnsemble:
+    """Tree ensemble flattened into node arrays, evaluated level by level"""
+    
+    def __init__(
+        self,
+        feature: np.ndarray,
+        threshold: np.ndarray,
+        left: np.ndarray,
+        right: np.ndarray,
+        missing_left: np.ndarray,
+        values: np.ndarray,
+        roots: np.ndarray,
+        strict: bool,
+        aggregate: str,
+        base_score: float = 0.0
+    ):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.missing_left = missing_left
+        self.values = values
+        self.roots = roots
+        # XGBoost sends x < threshold left, scikit-learn x <= threshold
+        self.strict = strict
+        # 'mean' for bagged forests, 'sum' for boosted trees
+        self.aggregate = aggregate
+        self.base_score = base_score
+        self.depth = self._max_depth()
+    
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+    
+    @property
+    def n_outputs(self) -> int:
+        return self.values.shape[1]
+    
+    @property
+    def nbytes(self) -> int:
+        arrays = (self.feature, self.threshold, self.left, self.right, self.missing_left, self.values, self.roots)
+        return int(sum(array.nbytes for array in arrays))
+    
+    def _max_depth(self) -> int:
+        """Levels needed for every root to reach a leaf (breadth-first over all trees)"""
+        nodes = self.roots
+        depth = 0
+        while True:
+            internal = nodes[self.left[nodes] != nodes]
+            if len(internal) == 0:
+                return depth
+            nodes = np.concatenate([self.left[internal], self.right[internal]])
+            depth += 1
+    
+    def apply(self, X: np.ndarray) -> np.ndarray:
+        """Leaf index reached in every tree, shape (n_rows, n_trees)"""
+        # Both libraries compare float32 feature values
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(len(X))[:, None]
+        nodes = np.broadcast_to(self.roots, (len(X), self.n_trees))
+        for _ in range(self.depth):
+            x = X[rows, self.feature[nodes]]
+            threshold = self.threshold[nodes]
+            go_left = x < threshold if self.strict else x <= threshold
+            go_left = np.where(np.isnan(x), self.missing_left[nodes], go_left)
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+    
+    def tree_outputs(self, X: np.ndarray) -> np.ndarray:
+        """Every tree's output for every row, shape (n_rows, n_trees, n_outputs)"""
+        return self.values[self.apply(X)]
+    
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Ensemble prediction, shaped like the native predict ((n,) or (n, n_outputs))"""
+        outputs = self.tree_outputs(X)
+        combined = outputs.mean(axis=1) if self.aggregate == 'mean' else outputs.sum(axis=1)
+        combined = combined + self.base_score
+        return combined[:, 0] if self.n_outputs == 1 else combined
+    
+    @classmethod
+    def from_sklearn(cls, forest) -> 'FlatTreeEnsemble':
+        """Flatten a fitted scikit-learn forest regressor"""
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            node_ids = np.arange(tree.node_count)
+            is_leaf = tree.children_left == -1
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(tree.threshold)
+            lefts.append(np.where(is_leaf, node_ids, tree.children_left) + offset)
+            rights.append(np.where(is_leaf, node_ids, tree.children_right) + offset)
+            values.append(tree.value[:, :, 0])
+            roots.append(offset)
+            offset += tree.node_count
+        
+        n_nodes = offset
+        return cls(
+            feature=np.concatenate(features).astype(np.intp),
+            threshold=np.concatenate(thresholds),
+            left=np.concatenate(lefts).astype(np.intp),
+            right=np.concatenate(rights).astype(np.intp),
+            # scikit-learn features never contain NaN here; route them right like <= would
+            missing_left=np.zeros(n_nodes, dtype=bool),
+            values=np.concatenate(values),
+            roots=np.array(roots, dtype=np.intp),
+            strict=False,
+            aggregate='mean'
+        )
+    
+    @classmethod
+    def from_xgboost(cls, booster, iteration_range: Optional[Tuple[int, int]] = None) -> 'FlatTreeEnsemble':
+        """Flatten a fitted XGBoost gbtree booster (optionally up to an iteration range)"""
+        model = json.loads(booster.save_raw('json'))['learner']
+        params = model['learner_model_param']
+        gbtree = model['gradient_booster']['model']
+        n_outputs = max(1, int(params.get('num_target', 1)))
+        base_score = float(re.findall(r'[-+0-9.eE]+', params['base_score'])[0])
+        
+        indptr = [int(i) for i in gbtree['iteration_indptr']]
+        start, end = iteration_range or (0, len(indptr) - 1)
+        tree_ids = range(indptr[start], indptr[min(end, len(indptr) - 1)])
+        
+        features, thresholds, lefts, rights, missing, values, roots = [], [], [], [], [], [], []
+        offset = 0
+        for tree_id in tree_ids:
+            tree = gbtree['trees'][tree_id]
+            left = np.array(tree['left_children'])
+            right = np.array(tree['right_children'])
+            conditions = np.array(tree['split_conditions'], dtype=np.float32)
+            node_ids = np.arange(len(left))
+            is_leaf = left == -1
+            
+            features.append(np.where(is_leaf, 0, tree['split_indices']))
+            thresholds.append(conditions)
+            lefts.append(np.where(is_leaf, node_ids, left) + offset)
+            rights.append(np.where(is_leaf, node_ids, right) + offset)
+            missing.append(np.array(tree['default_left'], dtype=bool))
+            
+            # Leaves store their weight in split_conditions; it adds to one target only
+            tree_values = np.zeros((len(left), n_outputs))
+            tree_values[is_leaf, gbtree['tree_info'][tree_id]] = conditions[is_leaf]
+            values.append(tree_values)
+            
+            roots.append(offset)
+            offset += len(left)
+        
+        return cls(
+            feature=np.concatenate(features).astype(np.intp),
+            threshold=np.concatenate(thresholds),
+            left=np.concatenate(lefts).astype(np.intp),
+            right=np.concatenate(rights).astype(np.intp),
+            missing_left=np.concatenate(missing),
+            values=np.concatenate(values),
+            roots=np.array(roots, dtype=np.intp),
+            strict=True,
+            aggregate='sum',
+            base_score=base_score
+        )
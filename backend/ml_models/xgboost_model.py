@@ -1,31 +1,99 @@
 """
 XGBoost Regression Model
 """
+import importlib
+import importlib.util
+import os
 import numpy as np
 import pandas as pd
-from typing import Dict
+from typing import Dict, Optional, Tuple
+import joblib
 import logging
 
-try:
-    import xgboost as xgb
-    XGBOOST_AVAILABLE = True
-except ImportError:
-    XGBOOST_AVAILABLE = False
+# Only check for XGBoost here; it is imported on first use
+XGBOOST_AVAILABLE = importlib.util.find_spec('xgboost') is not None
+if not XGBOOST_AVAILABLE:
     logging.warning("XGBoost not available")
 
+xgb = None
+
+def _import_xgboost():
+    """Import XGBoost on first use"""
+    global xgb
+    if xgb is None:
+        xgb = importlib.import_module('xgboost')
+    return xgb
+
 from .base_model import BaseMLModel
+from .feature_state import RollingFeatureState
+from .tree_inference import FlatTreeEnsemble
 
 logger = logging.getLogger(__name__)
 
 class XGBoostModel(BaseMLModel):
     """XGBoost model for time series prediction"""
     
+    persisted_attributes = (
+        'n_estimators', 'max_depth', 'learning_rate', 'forecast_strategy', 'interval_method', 'precision'
+    )
+    search_space = {
+        'n_estimators': [100, 200, 400],
+        'max_depth': [4, 6, 8],
+        'learning_rate': [0.03, 0.05, 0.1]
+    }
+    prefix_consistent = True
+    # Larger batches go to the native library: the flattened walk only wins
+    # while XGBoost's per-call overhead (~0.3ms) outweighs its slower per-row cost
+    compiled_max_rows = 8
+    supports_incremental = True
+    
     def __init__(self):
         super().__init__("XGBoost")
         self.model = None
         self.n_estimators = 200
         self.max_depth = 8
         self.learning_rate = 0.05
+        # 'recursive' feeds each prediction back; 'direct' predicts every horizon at once
+        self.forecast_strategy = 'recursive'
+        # 'conformal' calibrates bands on the holdout; 'quantile' trains one booster
+        # for the lower quantile, median and upper quantile (recursive strategy only)
+        self.interval_method = 'conformal'
+        # 'compiled' evaluates a flattened copy of the booster; 'native' calls XGBoost
+        self.inference_backend = 'compiled'
+        # Boosting rounds an incremental update adds on top of the current booster
+        self.refresh_rounds = 20
+        # Per-step multiplier on the quantile band widths, calibrated on the holdout
+        self.quantile_scale: Optional[np.ndarray] = None
+        self._flat_model = None
+    
+    @property
+    def quantile_levels(self) -> np.ndarray:
+        """Lower, median and upper quantile of the 'quantile' interval method"""
+        return np.array([self.interval_alpha / 2, 0.5, 1 - self.interval_alpha / 2])
+    
+    def build_regressor(self, n_estimators: Optional[int] = None):
+        """Unfitted XGBRegressor with the model's hyperparameters and objective"""
+        if self.interval_method == 'quantile':
+            objective = {'objective': 'reg:quantileerror', 'quantile_alpha': self.quantile_levels}
+        else:
+            objective = {'objective': 'reg:squarederror'}
+        return _import_xgboost().XGBRegressor(
+            n_estimators=n_estimators or self.n_estimators,
+            max_depth=self.max_depth,
+            learning_rate=self.learning_rate,
+            random_state=42,
+            n_jobs=self.n_threads or -1,
+            **objective
+        )
+    
+    def quantile_training_data(self, rows: pd.DataFrame, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Rows of X with their next-bar relative close change, as the direct
+        strategy uses, so the quantile heads learn scale-free bands
+        """
+        changes = self.direct_targets(rows)[:, 0]
+        valid = ~np.isnan(changes)
+        return X[valid], changes[valid].astype(self.dtype)
     
     def train(self, df: pd.DataFrame) -> Dict:
         """Train XGBoost model"""
@@ -37,43 +105,61 @@ class XGBoostModel(BaseMLModel):
         
         try:
             logger.info(f"Training {self.name} model...")
-            
-            # Prepare features
+            # Prepare features (shared read-only matrix from the feature store)
             df_features = self.prepare_features(df)
+            features = self.feature_matrix(df)
             
             # Split data
             train_df, test_df = self.train_test_split(df_features)
             
-            # Prepare training data
-            X_train = train_df[self.feature_columns].values
-            y_train = train_df['close'].values
+            # Prepare training data (XGBoost stores features and labels as float32 either way)
+            X_train = features[:len(train_df)]
+            y_train = train_df['close'].to_numpy(dtype=self.dtype)
             
-            X_test = test_df[self.feature_columns].values
+            X_test = features[len(train_df):]
             y_test = test_df['close'].values
             
-            # Initialize model
-            self.model = xgb.XGBRegressor(
-                n_estimators=self.n_estimators,
-                max_depth=self.max_depth,
-                learning_rate=self.learning_rate,
-                objective='reg:squarederror',
-                random_state=42,
-                n_jobs=-1
-            )
+            if self.interval_method == 'quantile' and self.forecast_strategy == 'direct':
+                # XGBoost's quantile loss does not support multi-target labels
+                raise ValueError("Quantile intervals require the recursive forecast strategy")
             
-            # Train model with early stopping
-            self.model.fit(
-                X_train, y_train,
-                eval_set=[(X_test, y_test)],
-                early_stopping_rounds=20,
-                verbose=False
-            )
+            # Initialize model
+            self.model = self.build_regressor()
+            self._flat_model = None
             
-            # Make predictions
-            y_pred = self.model.predict(X_test)
+            if self.forecast_strategy == 'direct':
+                # One multi-output booster predicting every DIRECT_HORIZONS step from a row.
+                # The test split is shorter than the longest horizon, so there is no
+                # complete eval set for early stopping
+                X_fit, y_fit = self.direct_training_data(train_df, X_train)
+                self.model.fit(X_fit, y_fit, verbose=False)
+                metrics = self.direct_metrics(test_df, self.model.predict(X_test))
+            else:
+                if self.interval_method == 'quantile':
+                    X_train, y_train = self.quantile_training_data(train_df, X_train)
+                    X_eval, y_eval = self.quantile_training_data(test_df, X_test)
+                else:
+                    X_eval, y_eval = X_test, y_test
+                
+                # Train model with early stopping
+                self.model.fit(
+                    X_train, y_train,
+                    eval_set=[(X_eval, y_eval)],
+                    early_stopping_rounds=20,
+                    verbose=False
+                )
+                
+                # Make predictions and calculate metrics
+                if self.interval_method == 'quantile':
+                    metrics = self.direct_metrics(test_df, self._quantile_changes(X_test)[:, [1]])
+                else:
+                    metrics = self.calculate_metrics(y_test, self.predict_rows(X_test))
             
-            # Calculate metrics
-            metrics = self.calculate_metrics(y_test, y_pred)
+            # Prediction bands from multi-step forecasts over the holdout
+            if self.interval_method == 'conformal':
+                self.calibrate_intervals(df_features, features, len(train_df))
+            else:
+                metrics.update(self.calibrate_quantile_intervals(df_features, features, len(train_df)))
             
             # Get feature importance
             feature_importance = dict(zip(
@@ -86,6 +172,8 @@ class XGBoostModel(BaseMLModel):
                 reverse=True
             )[:10]
             
+            # Recorded only once the fit succeeded, so a failed refresh is retried
+            self.record_training_window(df)
             self.is_trained = True
             
             return {
@@ -96,7 +184,7 @@ class XGBoostModel(BaseMLModel):
                     {'feature': feat, 'importance': float(imp)}
                     for feat, imp in top_features
                 ],
-                'best_iteration': self.model.best_iteration,
+                'best_iteration': getattr(self.model, 'best_iteration', self.n_estimators),
                 'model_specs': {
                     'total_samples': len(df_features),
                     'train_samples': len(train_df),
@@ -108,7 +196,10 @@ class XGBoostModel(BaseMLModel):
                         'max_depth': self.max_depth,
                         'learning_rate': self.learning_rate,
                         'subsample': 0.8,
-                        'colsample_bytree': 0.8
+                        'colsample_bytree': 0.8,
+                        'forecast_strategy': self.forecast_strategy,
+                        'interval_method': self.interval_method,
+                        'precision': self.precision
                     },
                     'feature_list': self.feature_columns,
                     'early_stopping': True,
@@ -123,8 +214,208 @@ class XGBoostModel(BaseMLModel):
                 'error': str(e)
             }
     
+    def update(self, df: pd.DataFrame) -> Dict:
+        """Add refresh_rounds boosting rounds fitted on df to the current booster"""
+        if not XGBOOST_AVAILABLE:
+            return {
+                'success': False,
+                'error': 'XGBoost not available'
+            }
+        
+        try:
+            logger.info(f"Updating {self.name} model...")
+            df_features = self.prepare_features(df)
+            features = self.feature_matrix(df)
+            train_df, test_df = self.train_test_split(df_features)
+            X_train = features[:len(train_df)]
+            X_test = features[len(train_df):]
+            
+            if self.forecast_strategy == 'direct':
+                X_fit, y_fit = self.direct_training_data(train_df, X_train)
+            elif self.interval_method == 'quantile':
+                X_fit, y_fit = self.quantile_training_data(train_df, X_train)
+            else:
+                X_fit, y_fit = X_train, train_df['close'].values
+            
+            # Continue from the rounds actually used at prediction time
+            booster = self.model.get_booster()
+            try:
+                booster = booster[:self.model.best_iteration + 1]
+            except AttributeError:
+                pass
+            
+            model = self.build_regressor(self.refresh_rounds)
+            model.fit(X_fit, y_fit, xgb_model=booster, verbose=False)
+            self.model = model
+            self._flat_model = None
+            self.record_training_window(df, incremental=True)
+            
+            if self.forecast_strategy == 'direct':
+                metrics = self.direct_metrics(test_df, self.model.predict(X_test))
+            elif self.interval_method == 'quantile':
+                metrics = self.direct_metrics(test_df, self._quantile_changes(X_test)[:, [1]])
+            else:
+                metrics = self.calculate_metrics(test_df['close'].values, self.predict_rows(X_test))
+            if self.interval_method == 'conformal':
+                self.calibrate_intervals(df_features, features, len(train_df))
+            else:
+                metrics.update(self.calibrate_quantile_intervals(df_features, features, len(train_df)))
+            
+            return {
+                'success': True,
+                'model': self.name,
+                'metrics': metrics,
+                'n_rounds': self.model.get_booster().num_boosted_rounds(),
+                'rounds_added': self.refresh_rounds
+            }
+            
+        except Exception as e:
+            logger.error(f"Error updating {self.name}: {str(e)}")
+            return {
+                'success': False,
+                'error': str(e)
+            }
+    
+    def _save_model(self, path: str):
+        # Native format: portable across XGBoost versions, unlike pickle
+        self.model.save_model(os.path.join(path, 'model.json'))
+        if self.quantile_scale is not None:
+            joblib.dump(self.quantile_scale, os.path.join(path, 'quantile_scale.joblib'))
+    
+    def _load_model(self, path: str):
+        if not XGBOOST_AVAILABLE:
+            raise ImportError("XGBoost is required for XGBoost model")
+        self.model = _import_xgboost().XGBRegressor()
+        self.model.load_model(os.path.join(path, 'model.json'))
+        scale_path = os.path.join(path, 'quantile_scale.joblib')
+        self.quantile_scale = joblib.load(scale_path) if os.path.exists(scale_path) else None
+        self._flat_model = None
+    
+    def _flat_ensemble(self) -> FlatTreeEnsemble:
+        """Flattened booster (up to the early-stopping iteration), built on first use"""
+        if self._flat_model is None:
+            try:
+                iteration_range = (0, self.model.best_iteration + 1)
+            except AttributeError:
+                iteration_range = None
+            self._flat_model = FlatTreeEnsemble.from_xgboost(self.model.get_booster(), iteration_range)
+        return self._flat_model
+    
+    def _predict_outputs(self, X: np.ndarray) -> np.ndarray:
+        """Every booster output for the rows (all quantiles in quantile mode)"""
+        if self.inference_backend == 'compiled' and len(X) <= self.compiled_max_rows:
+            return self._flat_ensemble().predict(X)
+        return self.model.predict(X)
+    
+    def predict_rows(self, X: np.ndarray) -> np.ndarray:
+        if self.interval_method == 'quantile':
+            return self._quantile_step(X)[0]
+        return self._predict_outputs(X)
+    
+    def _quantile_changes(self, X: np.ndarray) -> np.ndarray:
+        """Lower, median and upper quantile of the next relative change per row"""
+        return np.sort(self._predict_outputs(X), axis=1)
+    
+    def _quantile_step(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Median next close and the lower/upper band widths relative to it"""
+        lower, median, upper = self._quantile_changes(X).T
+        # A feature row's own close, from its previous close and return
+        close = X[:, self.feature_columns.index('close_lag_1')] * (1 + X[:, self.feature_columns.index('returns')])
+        growth = 1 + median
+        return close * growth, (median - lower) / growth, (upper - median) / growth
+    
+    def quantile_paths(
+        self,
+        df_features: pd.DataFrame,
+        X: np.ndarray,
+        origins: np.ndarray,
+        horizon: int
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Median paths from many origin rows at once, with their cumulative
+        relative band widths, each of shape (len(origins), horizon)
+        """
+        state = self.holdout_feature_state(df_features, X, origins, horizon)
+        median, lower, upper = (np.empty((len(origins), horizon)) for _ in range(3))
+        for step in range(horizon):
+            median[:, step], lower[:, step], upper[:, step] = self._quantile_step(state.current_features())
+            state.append(median[:, step])
+        return median, np.sqrt(np.cumsum(lower ** 2, axis=1)), np.sqrt(np.cumsum(upper ** 2, axis=1))
+    
+    def calibrate_quantile_intervals(self, df_features: pd.DataFrame, X: np.ndarray, split_idx: int) -> Dict:
+        """
+        Scale the quantile bands so they reach their nominal holdout coverage
+        
+        Conformalized quantile regression: each holdout outcome is scored by
+        how many band widths it lies from the median path, and the per-step
+        split-conformal quantile of the scores becomes quantile_scale.
+        Returns the holdout coverage (percent) of the raw and scaled bands,
+        or nothing when the holdout is too short to calibrate.
+        """
+        self.quantile_scale = None
+        close = df_features['close'].to_numpy(dtype=float)
+        origins, horizon = self.holdout_origins(len(close), split_idx)
+        if horizon < 1:
+            logger.warning(f"{self.name}: holdout too short to calibrate quantile intervals")
+            return {}
+        
+        median, lower_width, upper_width = self.quantile_paths(df_features, X, origins, horizon)
+        deviation = self.realized_closes(close, origins, horizon) / median - 1
+        scores = np.where(
+            deviation >= 0,
+            deviation / np.maximum(upper_width, 1e-12),
+            -deviation / np.maximum(lower_width, 1e-12)
+        )
+        self.quantile_scale = self.conformal_score_quantiles(scores)
+        
+        observed = ~np.isnan(scores)
+        return {
+            'interval_coverage_uncalibrated': float(np.mean(scores[observed] <= 1) * 100),
+            'interval_coverage': float(np.mean((scores <= self.quantile_scale)[observed]) * 100)
+        }
+    
+    def quantile_forecast(self, df: pd.DataFrame, horizon: int) -> tuple:
+        """
+        Recursive median forecast with quantile bands from the same booster calls
+        
+        Each step's single inference call returns the lower quantile, median
+        and upper quantile of the next change; the median close is fed back.
+        The per-step relative band widths accumulate in quadrature, treating
+        the one-step errors along the path as independent, and are then
+        stretched by the holdout-calibrated quantile_scale.
+        
+        Returns:
+            (predictions, lower_bound, upper_bound) arrays
+        """
+        state = RollingFeatureState(
+            df, self.feature_columns, self.FEATURE_LAGS, self.FEATURE_WINDOWS
+        )
+        median, lower, upper = (np.empty(horizon) for _ in range(3))
+        for step in range(horizon):
+            median[step], lower[step], upper[step] = (
+                value[0] for value in self._quantile_step(state.current_features())
+            )
+            state.append(median[step])
+        
+        # Models saved before calibration existed keep the raw quantile bands
+        scale = 1.0
+        if self.quantile_scale is not None:
+            steps = np.minimum(np.arange(horizon), len(self.quantile_scale) - 1)
+            scale = self.quantile_scale[steps]
+        lower_width = scale * np.sqrt(np.cumsum(lower ** 2))
+        upper_width = scale * np.sqrt(np.cumsum(upper ** 2))
+        return median, median * (1 - lower_width), median * (1 + upper_width)
+    
+    def estimate_memory_bytes(self) -> int:
+        """Size of the serialized booster plus its flattened copy"""
+        if self.model is None:
+            return 0
+        flat_bytes = self._flat_model.nbytes if self._flat_model is not None else 0
+        return len(self.model.get_booster().save_raw()) + flat_bytes
+    
     def predict(self, df: pd.DataFrame, horizon: int) -> Dict:
         """Make predictions for future periods"""
+        self.ensure_loaded()
         if not self.is_trained or self.model is None:
             return {
                 'success': False,
@@ -141,45 +432,29 @@ class XGBoostModel(BaseMLModel):
                     'error': 'Insufficient data for feature preparation'
                 }
             
-            # Make rolling predictions
-            predictions = []
-            current_df = df.copy()  # Keep original data for rolling window
+            bounds = None
+            if self.interval_method == 'quantile':
+                # Median path and quantile bands from one pass of booster calls
+                predictions, *bounds = self.quantile_forecast(df, horizon)
+            elif self.forecast_strategy == 'direct':
+                # Every horizon bucket from the latest feature row in one call
+                last_close = float(df_features['close'].iloc[-1])
+                changes = self.predict_rows(self.feature_matrix(df)[-1:])[0]
+                predictions = self.direct_forecast(changes, last_close, horizon)
+            else:
+                # Make rolling predictions, updating features incrementally
+                predictions = self.recursive_forecast(df, horizon)
             
-            for step in range(horizon):
-                # Prepare features for current state
-                features_df = self.prepare_features(current_df)
-                
-                if len(features_df) == 0:
-                    break
-                
-                # Get latest features
-                latest_features = features_df[self.feature_columns].iloc[-1:].values
-                
-                # Predict next value
-                pred = self.model.predict(latest_features)[0]
-                predictions.append(pred)
-                
-                # Create new row with prediction for next iteration
-                import pandas as pd
-                new_row = pd.DataFrame({
-                    'date': [pd.Timestamp.now()],
-                    'open': [pred],
-                    'high': [pred],
-                    'low': [pred],
-                    'close': [pred],
-                    'volume': [current_df['volume'].iloc[-1]]
-                })
-                current_df = pd.concat([current_df, new_row], ignore_index=True).tail(200)  # Keep last 200 rows
-            
-            # Estimate prediction intervals
-            # XGBoost doesn't provide prediction intervals natively
-            # Use quantile regression approach
-            std_multiplier = 1.0 + 0.1 * np.sqrt(np.arange(1, horizon + 1))
-            historical_std = df['close'].pct_change().std() * df['close'].iloc[-1]
-            std = historical_std * std_multiplier
-            
-            lower_bound = np.array(predictions) - 1.96 * std
-            upper_bound = np.array(predictions) + 1.96 * std
+            # Conformal bands calibrated at training time; models saved before
+            # calibration existed fall back to scaling the historical volatility
+            if bounds is None:
+                bounds = self.conformal_interval(predictions)
+            if bounds is None:
+                std_multiplier = 1.0 + 0.1 * np.sqrt(np.arange(1, horizon + 1))
+                historical_std = df['close'].pct_change().std() * df['close'].iloc[-1]
+                std = historical_std * std_multiplier
+                bounds = (np.array(predictions) - 1.96 * std, np.array(predictions) + 1.96 * std)
+            lower_bound, upper_bound = bounds
             
             return {
                 'success': True,
@@ -1,67 +1,194 @@
 """
 ML Predictor - Orchestrates all ML models and provides ensemble predictions
 """
+import json
+import os
 import pandas as pd
 import numpy as np
-from typing import Dict, List
+from typing import Dict, Iterator, List, Optional, Tuple
+import joblib
 import logging
 
-from ml_models import LSTMModel, RandomForestModel, XGBoostModel, ProphetModel
+from config import (
+    PARALLEL_TRAINING, TRAINING_MAX_WORKERS, MODEL_PRECISION,
+    REFRESH_MAX_AGE_DAYS, REFRESH_MAX_UPDATES, REFRESH_MAX_NEW_ROWS_FRACTION,
+    LSTM_ARCHITECTURE, LSTM_EARLY_STOPPING_PATIENCE, TF_INTER_OP_THREADS, TF_INTRA_OP_THREADS,
+    PROPHET_SEASONALITY, PROPHET_UNCERTAINTY_SAMPLES, PROPHET_WARM_START
+)
+from ml_models import create_model
+from ml_models.base_model import StalenessPolicy
+from tuned_params import TUNED_PARAMS
+from ensemble_weights import EnsembleWeighting
+from metrics import MODEL_FIT_DURATION, MODEL_PREDICT_DURATION
+from forecast_cache import FORECAST_CACHE_REQUESTS, ForecastCache, data_fingerprint
 
 logger = logging.getLogger(__name__)
 
+# Models used when MLPredictor is created without an explicit list
+DEFAULT_MODELS = ['lstm', 'random_forest', 'xgboost', 'prophet', 'arima']
+
+# Configured hyperparameters per model type (tuned values take precedence)
+MODEL_PARAMS = {
+    'lstm': {'architecture': LSTM_ARCHITECTURE},
+    'prophet': {'seasonality': PROPHET_SEASONALITY, 'uncertainty_samples': PROPHET_UNCERTAINTY_SAMPLES}
+}
+
+# Configured runtime settings per model type
+MODEL_OPTIONS = {
+    'lstm': {
+        'early_stopping_patience': LSTM_EARLY_STOPPING_PATIENCE,
+        'intra_op_threads': TF_INTRA_OP_THREADS,
+        'inter_op_threads': TF_INTER_OP_THREADS
+    },
+    'prophet': {'warm_start': PROPHET_WARM_START}
+}
+
+def build_model(name: str, symbol: Optional[str] = None):
+    """
+    New model of a type with the configured precision, hyperparameters and
+    settings, and with a symbol, the hyperparameters tuned for it (if any)
+    """
+    params = dict(MODEL_PARAMS.get(name, {}))
+    if symbol is not None:
+        params.update(TUNED_PARAMS.get(symbol, name))
+    return create_model(name, params, MODEL_PRECISION, MODEL_OPTIONS.get(name))
+
 class MLPredictor:
     """Orchestrate multiple ML models for predictions"""
     
-    def __init__(self):
+    def __init__(
+        self,
+        model_names: Optional[List[str]] = None,
+        parallel: bool = PARALLEL_TRAINING,
+        symbol: Optional[str] = None
+    ):
+        # Model classes are resolved through the ml_models registry; their
+        # frameworks are only imported once a model is trained or loaded.
+        # With a symbol, hyperparameters tuned for it are applied
         self.models = {
-            'lstm': LSTMModel(),
-            'random_forest': RandomForestModel(),
-            'xgboost': XGBoostModel(),
-            'prophet': ProphetModel()
+            name: build_model(name, symbol)
+            for name in (model_names or DEFAULT_MODELS)
         }
         self.model_weights = {
             'lstm': 0.25,
             'random_forest': 0.25,
             'xgboost': 0.30,
-            'prophet': 0.20
+            'prophet': 0.20,
+            'arima': 0.10
         }
+        # Weights from the rolling error of served forecasts (model_weights until enough are scored)
+        self.weighting = EnsembleWeighting({name: self.model_weights[name] for name in self.models})
         self.training_results = {}
+        self.forecast_cache = ForecastCache()
+        self.parallel = parallel
     
-    def train_all_models(self, df: pd.DataFrame) -> Dict:
-        """Train all available models"""
-        results = {}
+    def iter_train_models(self, df: pd.DataFrame) -> Iterator[Tuple[str, Dict]]:
+        """Train all available models, yielding (model_name, result) as each finishes"""
+        # Worker processes only pay off with more than one core to share
+        if self.parallel and len(self.models) > 1 and (os.cpu_count() or 1) > 1:
+            yield from self._iter_train_parallel(df)
+            return
         
         for model_name, model in self.models.items():
             logger.info(f"Training {model_name}...")
             try:
-                result = model.train(df)
-                results[model_name] = result
-                self.training_results[model_name] = result
+                with MODEL_FIT_DURATION.time(model=model_name):
+                    result = model.train(df)
             except Exception as e:
                 logger.error(f"Error training {model_name}: {str(e)}")
-                results[model_name] = {
+                result = {
                     'success': False,
                     'error': str(e)
                 }
+            self.training_results[model_name] = result
+            yield model_name, result
+        
+    def _iter_train_parallel(self, df: pd.DataFrame) -> Iterator[Tuple[str, Dict]]:
+        """Fit every model in its own worker process with a share of the cores"""
+        from parallel_training import iter_train_parallel
         
+        logger.info(f"Training {', '.join(self.models)} in parallel...")
+        for model_name, result, duration in iter_train_parallel(self.models, df, TRAINING_MAX_WORKERS):
+            # Failed fits are timed and kept like in the serial path
+            if duration is not None:
+                MODEL_FIT_DURATION.labels(model=model_name).observe(duration)
+            self.training_results[model_name] = result
+            yield model_name, result
+    
+    def train_all_models(self, df: pd.DataFrame) -> Dict:
+        """Train all available models"""
+        return dict(self.iter_train_models(df))
+    
+    def refresh_models(self, df: pd.DataFrame, policy: Optional[StalenessPolicy] = None) -> Dict:
+        """
+        Bring every model up to date with df
+        
+        Each model is skipped, warm-start updated or fully refitted as the
+        staleness policy decides; the result's 'refresh' key says which.
+        """
+        policy = policy or StalenessPolicy(
+            max_age_days=REFRESH_MAX_AGE_DAYS,
+            max_updates=REFRESH_MAX_UPDATES,
+            max_new_rows_fraction=REFRESH_MAX_NEW_ROWS_FRACTION
+        )
+        results = {}
+        for model_name, model in self.models.items():
+            try:
+                with MODEL_FIT_DURATION.time(model=model_name):
+                    result = model.refresh(df, policy)
+                if result.get('success', False) and result['refresh'] != 'skip':
+                    self.training_results[model_name] = result
+            except Exception as e:
+                logger.error(f"Error refreshing {model_name}: {str(e)}")
+                result = {
+                    'success': False,
+                    'error': str(e)
+                }
+            results[model_name] = result
         return results
     
     def predict_single_model(
         self,
         model_name: str,
         df: pd.DataFrame,
-        horizon: int
+        horizon: int,
+        fingerprint: Optional[str] = None
     ) -> Dict:
-        """Get predictions from a single model"""
+        """
+        Get predictions from a single model
+        
+        Successful forecasts are cached per (model fit, data, horizon), so the
+        ensemble and repeated calls on the same frame reuse them. Pass
+        fingerprint when calling repeatedly with the same frame to skip
+        rehashing it.
+        """
         if model_name not in self.models:
             return {
                 'success': False,
                 'error': f'Model {model_name} not found'
             }
         
+        model = self.models[model_name]
+        model_key = (model_name, id(model), model.model_version)
+        fingerprint = fingerprint or data_fingerprint(df)
+        
+        cached = self.forecast_cache.get(model_key, fingerprint, horizon)
+        if cached is not None:
+            FORECAST_CACHE_REQUESTS.labels(result='hit').inc()
+            return dict(cached)
+        
+        if model.prefix_consistent:
+            longer = self.forecast_cache.get_longer(model_key, fingerprint, horizon)
+            if longer is not None:
+                FORECAST_CACHE_REQUESTS.labels(result='slice').inc()
+                result = model.slice_forecast(longer, horizon)
+                self.forecast_cache.put(model_key, fingerprint, horizon, result)
+                return dict(result)
+        
+        FORECAST_CACHE_REQUESTS.labels(result='miss').inc()
         try:
-            return self.models[model_name].predict(df, horizon)
+            with MODEL_PREDICT_DURATION.time(model=model_name):
+                result = model.predict(df, horizon)
         except Exception as e:
             logger.error(f"Error predicting with {model_name}: {str(e)}")
             return {
@@ -69,15 +196,55 @@ class MLPredictor:
                 'error': str(e)
             }
     
-    def predict_ensemble(self, df: pd.DataFrame, horizon: int) -> Dict:
-        """Get ensemble predictions from all models"""
+        if result.get('success', False):
+            self.forecast_cache.put(model_key, fingerprint, horizon, result)
+        return dict(result)
+    
+    def predict_horizons(
+        self,
+        model_name: str,
+        df: pd.DataFrame,
+        horizons: List[int]
+    ) -> Dict[int, Dict]:
+        """
+        Get predictions from a single model for several horizons
+        
+        Prefix-consistent models run once at the longest horizon and the
+        shorter horizons are sliced from that forecast.
+        """
+        fingerprint = data_fingerprint(df)
+        
+        # Longest first: shorter horizons are then sliced from the cached forecast
+        return {
+            horizon: self.predict_single_model(model_name, df, horizon, fingerprint)
+            for horizon in sorted(horizons, reverse=True)
+        }
+    
+    def predict_ensemble(
+        self,
+        df: pd.DataFrame,
+        horizon: int,
+        model_predictions: Optional[Dict[str, Dict]] = None,
+        model_names: Optional[List[str]] = None
+    ) -> Dict:
+        """
+        Get ensemble predictions from all models (or only model_names)
+        
+        model_predictions can pass in already computed per-model results for
+        this horizon; only models missing from it are run.
+        """
         all_predictions = {}
         successful_models = []
+        model_predictions = model_predictions or {}
+        fingerprint = None
         
-        # Get predictions from each model
-        for model_name, model in self.models.items():
+        # Get predictions from each model (cached when already computed)
+        for model_name in model_names or list(self.models):
             try:
-                result = model.predict(df, horizon)
+                result = model_predictions.get(model_name)
+                if result is None:
+                    fingerprint = fingerprint or data_fingerprint(df)
+                    result = self.predict_single_model(model_name, df, horizon, fingerprint)
                 if result.get('success', False):
                     all_predictions[model_name] = result
                     successful_models.append(model_name)
@@ -95,10 +262,12 @@ class MLPredictor:
         ensemble_lower = np.zeros(horizon)
         ensemble_upper = np.zeros(horizon)
         
-        total_weight = sum(self.model_weights[m] for m in successful_models)
+        model_weights = self.weighting.weights()
+        total_weight = sum(model_weights[m] for m in successful_models) or 1.0
+        weights = {m: model_weights[m] / total_weight for m in successful_models}
         
         for model_name in successful_models:
-            weight = self.model_weights[model_name] / total_weight
+            weight = weights[model_name]
             predictions = np.array(all_predictions[model_name]['predictions'])
             lower = np.array(all_predictions[model_name]['lower_bound'])
             upper = np.array(all_predictions[model_name]['upper_bound'])
@@ -115,6 +284,7 @@ class MLPredictor:
             'upper_bound': [float(u) for u in ensemble_upper],
             'horizon': horizon,
             'models_used': successful_models,
+            'weights': weights,
             'individual_predictions': {
                 model: all_predictions[model]['predictions']
                 for model in successful_models
@@ -126,21 +296,50 @@ class MLPredictor:
         df: pd.DataFrame,
         horizons: Dict[str, int]
     ) -> Dict:
-        """Get predictions for all horizons from all models"""
-        results = {}
+        """
+        Get predictions for all horizons from all models
         
-        for horizon_name, horizon_days in horizons.items():
-            results[horizon_name] = {}
-            
-            # Get predictions from each model
-            for model_name in self.models.keys():
-                results[horizon_name][model_name] = self.predict_single_model(
-                    model_name, df, horizon_days
-                )
+        Served forecasts are recorded and scored as their actual bars show
+        up in later frames, which updates the ensemble weights. Models whose
+        weight is below the threshold are not run (see EnsembleWeighting).
+        """
+        results = {horizon_name: {} for horizon_name in horizons}
+        horizon_days_list = sorted(set(horizons.values()))
+        
+        # Score earlier forecasts against the bars that arrived since
+        self.weighting.observe(df)
+        active_models = self.weighting.models_to_run()
+        
+        # Get predictions from each model (longest horizon once, sliced for the rest)
+        served = {}
+        for model_name in self.models.keys():
+            if model_name not in active_models:
+                for horizon_name in horizons:
+                    results[horizon_name][model_name] = {
+                        'success': False,
+                        'skipped': True,
+                        'error': 'Ensemble weight below threshold; model not run'
+                    }
+                continue
             
-            # Get ensemble prediction
+            by_horizon = self.predict_horizons(model_name, df, horizon_days_list)
+            for horizon_name, horizon_days in horizons.items():
+                results[horizon_name][model_name] = by_horizon[horizon_days]
+            longest = by_horizon[horizon_days_list[-1]]
+            if longest.get('success', False):
+                served[model_name] = longest['predictions']
+        
+        # Get ensemble prediction from the per-model results
+        for horizon_name, horizon_days in horizons.items():
             results[horizon_name]['ensemble'] = self.predict_ensemble(
-                df, horizon_days
+                df, horizon_days, model_predictions=results[horizon_name], model_names=active_models
+            )
+            
+        if 'date' in df.columns and len(df):
+            ensemble = results[max(horizons, key=horizons.get)]['ensemble']
+            self.weighting.record(
+                df['date'].iloc[-1], served,
+                ensemble=ensemble['predictions'] if ensemble.get('success', False) else None
             )
         
         return results
@@ -163,15 +362,23 @@ class MLPredictor:
                     'is_trained': self.models[model_name].is_trained
                 }
         
-        # Calculate ensemble performance as average of individual models
+        # Ensemble performance from its scored served forecasts; until enough
+        # are scored, approximated by the weighted average of the models' metrics
+        weights = self.weighting.weights()
+        served_metrics = self.weighting.ensemble_metrics()
         if performance:
-            ensemble_metrics = {
-                'rmse': np.mean([m['rmse'] for m in performance.values()]),
-                'mae': np.mean([m['mae'] for m in performance.values()]),
-                'mape': np.mean([m['mape'] for m in performance.values()]),
-                'direction_accuracy': np.mean([m['direction_accuracy'] for m in performance.values()]),
-                'is_trained': all(m['is_trained'] for m in performance.values())
-            }
+            if served_metrics is not None:
+                ensemble_metrics = dict(served_metrics, source='served_forecasts')
+            else:
+                model_weights = np.array([weights.get(m, 0.0) for m in performance])
+                if model_weights.sum() <= 0:
+                    model_weights = np.ones(len(performance))
+                ensemble_metrics = {
+                    metric: float(np.average([m[metric] for m in performance.values()], weights=model_weights))
+                    for metric in ('rmse', 'mae', 'mape', 'direction_accuracy')
+                }
+                ensemble_metrics['source'] = 'weighted_model_average'
+            ensemble_metrics['is_trained'] = all(m['is_trained'] for m in performance.values())
             performance['ensemble'] = ensemble_metrics
         
         # Rank models by RMSE (including ensemble)
@@ -183,6 +390,7 @@ class MLPredictor:
             
             return {
                 'performance': performance,
+                'ensemble_weights': self.weighting.summary(),
                 'best_model': ranked_models[0][0] if ranked_models else None,
                 'ranked_models': [
                     {
@@ -191,13 +399,17 @@ class MLPredictor:
                         'model_specs': self.training_results.get(model, {}).get('model_specs') if model != 'ensemble' else {
                             'total_samples': 'Combined',
                             'train_samples': 'All models',
-                            'test_samples': 'All models',
+                            'test_samples': served_metrics['samples'] if served_metrics else 'All models',
                             'n_features': 'Varies by model',
                             'train_test_split': '80/20',
                             'hyperparameters': {
-                                'weights': self.model_weights
+                                'weights': weights,
+                                'weighting': self.weighting.method
                             },
-                            'description': 'Weighted combination of all models'
+                            'description': 'Weighted combination of all models' + (
+                                '; metrics from its scored forecasts' if served_metrics
+                                else '; metrics approximated by the weighted average of the models\' metrics'
+                            )
                         }
                     }
                     for model, metrics in ranked_models
@@ -206,6 +418,79 @@ class MLPredictor:
         
         return {'error': 'No performance data available'}
     
+    def save(self, path: str, metadata: Optional[Dict] = None):
+        """Save every trained model plus ensemble state to a directory"""
+        os.makedirs(path, exist_ok=True)
+        saved_models = []
+        
+        for model_name, model in self.models.items():
+            if not model.is_trained:
+                continue
+            try:
+                model.save(os.path.join(path, model_name))
+                saved_models.append(model_name)
+            except Exception as e:
+                logger.error(f"Error saving {model_name}: {str(e)}")
+        
+        joblib.dump(self.training_results, os.path.join(path, 'training_results.joblib'))
+        self.save_ensemble_state(path)
+        with open(os.path.join(path, 'manifest.json'), 'w') as f:
+            json.dump({
+                'models': saved_models,
+                'model_weights': self.model_weights,
+                'training_metadata': {
+                    name: self.models[name].training_metadata for name in saved_models
+                },
+                'metadata': metadata or {}
+            }, f, indent=2, default=str)
+    
+    def save_ensemble_state(self, path: str):
+        """Save the ensemble weighting state (scored errors, pending forecasts) into a saved set's directory"""
+        joblib.dump(self.weighting.state(), os.path.join(path, 'ensemble_weights.joblib'))
+        self.weighting.dirty = False
+    
+    @staticmethod
+    def read_manifest(path: str) -> Dict:
+        """Read the manifest of a saved predictor without loading any model"""
+        with open(os.path.join(path, 'manifest.json'), 'r') as f:
+            return json.load(f)
+    
+    @classmethod
+    def load(cls, path: str, lazy: bool = True) -> 'MLPredictor':
+        """
+        Load a predictor saved with save()
+        
+        With lazy=True each model is deserialized on its first prediction,
+        so a restarted server can answer as soon as the manifests are read.
+        """
+        predictor = cls()
+        manifest = cls.read_manifest(path)
+        # Sets saved before a model was added have no weight for it
+        default_weights = predictor.model_weights
+        predictor.model_weights = manifest['model_weights']
+        predictor.weighting.prior = {
+            name: predictor.model_weights.get(name, default_weights[name])
+            for name in predictor.models
+        }
+        predictor.training_results = joblib.load(os.path.join(path, 'training_results.joblib'))
+        
+        # Sets saved before online weighting existed start from the static weights
+        weights_path = os.path.join(path, 'ensemble_weights.joblib')
+        if os.path.exists(weights_path):
+            predictor.weighting.load_state(joblib.load(weights_path))
+        
+        for model_name in manifest['models']:
+            try:
+                predictor.models[model_name].load(os.path.join(path, model_name), lazy=lazy)
+            except Exception as e:
+                logger.error(f"Error loading {model_name}: {str(e)}")
+        
+        return predictor
+    
+    def estimate_memory_bytes(self) -> int:
+        """Approximate in-memory size of all fitted models (saved size for models not loaded yet)"""
+        return sum(model.memory_bytes() for model in self.models.values())
+    
     def update_model_weights(self, weights: Dict[str, float]):
         """Update ensemble model weights"""
         total = sum(weights.values())
@@ -214,3 +499,4 @@ class MLPredictor:
                 model: weight / total
                 for model, weight in weights.items()
             }
+            self.weighting.prior = {name: self.model_weights.get(name, 0.0) for name in self.models}
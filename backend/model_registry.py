@@ -0,0 +1,207 @@
+"""
+Model Registry - Keeps one trained MLPredictor per symbol and training configuration
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from config import MODEL_REGISTRY_MAX_MEMORY_MB, MODEL_STORE_DIR, MODEL_PERSISTENCE_ENABLED
+from ml_predictor import MLPredictor
+
+logger = logging.getLogger(__name__)
+
+class ModelRegistry:
+    """
+    Registry of trained model sets keyed by (symbol, training config)
+    
+    Model sets live in memory until their combined estimated size exceeds
+    the memory budget; the least recently used sets are then dropped from
+    memory and reloaded transparently from disk on the next lookup.
+    
+    With persistence enabled every registered set is saved as soon as it is
+    trained, and sets saved by a previous process are picked up at startup,
+    so a restart serves predictions without retraining.
+    """
+    
+    def __init__(
+        self,
+        max_memory_mb: float = MODEL_REGISTRY_MAX_MEMORY_MB,
+        storage_dir: str = MODEL_STORE_DIR,
+        persist: bool = MODEL_PERSISTENCE_ENABLED
+    ):
+        self.max_memory_bytes = int(max_memory_mb * 1024 * 1024)
+        self.storage_dir = storage_dir
+        self.persist = persist
+        self._lock = threading.RLock()
+        # key -> (predictor, estimated bytes), ordered from least to most recently used
+        self._in_memory: "OrderedDict[str, Tuple[MLPredictor, int]]" = OrderedDict()
+        # key -> directory of model sets saved to disk
+        self._on_disk: Dict[str, str] = {}
+        # key -> (symbol, config) it was registered with
+        self._key_info: Dict[str, Tuple[str, Dict]] = {}
+        # symbol -> key of the most recently registered model set
+        self._latest: Dict[str, str] = {}
+        
+        if self.persist:
+            self._restore()
+    
+    @staticmethod
+    def make_key(symbol: str, config: Optional[Dict] = None) -> str:
+        """Build a registry key from a symbol and its training configuration"""
+        return f"{symbol}|{json.dumps(config or {}, sort_keys=True, default=str)}"
+    
+    def register(self, symbol: str, config: Optional[Dict], predictor: MLPredictor) -> str:
+        """Store a trained predictor and make it the default for its symbol"""
+        key = self.make_key(symbol, config)
+        with self._lock:
+            self._drop(key)
+            self._in_memory[key] = (predictor, predictor.estimate_memory_bytes())
+            self._key_info[key] = (symbol, config or {})
+            self._latest[symbol] = key
+            if self.persist:
+                self._save(key, predictor)
+            self._enforce_budget()
+        logger.info(f"Registered models for {key}")
+        return key
+    
+    def get(self, symbol: str, config: Optional[Dict] = None) -> Optional[MLPredictor]:
+        """
+        Get the trained predictor for a symbol
+        
+        Without a config, returns the most recently registered model set
+        for the symbol. Returns None if nothing has been trained.
+        """
+        with self._lock:
+            key = self.make_key(symbol, config) if config is not None else self._latest.get(symbol)
+            if key is None:
+                return None
+            
+            if key in self._in_memory:
+                # Lazily loaded models grow once deserialized, so re-estimate on every use
+                predictor = self._in_memory[key][0]
+                self._in_memory[key] = (predictor, predictor.estimate_memory_bytes())
+                self._in_memory.move_to_end(key)
+                self._enforce_budget()
+                return predictor
+            
+            if key in self._on_disk:
+                return self._reload(key)
+            
+            return None
+    
+    def has(self, symbol: str, config: Optional[Dict] = None) -> bool:
+        """Check whether trained models exist for a symbol (in memory or on disk)"""
+        with self._lock:
+            key = self.make_key(symbol, config) if config is not None else self._latest.get(symbol)
+            return key is not None and (key in self._in_memory or key in self._on_disk)
+    
+    def save_ensemble_state(self, symbol: str, config: Optional[Dict] = None):
+        """Persist a model set's ensemble weighting state if it changed since its last save"""
+        with self._lock:
+            key = self.make_key(symbol, config) if config is not None else self._latest.get(symbol)
+            if not self.persist or key not in self._in_memory or key not in self._on_disk:
+                return
+            predictor = self._in_memory[key][0]
+            if predictor.weighting.dirty:
+                try:
+                    predictor.save_ensemble_state(self._on_disk[key])
+                except Exception as e:
+                    logger.error(f"Error saving ensemble weights for {key}: {str(e)}")
+    
+    def memory_usage(self) -> int:
+        """Estimated bytes held by in-memory model sets"""
+        with self._lock:
+            return sum(size for _, size in self._in_memory.values())
+    
+    def get_stats(self) -> Dict:
+        """Registry summary for monitoring"""
+        with self._lock:
+            return {
+                'in_memory': len(self._in_memory),
+                'on_disk': len(self._on_disk),
+                'memory_usage_mb': self.memory_usage() / (1024 * 1024),
+                'max_memory_mb': self.max_memory_bytes / (1024 * 1024),
+                'symbols': sorted(self._latest.keys())
+            }
+    
+    def _path_for(self, key: str) -> str:
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.storage_dir, digest)
+    
+    def _drop(self, key: str):
+        """Forget any previous version of a key"""
+        self._in_memory.pop(key, None)
+        path = self._on_disk.pop(key, None)
+        if path and os.path.exists(path):
+            shutil.rmtree(path, ignore_errors=True)
+    
+    def _save(self, key: str, predictor: MLPredictor) -> bool:
+        symbol, config = self._key_info[key]
+        try:
+            path = self._path_for(key)
+            predictor.save(path, metadata={
+                'registry_key': key,
+                'symbol': symbol,
+                'config': config,
+                'saved_at': datetime.now().isoformat()
+            })
+            self._on_disk[key] = path
+            return True
+        except Exception as e:
+            # Losing the set only costs a retrain; don't fail the request that triggered the save
+            logger.error(f"Error saving models for {key}: {str(e)}")
+            return False
+    
+    def _restore(self):
+        """Index model sets saved by previous processes; models load lazily on first use"""
+        if not os.path.isdir(self.storage_dir):
+            return
+        
+        saved_at: Dict[str, str] = {}
+        for entry in os.listdir(self.storage_dir):
+            path = os.path.join(self.storage_dir, entry)
+            try:
+                metadata = MLPredictor.read_manifest(path)['metadata']
+            except Exception:
+                continue
+            
+            key, symbol = metadata['registry_key'], metadata['symbol']
+            self._on_disk[key] = path
+            self._key_info[key] = (symbol, metadata['config'])
+            if metadata['saved_at'] > saved_at.get(symbol, ''):
+                saved_at[symbol] = metadata['saved_at']
+                self._latest[symbol] = key
+        
+        if self._on_disk:
+            logger.info(f"Found {len(self._on_disk)} saved model sets for {len(self._latest)} symbols")
+    
+    def _enforce_budget(self):
+        """Evict least recently used model sets until under budget"""
+        # Always keep the most recently used set in memory, even if it alone exceeds the budget
+        while len(self._in_memory) > 1 and self.memory_usage() > self.max_memory_bytes:
+            key, (predictor, _) = self._in_memory.popitem(last=False)
+            if key not in self._on_disk:
+                self._save(key, predictor)
+            elif predictor.weighting.dirty:
+                # The models are unchanged on disk; only the weighting state moved on
+                predictor.save_ensemble_state(self._on_disk[key])
+            logger.info(f"Evicted models for {key} from memory")
+    
+    def _reload(self, key: str) -> Optional[MLPredictor]:
+        path = self._on_disk[key]
+        try:
+            predictor = MLPredictor.load(path, lazy=True)
+        except Exception as e:
+            logger.error(f"Error reloading models for {key}: {str(e)}")
+            return None
+        
+        self._in_memory[key] = (predictor, predictor.estimate_memory_bytes())
+        self._enforce_budget()
+        logger.info(f"Reloaded models for {key} from disk")
+        return predictor
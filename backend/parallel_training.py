@@ -0,0 +1,106 @@
+"""
+Parallel model training across worker processes
+
+Each model is fitted in its own spawned process with a thread budget, so
+Random Forest's n_jobs, XGBoost's threads and TensorFlow's intra-op pool
+share the machine instead of each grabbing every core. Fitted models come
+back through the models' own save()/load() formats (joblib, native
+XGBoost JSON, .keras) via a temporary directory rather than being pickled
+through the result pipe.
+"""
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterator, Optional, Tuple
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Thread-count variables read by BLAS/OpenMP runtimes when they initialize
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS')
+
+def thread_budgets(models: Dict, n_cpus: Optional[int] = None) -> Dict[str, int]:
+    """
+    Split the available cores between models training side by side
+    
+    Models with a max_threads cap (e.g. Prophet) get at most that many;
+    the remaining cores are shared evenly by the others.
+    """
+    n_cpus = n_cpus or os.cpu_count() or 1
+    budgets = {
+        name: model.max_threads
+        for name, model in models.items()
+        if model.max_threads is not None
+    }
+    uncapped = [name for name in models if name not in budgets]
+    if uncapped:
+        share = max(1, (n_cpus - sum(budgets.values())) // len(uncapped))
+        budgets.update({name: share for name in uncapped})
+    return budgets
+
+def _train_in_worker(
+    model_name: str,
+    params: Dict,
+    options: Dict,
+    df: pd.DataFrame,
+    n_threads: int,
+    artifact_dir: str
+) -> Tuple[Dict, float]:
+    """Fit one model in a worker process and save it to artifact_dir"""
+    # Must happen before the worker imports numpy-backed frameworks
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(n_threads)
+    
+    from ml_models import create_model
+    
+    model = create_model(model_name, params, options=options)
+    model.set_thread_budget(n_threads)
+    
+    start = time.perf_counter()
+    result = model.train(df)
+    duration = time.perf_counter() - start
+    
+    if result.get('success', False):
+        model.save(artifact_dir)
+    return result, duration
+
+def iter_train_parallel(
+    models: Dict,
+    df: pd.DataFrame,
+    max_workers: Optional[int] = None,
+    n_cpus: Optional[int] = None
+) -> Iterator[Tuple[str, Dict, Optional[float]]]:
+    """
+    Train models concurrently, yielding (model_name, result, seconds) as each finishes
+    
+    Successful fits are loaded back into the instances in models before
+    they are yielded. seconds is None when the worker itself failed, so
+    the fit was never timed.
+    """
+    budgets = thread_budgets(models, n_cpus)
+    context = multiprocessing.get_context('spawn')
+    
+    with tempfile.TemporaryDirectory(prefix='training-') as tmp_dir:
+        with ProcessPoolExecutor(max_workers=max_workers or len(models), mp_context=context) as pool:
+            futures = {}
+            for name, model in models.items():
+                params = {attr: getattr(model, attr) for attr in model.persisted_attributes}
+                options = {attr: getattr(model, attr) for attr in model.option_attributes}
+                artifact_dir = os.path.join(tmp_dir, name)
+                future = pool.submit(_train_in_worker, name, params, options, df, budgets[name], artifact_dir)
+                futures[future] = (name, artifact_dir)
+            
+            for future in as_completed(futures):
+                name, artifact_dir = futures[future]
+                try:
+                    result, duration = future.result()
+                    if result.get('success', False):
+                        models[name].load(artifact_dir, lazy=False)
+                except Exception as e:
+                    logger.error(f"Error training {name} in worker: {str(e)}")
+                    result, duration = {'success': False, 'error': str(e)}, None
+                yield name, result, duration
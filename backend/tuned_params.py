@@ -0,0 +1,66 @@
+"""
+Best hyperparameters per symbol and model, found by hyperparameter_search
+
+Stored as one JSON file so tuned values survive restarts;
+ml_predictor.build_model(name, symbol) applies them to new models.
+"""
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+
+from config import TUNED_PARAMS_FILE
+
+logger = logging.getLogger(__name__)
+
+class TunedParamsStore:
+    """symbol -> model name -> {'params', 'score', 'metric', 'tuned_at'}, backed by a JSON file"""
+    
+    def __init__(self, path: str = TUNED_PARAMS_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Optional[Dict] = None
+    
+    def _load(self) -> Dict:
+        """Read the file on first access (callers hold the lock)"""
+        if self._entries is None:
+            try:
+                with open(self.path, 'r') as f:
+                    self._entries = json.load(f)
+            except FileNotFoundError:
+                self._entries = {}
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not read tuned parameters from {self.path}: {str(e)}")
+                self._entries = {}
+        return self._entries
+    
+    def get(self, symbol: str, model_name: str) -> Dict:
+        """Tuned hyperparameters of a model for a symbol ({} if never tuned)"""
+        with self._lock:
+            entry = self._load().get(symbol, {}).get(model_name)
+            return dict(entry['params']) if entry else {}
+    
+    def set(self, symbol: str, model_name: str, params: Dict, score: float, metric: str):
+        """Record the best hyperparameters of a model for a symbol and write the file"""
+        with self._lock:
+            entries = self._load()
+            entries.setdefault(symbol, {})[model_name] = {
+                'params': params,
+                'score': score,
+                'metric': metric,
+                'tuned_at': datetime.now().isoformat()
+            }
+            
+            # Write then rename, so a crash never leaves a truncated file
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(entries, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+# Process-wide store used by ml_predictor.build_model
+TUNED_PARAMS = TunedParamsStore()
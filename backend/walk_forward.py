@@ -0,0 +1,284 @@
+"""
+Walk-forward cross-validation
+
+A model's train() scores it on a single 80/20 split, so its metrics
+reflect one test window. Walk-forward validation refits the model on
+several consecutive origins and scores each fit on the window right after
+it, either with an expanding training window (always starting at the
+first row) or a sliding one of fixed length.
+
+Folds are fitted concurrently in spawned worker processes, like
+parallel_training. The feature matrix is computed once for the whole
+frame; every fold gets its rows cut from it instead of recomputing lags
+and rolling windows.
+"""
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config import CV_MAX_WORKERS, CV_MODE, CV_N_FOLDS, CV_TIME_BUDGET_SECONDS
+from ml_models.base_model import BaseMLModel
+from ml_models.feature_store import FEATURE_STORE, FeatureSet
+from parallel_training import THREAD_ENV_VARS
+
+logger = logging.getLogger(__name__)
+
+# (train_start, test_start, test_end) row positions of one fold
+Fold = Tuple[int, int, int]
+
+def walk_forward_splits(
+    n_rows: int,
+    n_folds: int = CV_N_FOLDS,
+    mode: str = CV_MODE,
+    test_rows: Optional[int] = None,
+    window_rows: Optional[int] = None
+) -> List[Fold]:
+    """
+    Consecutive test windows at the end of the data, each preceded by its training window
+    
+    Args:
+        n_rows: Rows in the full frame
+        n_folds: Number of folds (test windows)
+        mode: 'expanding' (train from the first row) or 'sliding' (fixed-length train window)
+        test_rows: Rows per test window (default: a fifth of the first fold's train window)
+        window_rows: Train window length in sliding mode (default: the first fold's)
+    
+    Returns:
+        Folds in chronological order
+    """
+    if mode not in ('expanding', 'sliding'):
+        raise ValueError(f"Unknown walk-forward mode: {mode}")
+    
+    # The first fold trains on 4 test windows' worth of rows, like an 80/20 split
+    test_rows = test_rows or n_rows // (n_folds + 4)
+    first_test_start = n_rows - n_folds * test_rows
+    if test_rows < 1 or first_test_start < test_rows:
+        raise ValueError(f"{n_rows} rows are too few for {n_folds} walk-forward folds")
+    window_rows = window_rows or first_test_start
+    
+    folds = []
+    for fold in range(n_folds):
+        test_start = first_test_start + fold * test_rows
+        train_start = 0 if mode == 'expanding' else max(0, test_start - window_rows)
+        folds.append((train_start, test_start, test_start + test_rows))
+    return folds
+
+def _fit_fold(
+    model_name: str,
+    params: Dict,
+    fold_df: pd.DataFrame,
+    holdout_rows: int,
+    n_threads: Optional[int]
+) -> Tuple[Dict, float]:
+    """Fit one model on a fold and score it on the fold's final holdout_rows rows"""
+    from ml_predictor import build_model
+    
+    # Configured precision and settings, with the candidate's hyperparameters on top
+    model = build_model(model_name)
+    model.set_params(params)
+    model.holdout_rows = holdout_rows
+    model.set_thread_budget(n_threads)
+    
+    start = time.perf_counter()
+    result = model.train(fold_df)
+    duration = time.perf_counter() - start
+    
+    # Only the scores travel back; the fitted fold model is discarded
+    summary = {key: result[key] for key in ('success', 'metrics', 'error') if key in result}
+    return summary, duration
+
+def _fit_fold_in_worker(
+    model_name: str,
+    params: Dict,
+    fold_df: pd.DataFrame,
+    feature_set: FeatureSet,
+    holdout_rows: int,
+    n_threads: int
+) -> Tuple[Dict, float]:
+    """_fit_fold in a worker process, with the fold's features precomputed by the parent"""
+    # Must happen before the worker imports numpy-backed frameworks
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(n_threads)
+    
+    FEATURE_STORE.put(fold_df, BaseMLModel.FEATURE_LAGS, BaseMLModel.FEATURE_WINDOWS, feature_set)
+    return _fit_fold(model_name, params, fold_df, holdout_rows, n_threads)
+
+def aggregate_metrics(fold_results: List[Dict]) -> Dict[str, Dict[str, float]]:
+    """Mean, standard deviation, min and max of every metric over the successful folds"""
+    scored = [result['metrics'] for result in fold_results if result.get('success', False)]
+    if not scored:
+        return {}
+    
+    summary = {}
+    for metric in scored[0]:
+        values = np.array([metrics[metric] for metrics in scored], dtype=float)
+        summary[metric] = {
+            'mean': float(values.mean()),
+            'std': float(values.std(ddof=1)) if len(values) > 1 else 0.0,
+            'min': float(values.min()),
+            'max': float(values.max())
+        }
+    return summary
+
+class WalkForwardValidator:
+    """Walk-forward cross-validation of one or more model configurations"""
+    
+    def __init__(
+        self,
+        n_folds: int = CV_N_FOLDS,
+        mode: str = CV_MODE,
+        test_rows: Optional[int] = None,
+        window_rows: Optional[int] = None,
+        max_workers: Optional[int] = CV_MAX_WORKERS,
+        time_budget: Optional[float] = CV_TIME_BUDGET_SECONDS
+    ):
+        self.n_folds = n_folds
+        self.mode = mode
+        self.test_rows = test_rows
+        self.window_rows = window_rows
+        self.max_workers = max_workers
+        # Seconds after which no further fold is started (running folds finish)
+        self.time_budget = time_budget
+    
+    def splits(self, n_rows: int) -> List[Fold]:
+        return walk_forward_splits(n_rows, self.n_folds, self.mode, self.test_rows, self.window_rows)
+    
+    def evaluate(self, model_name: str, df: pd.DataFrame, params: Optional[Dict] = None) -> Dict:
+        """Cross-validate one model"""
+        return self.evaluate_candidates({model_name: (model_name, params or {})}, df)[model_name]
+    
+    def evaluate_models(self, model_names: List[str], df: pd.DataFrame) -> Dict[str, Dict]:
+        """Cross-validate several models with their default hyperparameters"""
+        return self.evaluate_candidates({name: (name, {}) for name in model_names}, df)
+    
+    def evaluate_candidates(
+        self,
+        candidates: Dict[str, Tuple[str, Dict]],
+        df: pd.DataFrame,
+        folds: Optional[List[Fold]] = None
+    ) -> Dict[str, Dict]:
+        """
+        Cross-validate model configurations, all (candidate, fold) fits in one pool
+        
+        Args:
+            candidates: key -> (model name, hyperparameters to set on the model)
+            df: Full price frame
+            folds: Folds to run (default: self.splits(len(df)))
+        
+        Returns:
+            key -> per-fold results and metrics aggregated over the folds
+        """
+        df = df.reset_index(drop=True)
+        folds = folds if folds is not None else self.splits(len(df))
+        # Most recent folds first, so a time budget keeps the most relevant ones
+        tasks = [
+            (key, fold_idx)
+            for fold_idx in reversed(range(len(folds)))
+            for key in candidates
+        ]
+        
+        fold_results = {key: {} for key in candidates}
+        start = time.perf_counter()
+        for (key, fold_idx), result, duration in self._run(tasks, candidates, df, folds, start):
+            train_start, test_start, test_end = folds[fold_idx]
+            fold_results[key][fold_idx] = dict(
+                result,
+                fold=fold_idx,
+                train_start=str(df['date'].iloc[train_start]) if 'date' in df.columns else train_start,
+                test_start=str(df['date'].iloc[test_start]) if 'date' in df.columns else test_start,
+                test_end=str(df['date'].iloc[test_end - 1]) if 'date' in df.columns else test_end - 1,
+                train_rows=test_start - train_start,
+                test_rows=test_end - test_start,
+                seconds=duration
+            )
+        
+        budget_exhausted = sum(len(results) for results in fold_results.values()) < len(tasks)
+        report = {}
+        for key, (model_name, params) in candidates.items():
+            completed = [fold_results[key][idx] for idx in sorted(fold_results[key])]
+            report[key] = {
+                'model': model_name,
+                'params': params,
+                'mode': self.mode,
+                'n_folds': len(folds),
+                'folds_completed': len(completed),
+                'budget_exhausted': budget_exhausted,
+                'folds': completed,
+                'metrics': aggregate_metrics(completed)
+            }
+        return report
+    
+    def _budget_left(self, start: float) -> bool:
+        return self.time_budget is None or time.perf_counter() - start < self.time_budget
+    
+    def _run(
+        self,
+        tasks: List[Tuple[str, int]],
+        candidates: Dict[str, Tuple[str, Dict]],
+        df: pd.DataFrame,
+        folds: List[Fold],
+        start: float
+    ) -> Iterator[Tuple[Tuple[str, int], Dict, float]]:
+        """Yield ((key, fold index), result, seconds) as fold fits finish"""
+        n_cpus = os.cpu_count() or 1
+        max_workers = min(self.max_workers or n_cpus, len(tasks))
+        
+        # Worker processes only pay off with more than one core to share
+        if max_workers <= 1 or n_cpus <= 1:
+            for key, fold_idx in tasks:
+                if not self._budget_left(start):
+                    logger.info("Walk-forward time budget exhausted")
+                    return
+                model_name, params = candidates[key]
+                train_start, test_start, test_end = folds[fold_idx]
+                FEATURE_STORE.get_window(df, train_start, test_end, BaseMLModel.FEATURE_LAGS, BaseMLModel.FEATURE_WINDOWS)
+                result, duration = _fit_fold(
+                    model_name, params, df.iloc[train_start:test_end], test_end - test_start, None
+                )
+                yield (key, fold_idx), result, duration
+            return
+        
+        n_threads = max(1, n_cpus // max_workers)
+        context = multiprocessing.get_context('spawn')
+        pending_tasks = list(tasks)
+        
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as pool:
+            running = {}
+            
+            def submit_next():
+                key, fold_idx = pending_tasks.pop(0)
+                model_name, params = candidates[key]
+                train_start, test_start, test_end = folds[fold_idx]
+                feature_set = FEATURE_STORE.get_window(
+                    df, train_start, test_end, BaseMLModel.FEATURE_LAGS, BaseMLModel.FEATURE_WINDOWS
+                )
+                future = pool.submit(
+                    _fit_fold_in_worker, model_name, params, df.iloc[train_start:test_end],
+                    feature_set, test_end - test_start, n_threads
+                )
+                running[future] = (key, fold_idx)
+            
+            while pending_tasks and len(running) < max_workers:
+                submit_next()
+            
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = running.pop(future)
+                    try:
+                        result, duration = future.result()
+                    except Exception as e:
+                        logger.error(f"Error fitting walk-forward fold {task}: {str(e)}")
+                        result, duration = {'success': False, 'error': str(e)}, 0.0
+                    yield task, result, duration
+                
+                while pending_tasks and len(running) < max_workers and self._budget_left(start):
+                    submit_next()
+                if pending_tasks and not running:
+                    logger.info("Walk-forward time budget exhausted")
@@ -1,15 +1,21 @@
 import React, { useState } from 'react';
 import { useMutation, useQueryClient } from '@tanstack/react-query';
-import { runBacktest, predictFuture } from '../services/api';
+import { streamBacktest, predictFuture } from '../services/api';
 import { LineChart, Line, XAxis, YAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer, ReferenceLine } from 'recharts';
 import { Loader2, Brain, Play, CheckCircle, AlertCircle, TrendingUp, BarChart3, Target, Calendar } from 'lucide-react';
 
+// Non-finite metrics (e.g. direction accuracy of a one-row test period) stream as null
+const fmt = (value, digits, suffix = '') =>
+  value == null || !Number.isFinite(value) ? '—' : `${value.toFixed(digits)}${suffix}`;
+
 const AdvancedBacktesting = ({ symbol, period = '2y' }) => {
   const [stage, setStage] = useState('config'); // 'config', 'backtesting', 'results', 'future'
   const [selectedConfigs, setSelectedConfigs] = useState([]);
   const [backtestResults, setBacktestResults] = useState(null);
   const [futureResults, setFutureResults] = useState(null);
   const [futurePredictionHorizon, setFuturePredictionHorizon] = useState('1month');
+  const [trainingProgress, setTrainingProgress] = useState([]); // models trained so far, per config
+  const [partialResults, setPartialResults] = useState([]); // configs finished so far
   const queryClient = useQueryClient();
 
   // Configuration options
@@ -30,9 +36,18 @@ const AdvancedBacktesting = ({ symbol, period = '2y' }) => {
     { value: '70_30', label: '70/30 Split' }
   ];
 
+  // Render partial results as the backend streams them
+  const handleBacktestEvent = (event) => {
+    if (event.event === 'model_trained') {
+      setTrainingProgress(prev => [...prev, event]);
+    } else if (event.event === 'config_complete') {
+      setPartialResults(prev => [...prev, { ...event.result, config_index: event.config_index }]);
+    }
+  };
+
   // Backtest mutation
   const backtestMutation = useMutation({
-    mutationFn: () => runBacktest(symbol, period, selectedConfigs),
+    mutationFn: () => streamBacktest(symbol, period, selectedConfigs, handleBacktestEvent),
     onSuccess: (data) => {
       setBacktestResults(data.results);
       setStage('results');
@@ -74,6 +89,8 @@ const AdvancedBacktesting = ({ symbol, period = '2y' }) => {
       alert('Please select at least one configuration');
       return;
     }
+    setTrainingProgress([]);
+    setPartialResults([]);
     setStage('backtesting');
     backtestMutation.mutate();
   };
@@ -239,8 +256,8 @@ const AdvancedBacktesting = ({ symbol, period = '2y' }) => {
                   <p>Test: {info.config.test_period.replace('_', ' ')}</p>
                   <p>Train: {info.config.train_lookback}</p>
                   <p>Split: {info.config.train_test_split.replace('_', '/')}</p>
-                  <p className="text-green-600 font-semibold mt-2">RMSE: {info.metrics.rmse.toFixed(4)}</p>
-                  <p className="text-blue-600">Dir. Acc: {info.metrics.direction_accuracy.toFixed(1)}%</p>
+                  <p className="text-green-600 font-semibold mt-2">RMSE: {fmt(info.metrics.rmse, 4)}</p>
+                  <p className="text-blue-600">Dir. Acc: {fmt(info.metrics.direction_accuracy, 1, '%')}</p>
                 </div>
               </div>
             ))}
@@ -271,10 +288,10 @@ const AdvancedBacktesting = ({ symbol, period = '2y' }) => {
                   <tr key={idx} className={idx % 2 === 0 ? 'bg-white' : 'bg-gray-50'}>
                     <td className="p-2 text-gray-700">{row.configuration}</td>
                     <td className="p-2 font-semibold">{row.model.toUpperCase()}</td>
-                    <td className="p-2 text-right">{row.rmse.toFixed(4)}</td>
-                    <td className="p-2 text-right">{row.mae.toFixed(4)}</td>
-                    <td className="p-2 text-right">{row.mape.toFixed(2)}%</td>
-                    <td className="p-2 text-right text-blue-600">{row.direction_accuracy.toFixed(1)}%</td>
+                    <td className="p-2 text-right">{fmt(row.rmse, 4)}</td>
+                    <td className="p-2 text-right">{fmt(row.mae, 4)}</td>
+                    <td className="p-2 text-right">{fmt(row.mape, 2, '%')}</td>
+                    <td className="p-2 text-right text-blue-600">{fmt(row.direction_accuracy, 1, '%')}</td>
                     <td className="p-2 text-right">{row.total_points}</td>
                   </tr>
                 ))}
@@ -361,6 +378,62 @@ const AdvancedBacktesting = ({ symbol, period = '2y' }) => {
     );
   };
 
+  // Render progress while the backtest is streaming
+  const renderBacktestProgress = () => (
+    <div className="space-y-6">
+      <div className="flex flex-col items-center justify-center py-8">
+        <Loader2 className="h-16 w-16 animate-spin text-primary-600 mb-4" />
+        <p className="text-lg font-semibold text-gray-800">Running Historical Backtests...</p>
+        <p className="text-sm text-gray-600 mt-2">
+          Completed {partialResults.length} of {selectedConfigs.length} configuration(s)
+        </p>
+        {trainingProgress.length > 0 && (
+          <p className="text-xs text-gray-500 mt-1">
+            Last trained: {trainingProgress[trainingProgress.length - 1].model.toUpperCase()}
+            {' '}(config {trainingProgress[trainingProgress.length - 1].config_index + 1})
+          </p>
+        )}
+      </div>
+
+      {partialResults.length > 0 && (
+        <div className="bg-white border border-gray-200 rounded-lg p-4">
+          <h4 className="font-bold text-gray-900 mb-4 flex items-center">
+            <BarChart3 className="h-5 w-5 mr-2 text-purple-600" />
+            Results So Far
+          </h4>
+          <div className="overflow-x-auto">
+            <table className="w-full text-xs">
+              <thead>
+                <tr className="bg-gray-100">
+                  <th className="text-left p-2">Configuration</th>
+                  <th className="text-left p-2">Model</th>
+                  <th className="text-right p-2">RMSE</th>
+                  <th className="text-right p-2">MAPE%</th>
+                  <th className="text-right p-2">Dir.Acc%</th>
+                </tr>
+              </thead>
+              <tbody>
+                {partialResults.flatMap(result =>
+                  Object.entries(result.accuracy_metrics).map(([model, metrics]) => (
+                    <tr key={`${result.config_index}-${model}`} className="border-t border-gray-100">
+                      <td className="p-2 text-gray-700">
+                        {result.config.test_period.replace('_', ' ')} | {result.config.train_lookback} | {result.config.train_test_split.replace('_', '/')}
+                      </td>
+                      <td className="p-2 font-semibold">{model.toUpperCase()}</td>
+                      <td className="p-2 text-right">{fmt(metrics.rmse, 4)}</td>
+                      <td className="p-2 text-right">{fmt(metrics.mape, 2, '%')}</td>
+                      <td className="p-2 text-right text-blue-600">{fmt(metrics.direction_accuracy, 1, '%')}</td>
+                    </tr>
+                  ))
+                )}
+              </tbody>
+            </table>
+          </div>
+        </div>
+      )}
+    </div>
+  );
+
   // Render future predictions
   const renderFuturePredictions = () => {
     if (!futureResults) return null;
@@ -449,14 +522,7 @@ const AdvancedBacktesting = ({ symbol, period = '2y' }) => {
       </div>
 
       {stage === 'config' && renderConfigSelection()}
-      {stage === 'backtesting' && (
-        <div className="flex flex-col items-center justify-center py-12">
-          <Loader2 className="h-16 w-16 animate-spin text-primary-600 mb-4" />
-          <p className="text-lg font-semibold text-gray-800">Running Historical Backtests...</p>
-          <p className="text-sm text-gray-600 mt-2">Training {selectedConfigs.length} configuration(s) across 5 models</p>
-          <p className="text-xs text-gray-500 mt-1">This may take 30-60 seconds per configuration</p>
-        </div>
-      )}
+      {stage === 'backtesting' && renderBacktestProgress()}
       {stage === 'results' && renderBacktestResults()}
       {stage === 'future' && renderFuturePredictions()}
 
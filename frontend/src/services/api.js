@@ -94,6 +94,58 @@ export const runBacktest = async (symbol, period, configs) => {
   return response.data;
 };
 
+/**
+ * Run historical backtest, receiving progress events as they happen.
+ * Calls onEvent for every Server-Sent Event and resolves with the final
+ * 'complete' payload (same shape as runBacktest).
+ */
+export const streamBacktest = async (symbol, period, configs, onEvent) => {
+  const response = await fetch(`${API_BASE_URL}/backtest/stream`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ symbol, period, configs }),
+  });
+
+  if (!response.ok) {
+    const error = await response.json().catch(() => ({}));
+    throw new Error(error.detail || `Request failed with status ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let finalResult = null;
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    // Events are separated by a blank line; keep any partial event buffered
+    const chunks = buffer.split('\n\n');
+    buffer = chunks.pop();
+
+    for (const chunk of chunks) {
+      const dataLine = chunk.split('\n').find(line => line.startsWith('data: '));
+      if (!dataLine) continue;
+      const event = JSON.parse(dataLine.slice(6));
+
+      if (event.event === 'error') {
+        throw new Error(event.detail);
+      }
+      if (event.event === 'complete') {
+        finalResult = event;
+      }
+      onEvent?.(event);
+    }
+  }
+
+  if (!finalResult) {
+    throw new Error('Backtest stream ended before completion');
+  }
+  return finalResult;
+};
+
 /**
  * Predict future prices using best configuration
  */